@@ -23,19 +23,86 @@ class Constants:
     # 监控配置
     DEFAULT_MONITOR_INTERVAL = 10      # 监控间隔（秒）
     DEFAULT_NOTIFICATION_INTERVAL = 300 # 通知间隔（秒）
-    MEMORY_WARNING_THRESHOLD = 1000    # 内存警告阈值（MB）
+    MEMORY_WARNING_THRESHOLD = 1000    # 内存警告阈值（MB），memory_rss_budget_mb 的默认值
+    MEMORY_SAMPLE_INTERVAL = 10        # 守护进程内存采样间隔（秒）
+    MEMORY_EVENT_INTERVAL = 300        # memory.sample 事件记录间隔（秒）
+    GC_THRESHOLDS = (5000, 20, 20)     # GC分代阈值（默认 700,10,10），减少长期运行时的回收次数
+    TRACEMALLOC_FRAMES = 5             # 内存分配记录保留的调用栈深度
     CPU_WARNING_THRESHOLD = 80         # CPU警告阈值（%）
     
     # UI配置
     UI_UPDATE_INTERVAL = 1000      # UI更新间隔（毫秒）
     ASYNC_OPERATION_TIMEOUT = 60   # 异步操作超时（秒）
+    PROCESS_RESTART_TIMEOUT = 180  # 重启QMT/彩虹客户端异步操作超时（秒）
+    PREOPEN_ROUTINE_TIMEOUT = 300  # 盘前流程异步操作超时（秒）
+    ASYNC_CANCEL_GRACE = 5         # 取消后等待操作在检查点退出的时间（秒），超过视为卡死
+    ASYNC_WATCHDOG_INTERVAL = 1.0  # 异步操作看门狗检查间隔（秒）
+    CANCEL_CHECK_INTERVAL = 0.5    # 阻塞等待的分片长度（秒），即取消检查点间隔
+    ASYNC_LANE_WORKERS = {         # 各执行通道的并发上限
+        "urgent": 2,               # 紧急控制：立即关闭QMT/彩虹客户端、关机
+        "normal": 2,               # 常规维护：重启、数据清理、盘前流程
+        "background": 2,           # 后台测量：行情源测速
+    }
+    LANE_METRIC_SAMPLES = 200      # 每个通道保留的排队/运行耗时样本数
     STATUS_MESSAGE_MAX_LENGTH = 100 # 状态消息最大长度
     
     # 文件路径
     CONFIG_FILENAME = "guardian_config.json"
+    CONFIG_BACKUP_COUNT = 3        # 保留的配置备份数
+    CONFIG_SAVE_DEBOUNCE = 0.5     # 配置保存防抖时间（秒）
+    CONFIG_SAVE_MAX_DELAY = 2.0    # 配置保存最长延迟（秒）
+    CONFIG_WATCH_INTERVAL = 2.0    # 配置文件外部修改检查间隔（秒）
     LOG_DIR_NAME = "logs"
+    LOG_FILENAME = "guardian.log"
+    SUPERVISOR_LOG_FILENAME = "supervisor.log"  # 监督进程单独的日志文件，避免两个进程滚动同一文件
+    TRADING_CALENDAR_FILENAME = "trading_calendar.txt"
+    SCHEDULE_STATE_FILENAME = "schedule_state.json"
+    EXECUTION_HISTORY_FILENAME = "execution_history.jsonl"
+    EVENT_LOG_DIR_NAME = "events"
+    EVENT_LOG_PREFIX = "events-"
+    SUPERVISOR_EVENT_LOG_PREFIX = "supervisor-events-"
     CACHE_DIR_NAME = "cache"
     
+    # 日志
+    LOG_MAX_BYTES = 10 * 1024 * 1024   # 单个日志文件大小上限（字节）
+    LOG_BACKUP_COUNT = 30              # 保留的压缩日志归档数
+    LOG_BATCH_SIZE = 500               # 写入线程单批最多写出的日志条数
+    LOG_QUEUE_MAX = 10000              # 日志队列上限，满时丢弃并计数
+    LOG_REPEAT_SUMMARY_INTERVAL = 600  # 重复消息汇总输出间隔（秒）
+    LOG_TEMPLATE_RATE_PER_MINUTE = 30  # 同一消息模板每分钟最多输出条数
+    LOG_TEMPLATE_BURST = 10            # 同一消息模板允许的突发条数
+    LOG_MAX_TEMPLATES = 1000           # 采样器跟踪的消息模板上限
+    
+    # 定时调度
+    SCHEDULER_MAX_WAIT = 60                # 调度线程单次最长等待（秒），醒来核对墙上时间
+    SCHEDULER_CLOCK_DRIFT_TOLERANCE = 1.0  # 单调时钟与墙上时间允许的偏差（秒），超出则重新对齐
+    SCHEDULER_LATENESS_HISTORY = 30        # 每个任务保留的触发延迟记录数
+    SCHEDULER_LATE_THRESHOLD = 5           # 触发时晚于计划时刻超过该秒数视为错过，按补执行策略处理
+    SCHEDULER_CATCHUP_MAX_AGE = 12 * 3600  # 启动时只补执行不早于该秒数的错过任务
+    TRADING_SESSIONS = (("09:15:00", "11:30:00"), ("13:00:00", "15:00:00"))  # 交易时段，next_safe 策略避开
+    TASK_GRAPH_MAX_WORKERS = 4             # 盘前流程并行执行的最大步骤数
+    EXECUTION_HISTORY_SAMPLES = 100        # 每个操作在内存中保留的执行记录数（用于耗时分位数）
+    EXECUTION_HISTORY_MAX_LINES = 5000     # 执行历史文件超过该行数时压缩
+    PREOPEN_SAFETY_MARGIN = 30             # 倒推盘前流程开始时间时额外预留的秒数
+    PREOPEN_DEFAULT_STEP_SECONDS = {       # 没有历史耗时时各步骤的估计耗时（秒）
+        'probe_servers': 30, 'stop_qmt': 15, 'apply_servers': 2, 'start_qmt': 40,
+        'stop_rainbow': 15, 'delete_data': 20, 'start_rainbow': 40
+    }
+    
+    # 模拟运行
+    SIMULATION_DIR_PREFIX = "simulation-"  # 模拟运行的配置、状态和日志存放在 logs/simulation-时间戳
+    SIMULATION_SETTLE_TIMEOUT = 2.0        # 推进虚拟时间前等待各线程进入等待的最长真实时间（秒）
+    SIMULATION_POLL_INTERVAL = 0.5         # 虚拟等待的真实时间轮询间隔（秒），防止漏掉唤醒
+    SIMULATION_STEP_SECONDS = {'stop': 3, 'start': 20, 'probe': 12}  # 虚拟进程关闭/启动、行情源测速耗时（秒）
+    SIMULATION_LATENCY_MS = {'hq': 18.0, 'jy': 22.0}                 # 虚拟行情/交易服务器正常延迟（毫秒）
+    SIMULATION_DEFAULT_SCENARIO = (        # 默认模拟场景：盘中QMT崩溃并手动重启、行情延迟升高、短暂断网
+        {'at': "10:15:00", 'action': "crash", 'process': "XtMiniQmt.exe"},
+        {'at': "10:20:00", 'action': "restart_qmt"},
+        {'at': "13:40:00", 'action': "latency", 'target': "hq", 'ms': 350},
+        {'at': "13:50:00", 'action': "latency", 'target': "hq", 'ms': 18},
+        {'at': "14:10:00", 'action': "outage", 'seconds': 120},
+    )
+    
     # 进程名称
     QMT_PROCESS_NAME = "XtMiniQmt.exe"
     QMT_CLIENT_PROCESS_NAME = "XtItClient.exe"
@@ -48,124 +115,497 @@ class Constants:
     FEISHU_TIMEOUT = 10           # 通知超时（秒）
     FEISHU_RETRY_COUNT = 3        # 重试次数
     FEISHU_RETRY_DELAY = 2        # 重试延迟（秒）
+    NOTIFICATION_COALESCE_WINDOW = 5    # 通知聚合窗口（秒）
+    NOTIFICATION_DEFER_RETRY = 30       # 被频率限制推迟的通知重试间隔（秒）
+    FEISHU_REPLAY_INTERVAL = 30         # 未送达通知补发检查间隔（秒）
+    FEISHU_FREQUENCY_LIMIT_CODE = 11232 # 飞书机器人限流错误码
+    FEISHU_RATE_PER_MINUTE = 90         # 全局发送速率上限（条/分钟，飞书限制100条/分钟）
+    FEISHU_BURST = 5                    # 全局突发上限（条，飞书限制5条/秒）
+    FEISHU_DEDUP_WINDOW = 60            # 相同内容去重窗口（秒）
+    
+    # 通知分发
+    NOTIFY_BACKEND_TIMEOUT = 5     # 单个通知后端投递超时（秒）
+    NOTIFY_BACKEND_MAX_QUEUE = 100 # 单个通知后端最大积压事件数
+    
+    # 通知发件箱
+    NOTIFICATION_OUTBOX_FILENAME = "notification_outbox.jsonl"
+    OUTBOX_FLUSH_INTERVAL = 0.2    # 送达记录批量写入间隔（秒）
+    OUTBOX_FSYNC_INTERVAL = 1.0    # 两次fsync最小间隔（秒）
+    OUTBOX_MAX_AGE = 86400         # 未送达通知最长保留时间（秒），过期不再补发
+    OUTBOX_MAX_PENDING = 500       # 最多保留的未送达通知条数
+    OUTBOX_COMPACT_LINES = 1000    # 发件箱文件超过该行数时压缩
+    
+    # 辅助进程
+    WORKER_HEARTBEAT_INTERVAL = 2.0   # 辅助进程心跳间隔（秒），也是主进程健康检查间隔
+    WORKER_HEARTBEAT_TIMEOUT = 15.0   # 超过该时间无心跳判定辅助进程卡死（秒）
+    WORKER_RESTART_BACKOFF = (1, 5, 30, 120)  # 连续重启的等待时间（秒）
+    WORKER_CALL_TIMEOUT = 300         # 辅助进程任务默认最长等待时间（秒）
+    WORKER_SCAN_TIMEOUT = 10          # 进程扫描最长等待时间（秒）
+    
+    # 守护监督（--supervise）
+    SUPERVISOR_CHECK_INTERVAL = 5     # 监督进程检查守护进程的间隔（秒）
+    SUPERVISOR_BUDGET_STRIKES = 3     # 连续超出预算的检查次数，达到后请求重启
+    SUPERVISOR_RESTART_GRACE = 60     # 请求重启后等待守护进程保存状态并退出的时间（秒），超时强制结束
+    SUPERVISOR_RESTART_BACKOFF = (1, 5, 30, 120)  # 守护进程连续异常退出后重新拉起的等待时间（秒）
+    SUPERVISOR_STABLE_SECONDS = 300   # 守护进程运行超过该时长后重置退避
+    GUARDIAN_RESTART_EXIT_CODE = 75   # 守护进程写入交接状态后以此退出码退出，监督进程立即重新拉起
+    SUPERVISED_ENV = "QMT_GUARDIAN_SUPERVISED"  # 监督进程设置的环境变量，值为本次启动原因
+    HANDOFF_FILENAME = "guardian_handoff.json"
+    HANDOFF_MAX_AGE = 600             # 交接状态有效期（秒），过期不再恢复
+    MONITOR_STOP_TIMEOUT = 5          # 重新启动监控时等待上一个监控线程退出的时间（秒）
+    
+    # 数据清理回收区
+    TRASH_DIR_NAME = ".guardian_trash"  # delete_base_path 下的回收区，删除的文件夹先重命名移入（同一磁盘，即时完成）
+    TRASH_PURGE_BATCH = 200           # 后台清理每删除多少个文件暂停一次
+    TRASH_PURGE_PAUSE = 0.05          # 每批之间暂停的时间（秒），限制清理占用的磁盘I/O
+    TRASH_PURGE_RETRY_INTERVAL = 60   # 回收区有文件删除失败（被占用等）时的重试间隔（秒）
+    TRASH_PURGE_RETRIES = 3           # 每轮清理的最多重试次数，仍有残留则留待下次启动
+    
+    # 批量删除（无法移入回收区、必须在重启前删除的文件夹）
+    BULK_DELETE_WORKERS = 8           # 并行删除文件的线程数
+    BULK_DELETE_BATCH = 256           # 每个删除任务包含的文件数
+    BULK_DELETE_RETRIES = 3           # 被占用/只读文件的重试次数
+    BULK_DELETE_RETRY_DELAY = 0.2     # 重试间隔基数（秒），第n次重试等待 n 倍
+    BULK_DELETE_PROGRESS_INTERVAL = 1.0  # 删除进度回调间隔（秒）
 
 # ====================================================================
-# 内存管理和异步操作辅助类
+# 内存调控和异步操作辅助类
 # ====================================================================
-class MemoryManager:
-    """内存管理器 - 定期清理大对象，防止内存泄漏"""
+class MemoryGovernor:
+    """内存调控器 - 后台线程采样守护进程RSS并按预算告警，调整GC分代阈值代替在界面线程强制全量回收
+
+    启动时冻结（gc.freeze）已加载的长期对象并提高第0代阈值，减少回收次数和全量回收要扫描的对象。
+    RSS 超出预算时先在后台线程做一次全量回收，仍超出才告警，回落到预算的90%以下后解除。
+    需要定位内存增长时调用 start_tracing() 记录基线，之后 snapshot_diff() 列出相对基线增长最多的代码位置。
+    """
     
-    def __init__(self):
-        self._large_objects = weakref.WeakSet()  # 使用弱引用避免循环引用
-        self._last_cleanup = time.time()
-        self._cleanup_interval = 300  # 5分钟清理一次
-        
-    def register_large_object(self, obj):
-        """注册大对象用于监控"""
-        self._large_objects.add(obj)
-        
-    def cleanup_if_needed(self):
-        """根据需要执行内存清理"""
-        current_time = time.time()
-        if current_time - self._last_cleanup > self._cleanup_interval:
-            self.force_cleanup()
-            
-    def force_cleanup(self):
-        """强制执行内存清理"""
-        # 清理大对象缓存
-        for obj in list(self._large_objects):
-            if hasattr(obj, 'clear_cache'):
-                obj.clear_cache()
-                
-        # 执行垃圾回收
-        collected = gc.collect()
-        self._last_cleanup = time.time()
-        
-        if collected > 0:
-            log(f"内存清理完成，回收了 {collected} 个对象")
-            
-    def get_memory_usage(self):
-        """获取当前内存使用情况"""
-        process = psutil.Process()
-        memory_info = process.memory_info()
+    def __init__(self, config_manager=None, budget_mb=Constants.MEMORY_WARNING_THRESHOLD,
+                 interval=Constants.MEMORY_SAMPLE_INTERVAL, on_alarm=None):
+        self.config_manager = config_manager  # 提供 memory_rss_budget_mb，未提供时使用 budget_mb
+        self.budget_mb = budget_mb
+        self.interval = interval
+        self.on_alarm = on_alarm  # 回调 (RSS MB, 预算 MB)
+        self.rss_mb = None
+        self.peak_rss_mb = None
+        self.alarmed = False
+        self._process = psutil.Process(os.getpid())
+        self._baseline = None
+        self._last_event = 0.0
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        self.tune_gc()
+        self._thread = threading.Thread(target=self._run, name="MemoryGovernor", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop_event.set()
+    
+    def tune_gc(self):
+        """冻结启动阶段创建的对象（此后不再参与回收扫描）并调整分代阈值"""
+        if hasattr(gc, 'freeze'):
+            gc.collect()
+            gc.freeze()
+        gc.set_threshold(*Constants.GC_THRESHOLDS)
+        log(f"GC分代阈值: {gc.get_threshold()}，已冻结 {gc.get_freeze_count() if hasattr(gc, 'get_freeze_count') else 0} 个启动对象")
+    
+    def current_budget(self):
+        if self.config_manager:
+            return self.config_manager.snapshot.memory_rss_budget_mb
+        return self.budget_mb
+    
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.sample()
+            except Exception as e:
+                log(f"内存采样失败: {e}")
+            self._stop_event.wait(self.interval)
+    
+    def sample(self):
+        """采样一次RSS，检查预算，定期记录 memory.sample 事件"""
+        rss = self._process.memory_info().rss / 1024 / 1024
+        self.rss_mb = rss
+        self.peak_rss_mb = max(self.peak_rss_mb or 0, rss)
+        budget = self.current_budget()
+        
+        if budget and rss > budget and not self.alarmed:
+            collected = gc.collect()
+            rss = self._process.memory_info().rss / 1024 / 1024
+            self.rss_mb = rss
+            if rss > budget:
+                self.alarmed = True
+                log(f"⚠ 守护进程内存 {rss:.0f}MB 超出预算 {budget}MB（全量回收 {collected} 个对象后）")
+                log_event('memory.alarm', rss_mb=round(rss, 1), budget_mb=budget, collected=collected)
+                if self.on_alarm:
+                    self.on_alarm(rss, budget)
+        elif self.alarmed and (not budget or rss < budget * 0.9):
+            self.alarmed = False
+            log(f"守护进程内存回落到 {rss:.0f}MB，解除告警")
+            log_event('memory.recovered', rss_mb=round(rss, 1), budget_mb=budget)
+        
+        now = time.monotonic()
+        if now - self._last_event >= Constants.MEMORY_EVENT_INTERVAL:
+            self._last_event = now
+            log_event('memory.sample', rss_mb=round(rss, 1), peak_rss_mb=round(self.peak_rss_mb, 1),
+                      gc_counts=list(gc.get_count()), gc_collections=[stat['collections'] for stat in gc.get_stats()])
+        return rss
+    
+    def metrics(self):
+        """内存指标：RSS、峰值、预算、是否告警、GC阈值和计数、是否在记录分配"""
         return {
-            'rss_mb': memory_info.rss / 1024 / 1024,  # 物理内存
-            'vms_mb': memory_info.vms / 1024 / 1024,  # 虚拟内存
-            'percent': process.memory_percent()        # 内存使用百分比
+            'rss_mb': self.rss_mb,
+            'peak_rss_mb': self.peak_rss_mb,
+            'budget_mb': self.current_budget(),
+            'alarmed': self.alarmed,
+            'gc_threshold': gc.get_threshold(),
+            'gc_counts': gc.get_count(),
+            'tracing': tracemalloc.is_tracing()
         }
+    
+    def start_tracing(self, frames=Constants.TRACEMALLOC_FRAMES):
+        """开始记录内存分配并以当前快照为基线（记录分配有额外开销，分析完成后调用 stop_tracing）"""
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+            self._baseline = tracemalloc.take_snapshot()
+        log("已开始记录内存分配，之后的内存增长分析以此刻为基线")
+    
+    def stop_tracing(self):
+        with self._lock:
+            self._baseline = None
+            tracemalloc.stop()
+        log("已停止记录内存分配")
+    
+    def snapshot_diff(self, limit=10):
+        """对比当前快照和基线，返回增长最多的代码位置（描述文本列表）；尚未记录时先开始记录并返回空列表"""
+        with self._lock:
+            baseline = self._baseline
+        if baseline is None:
+            self.start_tracing()
+            return []
+        
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+        ))
+        stats = [stat for stat in snapshot.compare_to(baseline, 'lineno') if stat.size_diff > 0][:limit]
+        lines = [f"{stat.traceback[0].filename}:{stat.traceback[0].lineno} +{stat.size_diff / 1024:.1f}KB "
+                 f"(共 {stat.size / 1024:.1f}KB, {stat.count_diff:+d} 块)" for stat in stats]
+        log("内存增长分析（相对基线）:\n  " + ("\n  ".join(lines) if lines else "无明显增长"))
+        log_event('memory.diff', rss_mb=round(self.rss_mb or 0, 1),
+                  top=[{'location': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                        'size_diff_kb': round(stat.size_diff / 1024, 1), 'count_diff': stat.count_diff}
+                       for stat in stats])
+        return lines
+
+class ExecutionLane:
+    """执行通道 - 并发上限、排队等待和运行耗时统计，可取消通道内的全部操作
+
+    每个操作在自己的线程中执行，先取得通道的并发名额（max_workers 个）才开始运行，排队按提交顺序。
+    看门狗放弃卡死的操作时调用 abandon() 归还其名额：卡死的线程继续占着自己，但不再占用通道，后续操作照常执行。
+    """
+    
+    def __init__(self, name, max_workers, samples=Constants.LANE_METRIC_SAMPLES):
+        self.name = name
+        self.max_workers = max_workers
+        self._slots = threading.Semaphore(max_workers)
+        self._lock = threading.Lock()
+        self._active = {}  # 取消令牌 -> 操作ID（排队中或运行中）
+        self._holding = set()  # 持有并发名额的令牌
+        self._queue_waits = deque(maxlen=samples)
+        self._run_times = deque(maxlen=samples)
+        self._counts = {'submitted': 0, 'completed': 0, 'failed': 0, 'cancelled': 0, 'abandoned': 0}
+        self._queued = 0
+        self._running = 0
+    
+    def submit(self, operation_id, token, func, *args, **kwargs):
+        """在本通道执行 func（在 token 下运行），返回 Future；取得名额时令牌开始计时（start）"""
+        submitted = time.monotonic()
+        future = Future()
+        with self._lock:
+            self._active[token] = operation_id
+            self._counts['submitted'] += 1
+            self._queued += 1
+        
+        def run():
+            # 排队期间被抢占或取消时立即放弃等待，名额留给后续操作
+            while not self._slots.acquire(timeout=Constants.CANCEL_CHECK_INTERVAL):
+                if future.cancelled() or token.cancelled:
+                    break
+            else:
+                with self._lock:
+                    self._holding.add(token)
+            with self._lock:
+                self._queued -= 1
+                if token.cancelled:
+                    future.cancel()  # 排队期间已被抢占或取消，不再开始运行
+                if token not in self._holding or not future.set_running_or_notify_cancel():
+                    self._active.pop(token, None)
+                    self._counts['cancelled'] += 1  # 排队中即被取消
+                    self._release_locked(token)
+                    return
+                self._running += 1
+            
+            started = time.monotonic()
+            token.start()
+            with self._lock:
+                self._queue_waits.append(started - submitted)
+            result, error, outcome = None, None, 'failed'
+            try:
+                result = run_with_token(token, func, *args, **kwargs)
+                outcome = 'completed'
+            except BaseException as e:
+                error = e
+            run_time = time.monotonic() - started
+            if token.cancelled_at is not None:
+                outcome = 'cancelled'
+            with self._lock:
+                self._running -= 1
+                self._run_times.append(run_time)
+                self._counts[outcome] += 1
+                self._active.pop(token, None)
+                self._release_locked(token)
+            log_event('lane.operation', lane=self.name, operation=operation_id, outcome=outcome,
+                      queue_wait=round(started - submitted, 3), run_time=round(run_time, 3))
+            # 统计更新后再结束 Future，等待方看到的通道指标已包含本次操作
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+        
+        threading.Thread(target=run, name=f"lane-{self.name}-{operation_id}", daemon=True).start()
+        return future
+    
+    def _release_locked(self, token):
+        if token in self._holding:
+            self._holding.discard(token)
+            self._slots.release()
+    
+    def abandon(self, token):
+        """放弃卡死的操作：归还其并发名额（其线程仍在运行，结束时不再重复归还）"""
+        with self._lock:
+            if token in self._holding:
+                self._counts['abandoned'] += 1
+                self._release_locked(token)
+    
+    def preempt(self, reason):
+        """取消通道内排队和运行中的全部操作，返回被取消的操作ID列表"""
+        with self._lock:
+            active = list(self._active.items())
+        for token, _ in active:
+            token.cancel(reason)
+        return [operation_id for _, operation_id in active]
+    
+    def stats(self):
+        """通道指标：排队/运行数、累计计数、排队等待和运行耗时的 p50/p95/最大值（秒）"""
+        with self._lock:
+            waits, runs = sorted(self._queue_waits), sorted(self._run_times)
+            stats = dict(self._counts, max_workers=self.max_workers, queued=self._queued, running=self._running)
+        for key, samples in (('queue_wait', waits), ('run_time', runs)):
+            stats[f'{key}_p50'] = samples[int(0.5 * (len(samples) - 1))] if samples else None
+            stats[f'{key}_p95'] = samples[int(round(0.95 * (len(samples) - 1)))] if samples else None
+            stats[f'{key}_max'] = samples[-1] if samples else None
+        return stats
 
 class AsyncOperationManager:
-    """异步操作管理器 - 防止长时间操作阻塞UI"""
+    """异步操作管理器 - 防止长时间操作阻塞UI
+
+    操作按优先级进入各自的执行通道（紧急控制 / 常规维护 / 后台测量），通道间线程池互相独立，
+    长时间的测速或重启不会占住紧急关闭的线程；紧急操作可抢占（取消）后台通道中的操作。
+    每个操作带一个取消令牌和截止时间；看门狗线程在操作超时后请求取消，
+    取消后超过 cancel_grace 仍未在检查点退出的操作视为卡死：释放操作ID（后续请求不再被跳过）、
+    归还其在执行通道中的并发名额（后续操作不再排在卡死的线程后面），并通过 on_stuck 上报。
+    """
+    
+    URGENT = "urgent"
+    NORMAL = "normal"
+    BACKGROUND = "background"
     
-    def __init__(self, max_workers=4):
-        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+    def __init__(self, lane_workers=None, default_timeout=Constants.ASYNC_OPERATION_TIMEOUT,
+                 cancel_grace=Constants.ASYNC_CANCEL_GRACE, on_stuck=None):
+        self.lanes = {name: ExecutionLane(name, workers)
+                      for name, workers in (lane_workers or Constants.ASYNC_LANE_WORKERS).items()}
+        self.default_timeout = default_timeout
+        self.cancel_grace = cancel_grace
+        self.on_stuck = on_stuck  # 回调 (operation_id, 已运行秒数, 取消原因)
         self._running_operations = {}
+        self._tokens = {}
+        self._operation_lanes = {}  # 操作ID -> 执行通道名
+        self._lock = threading.Lock()
+        self._watchdog = None
+        self._stop_event = threading.Event()
         
-    def run_async(self, operation_id, func, *args, **kwargs):
+    def run_async(self, operation_id, func, *args, timeout=None, lane=NORMAL, preempt=(), **kwargs):
         """异步执行操作
         
         Args:
             operation_id: 操作唯一标识
             func: 要执行的函数
             *args, **kwargs: 函数参数
+            timeout: 截止时间（秒），None 使用 default_timeout，0 表示不限
+            lane: 执行通道
+            preempt: 提交前取消其中全部操作的通道（如紧急操作抢占后台通道）
             
         Returns:
             Future对象
         """
-        if operation_id in self._running_operations:
-            log(f"操作 {operation_id} 已在运行中，跳过重复执行")
-            return self._running_operations[operation_id]
+        for preempted_lane in preempt:
+            preempted = self.lanes[preempted_lane].preempt(f"让位于紧急操作 {operation_id}")
+            if preempted:
+                log(f"操作 {operation_id} 抢占{preempted_lane}通道，已取消: {', '.join(preempted)}")
+        
+        with self._lock:
+            if operation_id in self._running_operations:
+                log(f"操作 {operation_id} 已在运行中，跳过重复执行")
+                return self._running_operations[operation_id]
             
-        future = self.executor.submit(func, *args, **kwargs)
-        self._running_operations[operation_id] = future
-        
-        # 操作完成后自动清理
+            timeout = self.default_timeout if timeout is None else timeout
+            token = CancellationToken(timeout=timeout)  # 截止时间从通道开始运行该操作时起算
+            future = self.lanes[lane].submit(operation_id, token, func, *args, **kwargs)
+            self._running_operations[operation_id] = future
+            self._tokens[operation_id] = token
+            self._operation_lanes[operation_id] = lane
+        
+        # 操作完成后自动清理（已被看门狗释放的操作ID可能已属于新的操作）
         def cleanup_operation(fut):
-            self._running_operations.pop(operation_id, None)
+            with self._lock:
+                if self._running_operations.get(operation_id) is fut:
+                    self._running_operations.pop(operation_id, None)
+                    self._tokens.pop(operation_id, None)
+                    self._operation_lanes.pop(operation_id, None)
+            if token.cancelled_at is not None:
+                elapsed = time.monotonic() - token.started
+                log(f"操作 {operation_id} 已取消（{token.reason}），运行 {elapsed:.1f}s")
+                log_event('async.cancelled', operation=operation_id, reason=token.reason, elapsed=round(elapsed, 3))
             
         future.add_done_callback(cleanup_operation)
+        self._ensure_watchdog()
         return future
         
     def is_operation_running(self, operation_id):
         """检查操作是否正在运行"""
         future = self._running_operations.get(operation_id)
         return future is not None and not future.done()
-        
-    def cancel_operation(self, operation_id):
-        """取消正在运行的操作"""
-        future = self._running_operations.get(operation_id)
-        if future and not future.done():
-            future.cancel()
-            return True
-        return False
+    
+    def running_operations(self):
+        """正在排队或执行的操作ID列表"""
+        with self._lock:
+            return [op_id for op_id, future in self._running_operations.items() if not future.done()]
+        
+    def cancel_operation(self, operation_id, reason="手动取消"):
+        """取消操作：未开始的直接取消，运行中的通过令牌通知其在下一个检查点退出"""
+        with self._lock:
+            future = self._running_operations.get(operation_id)
+            token = self._tokens.get(operation_id)
+        if not future or future.done():
+            return False
+        if not future.cancel():
+            token.cancel(reason)
+            log(f"已请求取消操作 {operation_id}: {reason}")
+        return True
+    
+    def cancel_operations(self, operation_ids, reason, wait=0):
+        """取消多个操作，最多等待 wait 秒让运行中的操作在检查点退出，返回被取消的操作ID列表"""
+        with self._lock:
+            futures = {op_id: self._running_operations.get(op_id) for op_id in operation_ids}
+        cancelled = [op_id for op_id, future in futures.items()
+                     if future is not None and self.cancel_operation(op_id, reason)]
+        if cancelled and wait:
+            wait_futures([futures[op_id] for op_id in cancelled], timeout=wait)
+        return cancelled
+    
+    def get_lane_stats(self):
+        """各执行通道的指标，见 ExecutionLane.stats"""
+        return {name: lane.stats() for name, lane in self.lanes.items()}
+    
+    def _ensure_watchdog(self):
+        if self._watchdog is None and not self._stop_event.is_set():
+            self._watchdog = threading.Thread(target=self._watchdog_loop, name="AsyncWatchdog", daemon=True)
+            self._watchdog.start()
+    
+    def _watchdog_loop(self):
+        while not self._stop_event.wait(Constants.ASYNC_WATCHDOG_INTERVAL):
+            self._check_operations()
+    
+    def _check_operations(self):
+        """超时的操作请求取消；取消后超过 cancel_grace 仍未结束的释放操作ID和通道名额并上报"""
+        now = time.monotonic()
+        stuck = []
+        with self._lock:
+            for operation_id, token in list(self._tokens.items()):
+                if not token.running:
+                    continue  # 仍在排队：不计时，被取消时由通道直接丢弃
+                if token.cancelled_at is None:
+                    if token.deadline is not None and now >= token.deadline:
+                        token.cancel("超时")
+                        log(f"⚠ 操作 {operation_id} 超过截止时间（已运行 {now - token.started:.1f}s），请求取消")
+                        log_event('async.timeout', operation=operation_id, elapsed=round(now - token.started, 3))
+                elif now - token.cancelled_at >= self.cancel_grace:
+                    self._running_operations.pop(operation_id, None)
+                    self._tokens.pop(operation_id, None)
+                    self.lanes[self._operation_lanes.pop(operation_id)].abandon(token)
+                    stuck.append((operation_id, now - token.started, token.reason))
+        
+        for operation_id, elapsed, reason in stuck:
+            log(f"✗ 操作 {operation_id} 取消后 {self.cancel_grace}s 仍未退出（{reason}，已运行 {elapsed:.1f}s），"
+                f"释放操作ID和通道名额，其线程可能已卡死")
+            log_event('async.stuck', operation=operation_id, reason=reason, elapsed=round(elapsed, 3))
+            if self.on_stuck:
+                try:
+                    self.on_stuck(operation_id, elapsed, reason)
+                except Exception as e:
+                    log(f"卡死操作上报失败: {e}")
         
     def shutdown(self):
-        """关闭异步操作管理器"""
-        self.executor.shutdown(wait=True)
+        """关闭异步操作管理器：取消运行中的操作，最多等待 cancel_grace 秒让其退出"""
+        self._stop_event.set()
+        with self._lock:
+            futures = list(self._running_operations.values())
+        for lane in self.lanes.values():
+            lane.preempt("程序退出")  # 包括后台通道中的子操作
+        wait_futures(futures, timeout=self.cancel_grace)
+        for name, lane in self.lanes.items():
+            stats = lane.stats()
+            log(f"执行通道 {name}: 提交 {stats['submitted']}，完成 {stats['completed']}，失败 {stats['failed']}，"
+                f"取消 {stats['cancelled']}，放弃 {stats['abandoned']}，排队p95 {stats['queue_wait_p95'] or 0:.2f}s，"
+                f"运行p95 {stats['run_time_p95'] or 0:.1f}s")
 
-def async_operation(operation_id=None):
-    """异步操作装饰器 - 自动异步执行函数"""
+def async_operation(operation_id=None, timeout=None, lane=AsyncOperationManager.NORMAL, preempt=()):
+    """异步操作装饰器 - 自动异步执行函数（timeout / lane / preempt 见 AsyncOperationManager.run_async）
+
+    已在受管操作（或其任务图步骤）中调用时直接同步执行并沿用外层的取消令牌，
+    保证作为前置步骤的异步操作先完成再继续。
+    """
     def decorator(func):
         @wraps(func)
         def wrapper(self, *args, **kwargs):
-            if hasattr(self, 'async_manager'):
+            if hasattr(self, 'async_manager') and not in_managed_operation():
                 op_id = operation_id or f"{func.__name__}_{id(self)}"
-                return self.async_manager.run_async(op_id, func, self, *args, **kwargs)
+                return self.async_manager.run_async(op_id, func, self, *args, timeout=timeout, lane=lane,
+                                                    preempt=preempt, **kwargs)
             else:
                 return func(self, *args, **kwargs)
         return wrapper
     return decorator
 
 # 标准库导入
-import os, sys, json, time, threading, subprocess, shutil, socket, gc
+import os, sys, json, time, threading, subprocess, shutil, socket, gc, hashlib, re, math, stat, tempfile
 import xml.etree.ElementTree as ET
-from datetime import datetime
-from functools import wraps
-import weakref, statistics, winreg
+from collections import OrderedDict, namedtuple, deque
+from datetime import datetime, timedelta, date as date_cls, time as dt_time
+from functools import wraps, lru_cache
+from contextlib import contextmanager
+import weakref, statistics, winreg, atexit, queue, gzip, heapq, argparse, tracemalloc
+from array import array
+from bisect import bisect_left, bisect_right
+from types import SimpleNamespace
 
 # 第三方库导入
-import psutil, requests, schedule
-from concurrent.futures import ThreadPoolExecutor
+import psutil, requests
+from concurrent.futures import ThreadPoolExecutor, Future, wait as wait_futures
 
 # 设置控制台编码为UTF-8，解决中文乱码问题
 try:
@@ -214,6 +654,150 @@ except ImportError as e:
     Qt = MockQt()
     QApplication.exec = lambda self: 0
 
+# ====================================================================
+# 操作取消令牌
+# ====================================================================
+class OperationCancelled(Exception):
+    """操作被取消或超过截止时间（由取消检查点抛出）"""
+
+class CancellationToken:
+    """协作式取消令牌 - 长时间操作在检查点调用 check()/sleep()，取消后最迟在下一个检查点退出
+
+    deadline 为 time.monotonic() 截止时间，到期后令牌自动视为已取消（原因“超时”）。
+    指定 timeout 时截止时间从 start()（操作真正开始运行）起算，排队等待不计入。
+    子操作使用 child() 派生的令牌，父令牌取消时子令牌随之取消。
+    """
+    
+    def __init__(self, deadline=None, timeout=None):
+        self.deadline = deadline
+        self.timeout = timeout
+        self.started = time.monotonic()
+        self.running = False
+        self.reason = None
+        self.cancelled_at = None
+        self._event = threading.Event()
+        self._children = weakref.WeakSet()
+    
+    def cancel(self, reason="已取消"):
+        if not self._event.is_set():
+            self.reason = reason
+            self.cancelled_at = time.monotonic()
+            self._event.set()
+        for child in list(self._children):
+            child.cancel(reason)
+    
+    def start(self):
+        """操作开始运行：从此刻计时，按 timeout 设置截止时间"""
+        self.started = time.monotonic()
+        self.running = True
+        if self.timeout:
+            self.deadline = self.started + self.timeout
+    
+    def child(self):
+        """派生子令牌：截止时间相同，本令牌取消时一并取消"""
+        token = CancellationToken(self.deadline)
+        self._children.add(token)
+        if self._event.is_set():
+            token.cancel(self.reason)
+        return token
+    
+    @property
+    def cancelled(self):
+        if not self._event.is_set() and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("超时")
+        return self._event.is_set()
+    
+    def remaining(self):
+        """距截止时间的秒数，无截止时间返回 None"""
+        return None if self.deadline is None else max(0.0, self.deadline - time.monotonic())
+    
+    def check(self):
+        """取消检查点：已取消或已超时则抛出 OperationCancelled"""
+        if self.cancelled:
+            raise OperationCancelled(f"操作已取消: {self.reason}")
+    
+    def sleep(self, seconds):
+        """可被取消打断的等待"""
+        self.check()
+        remaining = self.remaining()
+        self._event.wait(seconds if remaining is None else min(seconds, remaining))
+        self.check()
+
+NEVER_CANCELLED = CancellationToken()  # 不在受管操作中时的默认令牌
+_operation_context = threading.local()
+
+def current_token():
+    """当前线程所执行操作的取消令牌，供进程终止等待、启动轮询、测速等检查点使用"""
+    return getattr(_operation_context, 'token', None) or NEVER_CANCELLED
+
+def in_managed_operation():
+    """当前线程是否正在执行受管操作（或其任务图步骤）"""
+    return getattr(_operation_context, 'token', None) is not None
+
+def run_with_token(token, func, *args, **kwargs):
+    """在指定取消令牌下执行函数，函数内的检查点和嵌套的异步操作都使用该令牌"""
+    previous = getattr(_operation_context, 'token', None)
+    _operation_context.token = token
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _operation_context.token = previous
+
+class ChildOperation:
+    """子操作 - 在独立线程上与父操作并行执行，使用父操作令牌派生的子令牌
+
+    result() 等待子操作结束，返回其结果或重新抛出其异常；等待期间父操作被取消则立即抛出 OperationCancelled。
+    父操作不再需要结果时（如提前失败）应调用 cancel()。等待和完成通知经由 clock，模拟运行时按虚拟时间推进。
+    指定 lane（ExecutionLane）时在该执行通道中运行，计入通道指标并可被抢占。
+    """
+    
+    def __init__(self, name, func, *args, clock=None, lane=None, **kwargs):
+        self.name = name
+        self.clock = clock or SYSTEM_CLOCK
+        self.parent_token = current_token()
+        self.token = self.parent_token.child()
+        self._cond = threading.Condition()
+        self._done = False
+        self._value = None
+        self._error = None
+        if lane is not None:
+            run = self.clock.tracked(self._run)
+            future = lane.submit(name, self.token, run, func, args, kwargs)
+            # 排队中被取消或抢占时通道不会执行 run，改为以 OperationCancelled 结束，result() 不必等到父令牌超时
+            future.add_done_callback(lambda f: f.cancelled() and run(self._dropped, (), {}))
+        else:
+            self.clock.spawn(lambda: self._run(func, args, kwargs))
+    
+    def _run(self, func, args, kwargs):
+        value, error = None, None
+        try:
+            value = run_with_token(self.token, func, *args, **kwargs)
+        except Exception as e:
+            error = e
+        with self._cond:
+            self._value, self._error, self._done = value, error, True
+            self.clock.notify(self._cond)
+    
+    def _dropped(self):
+        raise OperationCancelled(f"操作已取消: {self.token.reason or '排队中被取消'}")
+    
+    def done(self):
+        return self._done
+    
+    def result(self):
+        """等待子操作结束并返回结果，子操作的异常在这里重新抛出"""
+        poll = None if self.parent_token is NEVER_CANCELLED else Constants.CANCEL_CHECK_INTERVAL
+        with self._cond:
+            while not self._done:
+                self.parent_token.check()
+                self.clock.wait(self._cond, poll)
+        if self._error is not None:
+            raise self._error
+        return self._value
+    
+    def cancel(self, reason="父操作已结束"):
+        self.token.cancel(reason)
+
 # ====================================================================
 # 配置管理模块
 # ====================================================================
@@ -249,6 +833,29 @@ class ConfigManager:
         "notification_interval": 300,  # 通知间隔（秒，5分钟）
         "notification_start_time": "09:00:00",  # 通知时间段开始
         "notification_end_time": "15:30:00",   # 通知时间段结束
+        "notification_coalesce_window": 5,  # 通知聚合窗口（秒，0表示不聚合）
+        "memory_rss_budget_mb": 1000,  # 守护进程内存预算（MB，0表示不告警）
+        "guardian_rss_limit_mb": 1500,  # 监督模式下守护进程内存上限（MB，持续超出时重启守护进程，0表示不限制）
+        "guardian_thread_limit": 200,  # 监督模式下守护进程线程数上限（0表示不限制）
+        "guardian_handle_limit": 10000,  # 监督模式下守护进程句柄数上限（0表示不限制）
+        
+        # 通知分发配置（飞书之外的附加后端，留空则不启用）
+        "notify_webhook_urls": "",  # 通用JSON Webhook地址，逗号分隔
+        "notify_file_path": "",  # 本地事件文件路径（JSON Lines）
+        "notify_socket_address": "",  # 本地看板地址，如 udp://127.0.0.1:9999
+        "notify_backend_timeout": 5,  # 单个后端投递超时（秒）
+        
+        # 盘前流程配置
+        "preopen_routine_time": "",  # 盘前流程启动时间，设置后按依赖图并行执行QMT和彩虹客户端重启，取代 qmt_run_time 和 rainbow_restart_time
+        "preopen_ready_by": "",  # 盘前流程就绪期限，设置后按历史p95耗时倒推开始时间（preopen_routine_time 作为最早开始时间）
+        
+        # 交易日历配置
+        "trading_calendar_path": "",  # 交易日历文件，留空使用 logs/trading_calendar.txt，文件不存在时按周一至周五判断
+        "trading_day_only_tasks": "preopen_routine_time,qmt_run_time,rainbow_restart_time,qmt_shutdown_time,rainbow_shutdown_time,system_shutdown_time",  # 仅在交易日执行的定时任务（填写任务的时间配置项，逗号分隔）
+        
+        # 错过定时任务的补执行配置（休眠唤醒、程序晚启动）
+        "schedule_catchup_policy": "preopen_routine_time=grace,qmt_run_time=grace,rainbow_restart_time=grace,qmt_shutdown_time=next_safe,rainbow_shutdown_time=next_safe,system_shutdown_time=skip",  # 任务=策略，策略为 grace/skip/next_safe
+        "schedule_catchup_grace": 600,  # grace 策略的宽限时间（秒）
         
         # 飞书通知配置
         "feishu_webhook_url": "",  # 飞书机器人Webhook URL
@@ -258,76 +865,826 @@ class ConfigManager:
     
     def __init__(self):
         """初始化配置管理器"""
-        self.config_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs", "guardian_config.json")
-        os.makedirs(os.path.dirname(self.config_file), exist_ok=True)
-        self.config = self._load_config()
+        self.config_file = os.path.join(get_log_dir(), Constants.CONFIG_FILENAME)
+        self._lock = threading.RLock()           # 保护配置替换
+        self._write_lock = threading.Lock()      # 串行化文件写入
+        self._save_cond = threading.Condition(self._lock)
+        self._save_requested_at = None           # 首次未落盘修改的请求时间（monotonic）
+        self._last_request_at = None             # 最近一次保存请求时间（monotonic）
+        self._saver_thread = None
+        self._subscribers = []                   # [(回调, 关注的配置项集合或None)]
+        self._disk_signature = None              # 最近一次读写时配置文件的 (mtime, size)
+        
+        self.config, recovered = self._load_config()
+        self._disk_signature = self._stat_signature()
+        self.snapshot = ConfigSnapshot.compile(self.config)
+        atexit.register(self.flush)
         log(f"配置管理器已初始化，配置文件: {self.config_file}")
+        
+        if recovered:
+            self.save_config()  # 用恢复出的配置重写损坏的主配置文件
+    
+    def _backup_path(self, index):
+        return f"{self.config_file}.bak{index}"
     
     def _load_config(self):
-        """加载配置文件，不存在则使用默认配置"""
-        if os.path.exists(self.config_file):
+        """加载配置文件；主文件损坏或缺失时从最新的有效备份恢复
+
+        Returns:
+            (config, recovered): 配置字典，以及是否从备份恢复
+        """
+        candidates = [self.config_file] + [self._backup_path(i) for i in range(1, Constants.CONFIG_BACKUP_COUNT + 1)]
+        for path in candidates:
+            if not os.path.exists(path):
+                continue
             try:
-                with open(self.config_file, 'r', encoding='utf-8') as f:
+                with open(path, 'r', encoding='utf-8') as f:
                     loaded_config = json.load(f)
+                if not isinstance(loaded_config, dict):
+                    raise ValueError("配置文件内容不是JSON对象")
                 config = self.DEFAULT_CONFIG.copy()
                 config.update(loaded_config)
-                log(f"成功加载配置文件: {self.config_file}")
-                return config
+                if path == self.config_file:
+                    log(f"成功加载配置文件: {self.config_file}")
+                    return config, False
+                log(f"⚠ 已从备份恢复配置: {path}")
+                return config, True
             except Exception as e:
-                log(f"加载配置文件失败: {e}，使用默认配置")
-                return self.DEFAULT_CONFIG.copy()
+                log(f"加载配置文件失败: {path} ({e})")
+        
+        if any(os.path.exists(path) for path in candidates):
+            log("配置文件及备份均无法读取，使用默认配置")
         else:
             log("配置文件不存在，使用默认配置")
-            return self.DEFAULT_CONFIG.copy()
+        return self.DEFAULT_CONFIG.copy(), False
     
-    def save_config(self):
-        """保存配置到JSON文件"""
+    def save_config(self, wait=False):
+        """保存配置到JSON文件
+
+        默认只登记保存请求，由后台线程在短暂防抖后合并写入（频繁切换按钮时只写一次）；
+        wait=True 时立即同步写入并返回真实结果。
+        
+        Returns:
+            bool: wait=True 时为写入是否成功；否则为请求是否已登记
+        """
+        if wait:
+            with self._lock:
+                self._save_requested_at = None
+            return self._write_config()
+        
+        with self._lock:
+            now = time.monotonic()
+            if self._save_requested_at is None:
+                self._save_requested_at = now
+            self._last_request_at = now
+            if self._saver_thread is None:
+                self._saver_thread = threading.Thread(target=self._saver_loop, name="ConfigSaver", daemon=True)
+                self._saver_thread.start()
+            self._save_cond.notify()
+        return True
+    
+    def flush(self):
+        """立即写入尚未落盘的修改（程序退出时调用）"""
+        with self._lock:
+            pending = self._save_requested_at is not None
+            self._save_requested_at = None
+        if pending:
+            self._write_config()
+    
+    def _saver_loop(self):
+        """后台保存线程：最后一次请求后静默 CONFIG_SAVE_DEBOUNCE 秒再写入，最长延迟 CONFIG_SAVE_MAX_DELAY 秒"""
+        while True:
+            with self._lock:
+                while self._save_requested_at is None:
+                    self._save_cond.wait()
+                while self._save_requested_at is not None:
+                    now = time.monotonic()
+                    deadline = min(self._last_request_at + Constants.CONFIG_SAVE_DEBOUNCE,
+                                   self._save_requested_at + Constants.CONFIG_SAVE_MAX_DELAY)
+                    if now >= deadline:
+                        break
+                    self._save_cond.wait(deadline - now)
+                if self._save_requested_at is None:
+                    continue  # 已被同步保存
+                self._save_requested_at = None
+            self._write_config()
+    
+    def _write_config(self):
+        """原子写入：临时文件 + fsync + 替换，写入前轮转最近的有效备份"""
+        with self._write_lock:
+            config = self.config  # 写时复制，引用即为一致的快照
+            tmp_path = self.config_file + '.tmp'
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(config, f, ensure_ascii=False, indent=4)
+                    f.flush()
+                    os.fsync(f.fileno())
+                
+                self._rotate_backups()
+                os.replace(tmp_path, self.config_file)
+                self._fsync_dir()
+                self._disk_signature = self._stat_signature()
+                log(f"配置已保存到: {self.config_file}")
+                return True
+            except Exception as e:
+                log(f"保存配置文件失败: {e}")
+                try:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                except OSError:
+                    pass
+                return False
+    
+    def _rotate_backups(self):
+        """将当前主配置文件（若可正常解析）轮转进备份环，bak1 为最新"""
+        if not os.path.exists(self.config_file):
+            return
         try:
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(self.config, f, ensure_ascii=False, indent=4)
-            log(f"配置已保存到: {self.config_file}")
-            return True
-        except Exception as e:
-            log(f"保存配置文件失败: {e}")
-            return False
+            with open(self.config_file, 'r', encoding='utf-8') as f:
+                json.load(f)
+        except Exception:
+            return  # 当前主文件已损坏，不覆盖已有的有效备份
+        
+        for i in range(Constants.CONFIG_BACKUP_COUNT, 1, -1):
+            older = self._backup_path(i - 1)
+            if os.path.exists(older):
+                os.replace(older, self._backup_path(i))
+        shutil.copyfile(self.config_file, self._backup_path(1))
+    
+    def _fsync_dir(self):
+        """同步目录项，保证替换操作本身落盘（Windows不支持打开目录，跳过）"""
+        if sys.platform.startswith('win'):
+            return
+        fd = os.open(os.path.dirname(self.config_file) or '.', os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    
+    def _stat_signature(self):
+        try:
+            st = os.stat(self.config_file)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+    
+    def reload_if_changed(self):
+        """检查配置文件是否被外部修改（手工编辑/部署工具），是则重新加载并通知订阅者
+
+        Returns:
+            ConfigChangeEvent 或 None（文件未变化、内容无差异或无法解析）
+        """
+        signature = self._stat_signature()
+        if signature is None or signature == self._disk_signature:
+            return None
+        
+        with self._write_lock:
+            try:
+                with open(self.config_file, 'r', encoding='utf-8') as f:
+                    loaded_config = json.load(f)
+                if not isinstance(loaded_config, dict):
+                    raise ValueError("配置文件内容不是JSON对象")
+            except Exception as e:
+                # 可能是编辑器正在写入，等待下一次修改
+                log(f"配置文件已被修改但无法解析，暂不加载: {e}")
+                self._disk_signature = signature
+                return None
+            self._disk_signature = signature
+        
+        # 以默认配置加文件内容重建：文件中删除的配置项恢复默认值（非默认项直接移除），不会沿用旧值再被写回
+        with self._lock:
+            reloaded = self.DEFAULT_CONFIG.copy()
+            reloaded.update(loaded_config)
+            event = self._publish(reloaded, source="file", file_keys=loaded_config.keys())
+        
+        if event is None:
+            return None
+        log(f"检测到配置文件外部修改，已重新加载: {', '.join(sorted(event.changed_keys))}"
+            f"{'，已删除: ' + ', '.join(sorted(event.removed_keys)) if event.removed_keys else ''}")
+        self._notify(event)
+        return event
+    
+    def subscribe(self, callback, keys=None):
+        """订阅配置变更
+
+        Args:
+            callback: 回调 callback(event)，event 为 ConfigChangeEvent
+            keys: 关注的配置项，None 表示全部；只有相关配置项变化时才回调
+        """
+        with self._lock:
+            self._subscribers.append((callback, frozenset(keys) if keys else None))
+    
+    def unsubscribe(self, callback):
+        """取消订阅"""
+        with self._lock:
+            self._subscribers = [(cb, keys) for cb, keys in self._subscribers if cb != callback]
+    
+    def _notify(self, event):
+        """在调用线程中通知订阅者（不持有锁）"""
+        log_event('state.config', source=event.source, changed_keys=sorted(event.changed_keys),
+                  removed_keys=sorted(event.removed_keys))
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback, keys in subscribers:
+            if keys is not None and not (keys & event.changed_keys):
+                continue
+            try:
+                callback(event)
+            except Exception as e:
+                log(f"配置变更回调执行失败: {e}")
     
     def get(self, key, default=None):
-        """获取配置值"""
+        """获取配置值（无锁读取，配置字典发布后不再修改）"""
         return self.config.get(key, default)
     
     def set(self, key, value):
         """设置配置值"""
-        self.config[key] = value
+        with self._lock:
+            new_config = dict(self.config)
+            new_config[key] = value
+            event = self._publish(new_config)
         log(f"配置已更新: {key} = {value}")
+        if event:
+            self._notify(event)
     
     def update(self, new_config):
         """批量更新配置"""
-        self.config.update(new_config)
+        with self._lock:
+            merged = dict(self.config)
+            merged.update(new_config)
+            event = self._publish(merged)
         log(f"批量更新配置: {len(new_config)} 项")
+        if event:
+            self._notify(event)
+    
+    def _publish(self, new_config, source="local", file_keys=None):
+        """在持有锁的前提下发布新的配置字典和快照（写时复制）
+
+        Args:
+            file_keys: 从文件重新加载时文件中出现的配置项，变化且不在其中的配置项记为已删除
+
+        Returns:
+            ConfigChangeEvent，配置无变化时返回 None
+        """
+        old_config, old_snapshot = self.config, self.snapshot
+        changed_keys = frozenset(
+            key for key in set(old_config) | set(new_config) if old_config.get(key) != new_config.get(key)
+        )
+        if not changed_keys:
+            return None
+        removed_keys = frozenset(changed_keys - set(file_keys)) if file_keys is not None else frozenset()
+        self.snapshot = ConfigSnapshot.compile(new_config)
+        self.config = new_config
+        return ConfigChangeEvent(changed_keys, old_snapshot, self.snapshot, source, removed_keys)
+
+# 配置变更事件：变化的配置项集合、变更前后的类型化快照、来源（local=程序内修改，file=外部修改配置文件）、
+# 从配置文件中删除的配置项（已包含在变化的配置项中，恢复为默认值或移除）
+ConfigChangeEvent = namedtuple('ConfigChangeEvent', ['changed_keys', 'old', 'new', 'source', 'removed_keys'],
+                               defaults=(frozenset(),))
+
+class ConfigWatcher(threading.Thread):
+    """配置文件监视线程 - 定期检查文件 mtime/size，发现外部修改后触发重新加载
+
+    watch() 可登记其他文件（如交易日历）的检查函数，与配置文件在同一轮询中检查。
+    """
+    
+    def __init__(self, config_manager, interval=Constants.CONFIG_WATCH_INTERVAL):
+        super().__init__(name="ConfigWatcher", daemon=True)
+        self.config_manager = config_manager
+        self.interval = interval
+        self._checks = []
+        self._stop_event = threading.Event()
+    
+    def watch(self, check):
+        """登记额外的检查函数（无参数，自行比较文件签名并重新加载）"""
+        self._checks.append(check)
+    
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            for check in [self.config_manager.reload_if_changed] + self._checks:
+                try:
+                    check()
+                except Exception as e:
+                    log(f"配置文件监视异常: {e}")
+    
+    def stop(self):
+        self._stop_event.set()
+
+class ConfigSnapshot(namedtuple('ConfigSnapshot', list(ConfigManager.DEFAULT_CONFIG) + ['qmt_dir_lower', 'delete_folder_list',
+                                                                                         'trading_day_only_task_set',
+                                                                                         'catchup_policy_map'])):
+    """配置快照 - 由配置字典编译得到的不可变类型化视图
+
+    在加载或修改配置时编译一次：时间字符串预解析为 datetime.time（留空为None），
+    间隔校验为合法整数，路径规范化。监控、通知等热路径直接读取
+    ConfigManager.snapshot 的属性，无需加锁，也不再重复解析字符串。
+    """
+
+    __slots__ = ()
+
+    TIME_KEYS = ('qmt_run_time', 'qmt_shutdown_time', 'rainbow_restart_time', 'rainbow_shutdown_time',
+                 'system_shutdown_time', 'notification_start_time', 'notification_end_time', 'preopen_routine_time',
+                 'preopen_ready_by')
+    INT_KEYS = {  # 配置项 -> 最小值
+        'monitor_interval': 1,
+        'notification_interval': 0,
+        'notification_coalesce_window': 0,
+        'notify_backend_timeout': 1,
+        'schedule_catchup_grace': 0,
+        'memory_rss_budget_mb': 0,
+        'guardian_rss_limit_mb': 0,
+        'guardian_thread_limit': 0,
+        'guardian_handle_limit': 0
+    }
+    BOOL_KEYS = ('qmt_only_vip', 'enable_qmt_shutdown', 'enable_rainbow_shutdown', 'enable_startup',
+                 'enable_system_shutdown', 'schedule_running', 'enable_feishu_notification', 'feishu_at_all')
+    PATH_KEYS = ('qmt_dir', 'rainbow_exe_path', 'delete_base_path', 'notify_file_path', 'trading_calendar_path')
+
+    @classmethod
+    def compile(cls, config):
+        """编译配置字典，无效值回退为默认值并记录日志"""
+        defaults = ConfigManager.DEFAULT_CONFIG
+        values = {}
+        for key, default in defaults.items():
+            raw = config.get(key, default)
+            try:
+                values[key] = cls._convert(key, raw)
+            except (TypeError, ValueError):
+                log(f"配置项 {key} 的值无效 ({raw!r})，使用默认值 {default!r}")
+                values[key] = cls._convert(key, default)
+
+        values['qmt_dir_lower'] = values['qmt_dir'].lower()
+        values['delete_folder_list'] = tuple(
+            name.strip() for name in (config.get('delete_folders') or '').split(',') if name.strip()
+        )
+        values['trading_day_only_task_set'] = frozenset(
+            key.strip() for key in (values['trading_day_only_tasks'] or '').split(',') if key.strip()
+        )
+        values['catchup_policy_map'] = cls._parse_catchup_policies(values['schedule_catchup_policy'])
+        return cls(**values)
+
+    @staticmethod
+    def _parse_catchup_policies(raw):
+        """解析 "任务=策略,..." 为字典，无法识别的策略按 skip 处理"""
+        policies = {}
+        for item in (raw or '').split(','):
+            key, _, policy = item.partition('=')
+            key, policy = key.strip(), policy.strip()
+            if not key:
+                continue
+            if policy not in ScheduledJob.CATCHUP_POLICIES:
+                log(f"定时任务 {key} 的补执行策略无效 ({policy!r})，按 skip 处理")
+                policy = ScheduledJob.CATCHUP_SKIP
+            policies[key] = policy
+        return policies
+
+    @classmethod
+    def _convert(cls, key, raw):
+        if key in cls.TIME_KEYS:
+            return parse_time_of_day(raw) if raw and str(raw).strip() else None
+        if key in cls.INT_KEYS:
+            value = int(raw)
+            if value < cls.INT_KEYS[key]:
+                raise ValueError(f"不能小于 {cls.INT_KEYS[key]}")
+            return value
+        if key in cls.BOOL_KEYS:
+            if not isinstance(raw, (bool, int)):
+                raise TypeError("需要布尔值")
+            return bool(raw)
+        if key in cls.PATH_KEYS:
+            raw = (raw or '').strip()
+            return os.path.normpath(raw) if raw else ''
+        return raw
 
 # ====================================================================
 # 工具函数模块
 # ====================================================================
+class LogSampler:
+    """日志采样器 - 按消息模板限速，并把重复消息合并为"重复N次"汇总
+
+    模板：状态类消息（主题在 STATE_TOPICS 中，如 "QMT状态: 运行中"）取主题，其余消息取把数字替换为 # 后的整条消息，
+    因此 "QMT状态: 运行中" 与 "QMT状态: 未运行" 属于同一模板，状态切换会作为内容变化立即输出；
+    "配置已更新: …"、"飞书通知发送成功: …" 等前缀相同而内容不同的消息各自成为模板，互不挤占限速额度。
+    与同模板上一条完全相同的消息不再逐条输出，每隔 LOG_REPEAT_SUMMARY_INTERVAL 秒或内容变化时输出一条汇总；
+    同模板内容不断变化的消息按令牌桶限速，超出部分计数后汇总。偶发的错误日志不受影响。
+    """
+
+    NUMBER_PATTERN = re.compile(r'\d+(?:\.\d+)?')
+    TOPIC_PATTERN = re.compile(r'^([^:：\s]{1,20})[:：]\s')
+    STATE_TOPICS = frozenset(("QMT状态", "网络状态"))  # 监控线程周期性上报的状态，按主题合并
+
+    def __init__(self, summary_interval=Constants.LOG_REPEAT_SUMMARY_INTERVAL,
+                 rate_per_minute=Constants.LOG_TEMPLATE_RATE_PER_MINUTE, burst=Constants.LOG_TEMPLATE_BURST,
+                 max_templates=Constants.LOG_MAX_TEMPLATES):
+        self.summary_interval = summary_interval
+        self.rate_per_minute = rate_per_minute
+        self.burst = burst
+        self.max_templates = max_templates
+        self._templates = OrderedDict()  # 模板 -> 状态，按最近使用排序
+        self._lock = threading.Lock()
+        self.stats = {'emitted': 0, 'repeated': 0, 'limited': 0}
+
+    def admit(self, message, now=None):
+        """处理一条消息，返回需要输出的文本列表（可能为空，或先输出上一条的重复汇总）"""
+        now = time.monotonic() if now is None else now
+        template = self.template_of(message)
+        output = []
+        with self._lock:
+            state = self._templates.get(template)
+            if state is None:
+                state = {'last': None, 'repeats': 0, 'since': now, 'limited': 0,
+                         'bucket': TokenBucket(self.rate_per_minute / 60.0, self.burst)}
+                self._templates[template] = state
+                if len(self._templates) > self.max_templates:
+                    self._templates.popitem(last=False)
+            else:
+                self._templates.move_to_end(template)
+
+            if message == state['last']:
+                state['repeats'] += 1
+                self.stats['repeated'] += 1
+                if now - state['since'] >= self.summary_interval:
+                    output.append(self._summary_locked(state, now))
+                return output
+
+            if state['repeats']:
+                output.append(self._summary_locked(state, now))
+            if state['bucket'].try_acquire(now):
+                state['last'] = message
+                state['since'] = now
+                output.append(message)
+                self.stats['emitted'] += 1
+            else:
+                state['limited'] += 1
+                self.stats['limited'] += 1
+        return output
+
+    def sweep(self, now=None, force=False):
+        """输出到期（或 force 时全部）的重复汇总和限速丢弃计数"""
+        now = time.monotonic() if now is None else now
+        output = []
+        with self._lock:
+            for template, state in self._templates.items():
+                if not (force or now - state['since'] >= self.summary_interval):
+                    continue
+                if state['repeats']:
+                    output.append(self._summary_locked(state, now))
+                if state['limited']:
+                    output.append(f"[LOG] 日志限速：模板「{template}」丢弃 {state['limited']} 条")
+                    state['limited'] = 0
+        return output
+
+    @classmethod
+    def template_of(cls, message):
+        topic = cls.TOPIC_PATTERN.match(message)
+        if topic and topic.group(1) in cls.STATE_TOPICS:
+            return topic.group(1)
+        return cls.NUMBER_PATTERN.sub('#', message)
+
+    @staticmethod
+    def _summary_locked(state, now):
+        summary = f"{state['last']}（最近{now - state['since']:.0f}秒内重复 {state['repeats']} 次）"
+        state['repeats'] = 0
+        state['since'] = now
+        return summary
+
+class AsyncLogWriter:
+    """异步日志写入器 - 调用方入队即返回，由单个写入线程批量输出
+
+    写入线程每批最多取 LOG_BATCH_SIZE 条，合并为一次控制台写入和一次文件写入。
+    日志文件按大小或日期滚动，滚动出的文件在后台线程中gzip压缩，超出保留数量的旧文件被删除。
+    """
+
+    def __init__(self, log_dir, filename=Constants.LOG_FILENAME, max_bytes=Constants.LOG_MAX_BYTES,
+                 backup_count=Constants.LOG_BACKUP_COUNT, console=True):
+        self.log_dir = log_dir
+        self.console = console  # 是否同时输出到控制台
+        self.path = os.path.join(log_dir, filename)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._queue = queue.Queue(maxsize=Constants.LOG_QUEUE_MAX)
+        self._dropped = 0
+        self._file = None
+        self._file_date = None
+        self.sampler = LogSampler()
+        self._next_sweep = time.monotonic() + 1.0
+        self._thread = threading.Thread(target=self._run, name="LogWriter", daemon=True)
+        self._thread.start()
+
+    def write(self, line):
+        """入队一行日志（队列满时丢弃并计数，不阻塞调用方）"""
+        try:
+            self._queue.put_nowait(line)
+        except queue.Full:
+            self._dropped += 1
+
+    def flush(self, timeout=2.0):
+        """等待队列中的日志写出（程序退出时调用，同时输出尚未汇总的重复消息）"""
+        for text in self.sampler.sweep(force=True):
+            self.write(f"[{time.strftime(Constants.DATETIME_FORMAT)}] {text}")
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                self._rotate_if_needed()
+                self._write_summaries()
+                continue
+
+            lines, waiters = [], []
+            while True:
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    lines.append(item)
+                if len(lines) >= Constants.LOG_BATCH_SIZE:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            if self._dropped:
+                dropped, self._dropped = self._dropped, 0
+                lines.append(f"[{time.strftime(Constants.DATETIME_FORMAT)}] [LOG] 日志队列已满，丢弃 {dropped} 条日志")
+            if lines:
+                self._write_batch("\n".join(lines) + "\n")
+            for waiter in waiters:
+                waiter.set()
+            self._write_summaries()
+
+    def _write_summaries(self):
+        """每秒至多一次检查到期的重复汇总"""
+        now = time.monotonic()
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + 1.0
+        summaries = self.sampler.sweep(now)
+        if summaries:
+            stamp = time.strftime(Constants.DATETIME_FORMAT)
+            self._write_batch("".join(f"[{stamp}] {text}\n" for text in summaries))
+
+    def _write_batch(self, text):
+        if self.console:
+            try:
+                sys.stdout.write(text)
+                sys.stdout.flush()
+            except Exception:
+                try:
+                    sys.stdout.write(text.encode('ascii', errors='ignore').decode('ascii'))
+                    sys.stdout.flush()
+                except Exception:
+                    pass
+
+        try:
+            self._rotate_if_needed()
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+                self._file_date = time.strftime('%Y%m%d')
+            self._file.write(text)
+            self._file.flush()
+        except Exception:
+            self._file = None  # 文件写入失败时仅输出到控制台，下批重试
+
+    def _rotate_if_needed(self):
+        """日期变化或文件超过大小上限时滚动"""
+        if self._file is None:
+            return
+        today = time.strftime('%Y%m%d')
+        try:
+            too_large = self._file.tell() >= self.max_bytes
+        except Exception:
+            too_large = False
+        if today == self._file_date and not too_large:
+            return
+
+        self._file.close()
+        self._file = None
+        base = os.path.join(self.log_dir, f"{os.path.splitext(os.path.basename(self.path))[0]}-"
+                                          f"{self._file_date}-{time.strftime('%H%M%S')}")
+        rotated, seq = base + ".log", 1
+        while os.path.exists(rotated) or os.path.exists(rotated + ".gz"):
+            rotated, seq = f"{base}-{seq}.log", seq + 1
+        try:
+            os.replace(self.path, rotated)
+        except OSError:
+            return
+        threading.Thread(target=self._compress_and_prune, args=(rotated,), name="LogCompressor", daemon=True).start()
+
+    def _compress_and_prune(self, rotated):
+        """后台压缩滚动出的日志，并删除超出保留数量的旧归档"""
+        try:
+            with open(rotated, 'rb') as src, gzip.open(rotated + '.gz', 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(rotated)
+        except Exception:
+            pass
+
+        prefix = os.path.splitext(os.path.basename(self.path))[0] + '-'
+        try:
+            archives = sorted((os.path.join(self.log_dir, name) for name in os.listdir(self.log_dir)
+                               if name.startswith(prefix) and name.endswith('.log.gz')),
+                              key=os.path.getmtime)
+            for path in archives[:-self.backup_count] if self.backup_count else []:
+                os.remove(path)
+        except Exception:
+            pass
+
+_log_writer = None
+_log_writer_lock = threading.Lock()
+
+def _get_log_writer():
+    """获取全局日志写入器（首次调用时创建）"""
+    global _log_writer
+    if _log_writer is None:
+        with _log_writer_lock:
+            if _log_writer is None:
+                writer = AsyncLogWriter(get_log_dir(), filename=_log_filename, console=_log_console)
+                atexit.register(writer.flush)
+                _log_writer = writer
+    return _log_writer
+
 def log(message):
-    """带时间戳的日志记录"""
+    """带时间戳的日志记录（入队后立即返回，由写入线程输出到控制台和日志文件）"""
     timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
     try:
         if isinstance(message, bytes):
             message = message.decode('utf-8', errors='ignore')
-        print(f"[{timestamp}] {message}", flush=True)
+        message = str(message)
     except Exception:
+        message = "[LOG_ERROR]"
+    line = f"[{timestamp}] {message}"
+    
+    if _log_forwarder:
         try:
-            safe_message = str(message).encode('ascii', errors='ignore').decode('ascii')
-            print(f"[{timestamp}] {safe_message}", flush=True)
-        except:
-            print(f"[{timestamp}] [LOG_ERROR]", flush=True)
+            _log_forwarder({'type': 'log', 'message': message})
+            return
+        except Exception:
+            pass
+    try:
+        writer = _get_log_writer()
+        for text in writer.sampler.admit(message):
+            writer.write(f"[{timestamp}] {text}")
+    except Exception:
+        # 解释器退出等无法启动写入线程的情况，退回同步输出
+        try:
+            print(line, flush=True)
+        except Exception:
+            pass
+
+class EventLog:
+    """结构化事件日志 - 每个事件写为一行紧凑JSON，按日期存放在 logs/events/events-YYYYMMDD.jsonl
+
+    与文本日志互为补充：文本日志给人看，事件日志给查询工具（QMT实盘无限守护_事件查询.py）用。
+    每条记录包含 ts（Unix时间戳，秒）、type（事件类型，如 process.restart）以及该类型的字段。
+    """
+
+    def __init__(self, event_dir, prefix=Constants.EVENT_LOG_PREFIX):
+        self.event_dir = event_dir
+        self.prefix = prefix
+        os.makedirs(event_dir, exist_ok=True)
+        self._queue = queue.Queue(maxsize=Constants.LOG_QUEUE_MAX)
+        self._file = None
+        self._file_date = None
+        self._thread = threading.Thread(target=self._run, name="EventLogWriter", daemon=True)
+        self._thread.start()
+
+    def record(self, event_type, fields):
+        """入队一条事件（不阻塞调用方，队列满时丢弃）"""
+        record = {'ts': round(time.time(), 3), 'type': event_type}
+        for key, value in fields.items():
+            if isinstance(value, float) and (value != value or value in (float('inf'), float('-inf'))):
+                value = None  # JSON 不支持 NaN/Infinity
+            record[key] = value
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+    def flush(self, timeout=2.0):
+        """等待队列中的事件写出（程序退出时调用）"""
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            records, waiters = [], []
+            while True:
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    records.append(item)
+                if len(records) >= Constants.LOG_BATCH_SIZE:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            if records:
+                self._write_batch(records)
+            for waiter in waiters:
+                waiter.set()
+
+    def _write_batch(self, records):
+        # 按记录时间分文件，跨零点的一批记录会分别写入两天的文件
+        for record in records:
+            date = time.strftime('%Y%m%d', time.localtime(record['ts']))
+            try:
+                if date != self._file_date:
+                    if self._file:
+                        self._file.close()
+                    self._file = open(os.path.join(self.event_dir, f"{self.prefix}{date}.jsonl"),
+                                      'a', encoding='utf-8')
+                    self._file_date = date
+                self._file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':'), default=str) + "\n")
+            except Exception:
+                self._file, self._file_date = None, None
+        try:
+            if self._file:
+                self._file.flush()
+        except Exception:
+            pass
+
+_event_log = None
+
+def log_event(event_type, **fields):
+    """记录一条结构化事件（入队后立即返回）
+
+    Args:
+        event_type: 事件类型，按 类别.动作 命名，如 process.restart、probe.server、state.network
+        **fields: 事件字段，值应为可JSON序列化的基本类型
+    """
+    global _event_log
+    try:
+        if _log_forwarder:
+            _log_forwarder({'type': 'event', 'event_type': event_type, 'fields': fields})
+            return
+        if _event_log is None:
+            with _log_writer_lock:
+                if _event_log is None:
+                    event_log = EventLog(os.path.join(get_log_dir(), Constants.EVENT_LOG_DIR_NAME), _event_log_prefix)
+                    atexit.register(event_log.flush)
+                    _event_log = event_log
+        _event_log.record(event_type, fields)
+    except Exception:
+        pass
+
+_log_dir_override = None
+_log_console = True
+_log_forwarder = None
+_log_filename = Constants.LOG_FILENAME
+_event_log_prefix = Constants.EVENT_LOG_PREFIX
+
+def set_log_files(filename, event_prefix):
+    """改用指定的日志文件名和事件日志前缀（监督进程与守护进程各写各的文件），需在首次写日志前调用"""
+    global _log_filename, _event_log_prefix
+    _log_filename = filename
+    _event_log_prefix = event_prefix
+
+def set_log_forwarder(func):
+    """日志和事件不再本地写入，改为以消息字典交给 func（辅助进程转发给主进程统一写入）"""
+    global _log_forwarder
+    _log_forwarder = func
+
+def set_log_dir(path, console=True):
+    """改用指定的日志目录（模拟运行时把配置、状态和日志写到独立目录），需在首次写日志前调用
+
+    console 为 False 时日志只写文件，不输出到控制台
+    """
+    global _log_dir_override, _log_console
+    _log_dir_override = path
+    _log_console = console
+
+def get_log_dir():
+    """获取日志目录（框架根目录下的logs，配置文件、发件箱等均存放于此）"""
+    log_dir = _log_dir_override or os.path.join(os.path.dirname(os.path.dirname(__file__)), Constants.LOG_DIR_NAME)
+    os.makedirs(log_dir, exist_ok=True)
+    return log_dir
+
+@lru_cache(maxsize=128)
+def parse_time_of_day(time_str):
+    """解析 HH:MM:SS 为 datetime.time（带缓存，格式错误抛出 ValueError）"""
+    return datetime.strptime(time_str.strip(), Constants.TIME_FORMAT).time()
 
 def is_valid_time(time_str):
     """验证时间格式，支持空值"""
     if not time_str or time_str.strip() == "":
         return True
     try:
-        time.strptime(time_str, '%H:%M:%S')
+        parse_time_of_day(time_str)
         return True
     except ValueError:
         return False
@@ -346,6 +1703,50 @@ class Worker(threading.Thread):
         except Exception as e:
             log(f"工作线程执行失败: {e}")
 
+class Clock:
+    """系统时钟 - 墙上时间、单调时间、睡眠和条件等待的统一入口
+
+    调度器、监控线程、通知器等通过注入的时钟取时间和等待，模拟运行时替换为 SimulatedClock。
+    """
+
+    def now(self):
+        return datetime.now()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def wait(self, cond, timeout=None):
+        """在 cond 上等待（调用方需已持有 cond），被唤醒返回 True，超时返回 False"""
+        return cond.wait(timeout)
+
+    def notify(self, cond):
+        """唤醒在 cond 上等待的线程（调用方需已持有 cond）"""
+        cond.notify_all()
+
+    def tracked(self, func):
+        """包装将在其他线程执行的函数（模拟时钟据此判断是否还有未完成的工作）"""
+        return func
+
+    def start_thread(self, thread):
+        thread.start()
+        return thread
+
+    def spawn(self, func):
+        """在新的工作线程中执行 func"""
+        return self.start_thread(Worker(self.tracked(func)))
+
+    def call_later(self, delay, func):
+        """delay 秒后在后台线程执行 func，返回可 cancel() 的定时器"""
+        timer = threading.Timer(delay, func)
+        timer.daemon = True
+        timer.start()
+        return timer
+
+SYSTEM_CLOCK = Clock()
+
 # ====================================================================
 # 网络测试模块
 # ====================================================================
@@ -356,43 +1757,462 @@ class NetworkTester:
     def measure_latency(ip, port, timeout=0.1):
         """测量网络延迟（毫秒）"""
         try:
-            start = time.time()
-            with socket.create_connection((ip, int(port)), timeout=timeout):
-                end = time.time()
-                return (end - start) * 1000
-        except Exception:
-            return float('inf')
-    
-    @staticmethod
-    def median_latency(ip, port, count=10):
-        """计算中位数延迟"""
-        latencies = []
-        for _ in range(count):
-            delay = NetworkTester.measure_latency(ip, port)
-            if delay != float('inf'):
-                latencies.append(delay)
-            time.sleep(0.05)
-        return statistics.median(latencies) if latencies else float('inf')
+            start = time.time()
+            with socket.create_connection((ip, int(port)), timeout=timeout):
+                end = time.time()
+                return (end - start) * 1000
+        except Exception:
+            return float('inf')
+    
+    @staticmethod
+    def median_latency(ip, port, count=10):
+        """计算中位数延迟"""
+        latencies = []
+        token = current_token()
+        for _ in range(count):
+            token.check()
+            delay = NetworkTester.measure_latency(ip, port)
+            if delay != float('inf'):
+                latencies.append(delay)
+            token.sleep(0.05)
+        return statistics.median(latencies) if latencies else float('inf')
+
+# ====================================================================
+# 飞书通知模块
+# ====================================================================
+class TokenBucket:
+    """令牌桶 - 以固定速率补充令牌，允许不超过容量的突发"""
+
+    def __init__(self, rate, capacity, now=None):
+        """
+        Args:
+            rate: 每秒补充的令牌数
+            capacity: 桶容量（最大突发数）
+            now: 创建时刻（单调时钟秒数），默认取当前时间
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic() if now is None else now
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def try_acquire(self, now=None):
+        """尝试取出一个令牌，成功返回True"""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self, now=None):
+        """距离下一个令牌可用的秒数"""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        if self.tokens >= 1 or self.rate <= 0:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+class NotificationRateLimiter:
+    """通知限流器 - 线程安全的全局令牌桶 + 分类令牌桶 + 内容去重
+
+    - 全局令牌桶：保证整体发送速率不超过飞书Webhook限制
+    - 分类令牌桶：同一类通知（如 network_status）按配置的通知间隔限频
+    - 内容去重：窗口期内相同内容的消息无论属于哪一类都只发送一次
+    """
+
+    # acquire 的判定结果
+    SEND = "send"
+    SUPPRESS = "suppress"  # 重复内容，直接丢弃
+    DEFER = "defer"        # 全局速率已满，稍后重试
+
+    def __init__(self, rate_per_minute=Constants.FEISHU_RATE_PER_MINUTE, burst=Constants.FEISHU_BURST,
+                 dedup_window=Constants.FEISHU_DEDUP_WINDOW, clock=None):
+        self.dedup_window = dedup_window
+        self.clock = clock or SYSTEM_CLOCK
+        self._lock = threading.Lock()
+        self._global_bucket = TokenBucket(rate_per_minute / 60.0, burst, now=self.clock.monotonic())
+        self._key_buckets = {}
+        self._recent_hashes = {}  # 内容哈希 -> 最近发送时间（monotonic）
+        self._stats = {'sent': 0, 'suppressed': 0, 'deferred': 0}
+
+    def allow_key(self, notification_key, interval_seconds):
+        """分类限频：同一类通知在 interval_seconds 内最多放行一次
+
+        被拒绝的通知由调用方（聚合器）保留并稍后重试，计为 deferred。
+        """
+        with self._lock:
+            now = self.clock.monotonic()
+            bucket = self._key_buckets.get(notification_key)
+            rate = 1.0 / interval_seconds if interval_seconds > 0 else float('inf')
+            if bucket is None:
+                bucket = self._key_buckets[notification_key] = TokenBucket(rate, 1, now=now)
+            elif bucket.rate != rate:
+                bucket._refill(now)
+                bucket.rate = rate
+            if interval_seconds <= 0 or bucket.try_acquire(now):
+                return True
+            self._stats['deferred'] += 1
+            return False
+
+    def acquire(self, content_hash, dedup=True):
+        """发送前检查，返回 (判定结果, 建议重试等待秒数)
+
+        判定为 SEND 后调用方须在发送结束时调用 complete()：只有送达的消息才记入去重和发送计数，
+        未送达的归还全局令牌。dedup=False 跳过内容去重（发件箱中此前发送失败的消息）。
+        """
+        with self._lock:
+            now = self.clock.monotonic()
+            self._prune_locked(now)
+
+            last_sent = self._recent_hashes.get(content_hash)
+            if dedup and last_sent is not None and now - last_sent < self.dedup_window:
+                self._stats['suppressed'] += 1
+                return self.SUPPRESS, 0.0
+
+            if not self._global_bucket.try_acquire(now):
+                self._stats['deferred'] += 1
+                return self.DEFER, self._global_bucket.wait_time(now)
+
+            return self.SEND, 0.0
+
+    def complete(self, content_hash, delivered):
+        """记录一次发送的结果：送达则记入去重窗口和发送计数，否则归还 acquire 取出的全局令牌"""
+        with self._lock:
+            if delivered:
+                self._recent_hashes[content_hash] = self.clock.monotonic()
+                self._stats['sent'] += 1
+            else:
+                bucket = self._global_bucket
+                bucket.tokens = min(bucket.capacity, bucket.tokens + 1)
+
+    def get_stats(self):
+        """获取发送/去重丢弃/推迟的计数"""
+        with self._lock:
+            return dict(self._stats)
+
+    def export_key_state(self):
+        """分类令牌桶状态（通知类别 -> 速率、剩余令牌），交接给重新拉起的守护进程"""
+        with self._lock:
+            now = self.clock.monotonic()
+            state = {}
+            for key, bucket in self._key_buckets.items():
+                bucket._refill(now)
+                state[key] = {'rate': bucket.rate, 'tokens': bucket.tokens}
+            return state
+
+    def restore_key_state(self, state, elapsed=0.0):
+        """恢复交接的分类令牌桶，elapsed 为交接间隔（秒），期间按速率补充令牌"""
+        with self._lock:
+            now = self.clock.monotonic()
+            for key, entry in state.items():
+                bucket = self._key_buckets[key] = TokenBucket(entry['rate'], 1, now=now)
+                bucket.tokens = min(1, entry['tokens'] + elapsed * entry['rate'])
+
+    def _prune_locked(self, now):
+        if len(self._recent_hashes) > 256:
+            cutoff = now - self.dedup_window
+            self._recent_hashes = {h: t for h, t in self._recent_hashes.items() if t >= cutoff}
+
+class NotificationOutbox:
+    """通知发件箱 - 追加写的磁盘日志，保证断网或程序崩溃时通知不丢失
+
+    文件为JSON Lines格式，每行一条记录：
+        {"op": "put", "id": ..., ...}  待发送的通知（发送前立即写入）
+        {"op": "ack", "id": ...}       通知已送达（批量写入）
+    重启后按顺序回放，put 未被 ack 的通知即为待补发通知。
+    通知ID为内容哈希，相同内容的未送达通知只保留一条。
+    """
+
+    def __init__(self, path, flush_interval=Constants.OUTBOX_FLUSH_INTERVAL,
+                 fsync_interval=Constants.OUTBOX_FSYNC_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self._cond = threading.Condition()
+        self._pending = OrderedDict()  # 通知ID -> put记录，按入队顺序排列
+        self._ack_buffer = []
+        self._line_count = 0
+        self._dirty = False
+        self._last_fsync = 0.0
+        self._closed = False
+
+        self._load()
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._syncer = threading.Thread(target=self._sync_loop, name="OutboxSyncer", daemon=True)
+        self._syncer.start()
+
+        if self._pending:
+            log(f"通知发件箱中有 {len(self._pending)} 条未送达通知，将在网络恢复后补发")
+
+    @staticmethod
+    def message_id(title, content, msg_type):
+        """根据通知内容计算ID（用于去重）"""
+        raw = f"{title}\x00{content}\x00{msg_type}".encode('utf-8')
+        return hashlib.sha1(raw).hexdigest()[:16]
+
+    def enqueue(self, title, content, msg_type, timestamp):
+        """发送前写入发件箱，返回通知ID
+
+        put 记录同步写入文件（仅一次小写入，不等待fsync），
+        程序崩溃后仍可恢复；fsync 由后台线程按间隔批量执行。
+        """
+        msg_id = self.message_id(title, content, msg_type)
+        with self._cond:
+            if msg_id in self._pending:
+                return msg_id  # 相同内容的通知已在待发送队列中
+
+            record = {
+                'op': 'put',
+                'id': msg_id,
+                'created': time.time(),
+                'title': title,
+                'content': content,
+                'msg_type': msg_type,
+                'timestamp': timestamp
+            }
+            self._pending[msg_id] = record
+            self._write_lines_locked([record])
+            self._trim_locked()
+            self._cond.notify()
+        return msg_id
+
+    def mark_delivered(self, msg_id):
+        """标记通知已送达（ack 记录批量写入）"""
+        with self._cond:
+            if self._pending.pop(msg_id, None) is not None:
+                self._ack_buffer.append({'op': 'ack', 'id': msg_id})
+                self._cond.notify()
+
+    def pending_records(self):
+        """按入队顺序返回未送达通知（过期通知会被丢弃并记录日志）"""
+        with self._cond:
+            self._expire_locked()
+            return list(self._pending.values())
+
+    def pending_count(self):
+        """未送达通知数量"""
+        with self._cond:
+            return len(self._pending)
+
+    def close(self):
+        """写入剩余记录并关闭文件"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._flush_locked(force_fsync=True)
+            self._file.close()
+            self._cond.notify()
+
+    def _load(self):
+        """回放发件箱文件，恢复未送达通知"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    self._line_count += 1
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # 崩溃时写了一半的行
+                    if record.get('op') == 'put':
+                        self._pending[record['id']] = record
+                    elif record.get('op') == 'ack':
+                        self._pending.pop(record.get('id'), None)
+            self._expire_locked()
+        except Exception as e:
+            log(f"读取通知发件箱失败: {e}")
+
+    def _sync_loop(self):
+        """后台线程：批量写入 ack 记录、限频 fsync、必要时压缩文件"""
+        while True:
+            with self._cond:
+                self._cond.wait(self.flush_interval)
+                if self._closed:
+                    return
+                try:
+                    self._flush_locked()
+                    if self._line_count > Constants.OUTBOX_COMPACT_LINES:
+                        self._compact_locked()
+                except Exception as e:
+                    log(f"通知发件箱写入失败: {e}")
+
+    def _write_lines_locked(self, records):
+        self._file.write(''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in records))
+        self._file.flush()
+        self._line_count += len(records)
+        self._dirty = True
+
+    def _flush_locked(self, force_fsync=False):
+        if self._ack_buffer:
+            self._write_lines_locked(self._ack_buffer)
+            self._ack_buffer = []
+        now = time.time()
+        if self._dirty and (force_fsync or now - self._last_fsync >= self.fsync_interval):
+            os.fsync(self._file.fileno())
+            self._dirty = False
+            self._last_fsync = now
+
+    def _compact_locked(self):
+        """只保留未送达通知，原子替换发件箱文件"""
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for record in self._pending.values():
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self._file.close()
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._line_count = len(self._pending)
+        self._dirty = False
+
+    def _expire_locked(self):
+        cutoff = time.time() - Constants.OUTBOX_MAX_AGE
+        expired = [msg_id for msg_id, r in self._pending.items() if r.get('created', 0) < cutoff]
+        for msg_id in expired:
+            record = self._pending.pop(msg_id)
+            self._ack_buffer.append({'op': 'ack', 'id': msg_id})
+            log(f"未送达通知已过期，放弃补发: {record.get('title')} ({record.get('timestamp')})")
+
+    def _trim_locked(self):
+        while len(self._pending) > Constants.OUTBOX_MAX_PENDING:
+            msg_id, record = self._pending.popitem(last=False)
+            self._ack_buffer.append({'op': 'ack', 'id': msg_id})
+            log(f"未送达通知过多，丢弃最早的一条: {record.get('title')} ({record.get('timestamp')})")
 
-# ====================================================================
-# 飞书通知模块
-# ====================================================================
 class FeishuNotifier:
     """飞书通知器 - 发送消息到群聊"""
     
-    def __init__(self, webhook_url, at_all=False):
+    # _deliver 的发送结果
+    DELIVERED = "delivered"  # 已送达
+    RETRY = "retry"          # 网络异常/服务端错误/限流，稍后可重试
+    REJECTED = "rejected"    # 被飞书拒绝（如Webhook无效），重试无意义
+    
+    def __init__(self, webhook_url, at_all=False, outbox=None, clock=None):
         self.webhook_url = webhook_url
         self.at_all = at_all
-        self.last_notification_time = {}
-        
-    def send_message(self, title, content, msg_type="info"):
-        """发送消息到飞书"""
+        self.outbox = outbox
+        self.clock = clock or SYSTEM_CLOCK  # 通知时间段判断、限流和消息时间戳使用的时钟
+        self.rate_limiter = NotificationRateLimiter(clock=self.clock)
+        self._delivery_lock = threading.Lock()
+        self._replay_event = threading.Event()
+        self._next_replay_at = time.monotonic()  # 启动后立即检查一次积压
+        
+        if self.outbox is not None:
+            threading.Thread(target=self._replay_loop, name="FeishuReplay", daemon=True).start()
+        
+    def send_message(self, title, content, msg_type="info", wait=True):
+        """发送消息到飞书
+
+        配置了发件箱时，消息先写入发件箱再发送；若有更早的未送达消息，
+        会先按顺序补发它们，保证群聊中的通知顺序与产生顺序一致。
+        未配置发件箱时，全局速率已满则等待令牌恢复后发送；wait 为 False 时不等待，
+        直接按限流返回 False（界面线程上的测试通知不能阻塞窗口）。
+        """
         if not self.webhook_url:
             log("飞书Webhook URL未配置，跳过通知")
             return False
-            
+        
+        timestamp = self.clock.now().strftime("%Y-%m-%d %H:%M:%S")
+        if self.outbox is None:
+            content_hash = NotificationOutbox.message_id(title, content, msg_type)
+            decision, wait_seconds = self.rate_limiter.acquire(content_hash)
+            if decision == NotificationRateLimiter.DEFER:
+                if not wait:
+                    log(f"飞书通知限流中，{wait_seconds:.0f}秒后才能发送，跳过: {title}")
+                    return False
+                self.clock.sleep(wait_seconds)
+                decision, _ = self.rate_limiter.acquire(content_hash)
+            if decision != NotificationRateLimiter.SEND:
+                log(f"飞书通知被限流跳过: {title}")
+                return False
+            delivered = self._deliver(title, content, msg_type, timestamp) == self.DELIVERED
+            self.rate_limiter.complete(content_hash, delivered)
+            return delivered
+        
+        msg_id = self.outbox.enqueue(title, content, msg_type, timestamp)
+        return self.replay_pending(current_id=msg_id)
+    
+    def replay_pending(self, current_id=None):
+        """按顺序发送发件箱中的未送达消息，遇到失败即停止（等待下次重试）
+
+        Args:
+            current_id: 本次新产生的消息ID，该条不标记为补发
+
+        Returns:
+            bool: 指定 current_id 时返回该消息是否送达，否则返回是否全部送达
+        """
+        if self.outbox is None or not self.webhook_url:
+            return False
+        
+        with self._delivery_lock:
+            for record in self.outbox.pending_records():
+                replayed = record['id'] != current_id
+                # 此前发送失败、仍在发件箱中的消息不做内容去重，否则窗口期内的补发会被当作重复丢弃
+                decision, wait_seconds = self.rate_limiter.acquire(record['id'], dedup=not replayed)
+                if decision == NotificationRateLimiter.DEFER:
+                    # 全局速率已满：保留在发件箱中，由补发线程在令牌恢复后发送
+                    self._schedule_replay(wait_seconds)
+                    return False
+                if decision == NotificationRateLimiter.SUPPRESS:
+                    log(f"飞书通知内容重复，已去重: {record['title']}")
+                    self.outbox.mark_delivered(record['id'])
+                    continue
+                
+                title = f"{record['title']}（补发）" if replayed else record['title']
+                result = self._deliver(title, record['content'], record['msg_type'], record['timestamp'])
+                self.rate_limiter.complete(record['id'], result == self.DELIVERED)
+                if result == self.RETRY:
+                    self._schedule_replay(Constants.FEISHU_REPLAY_INTERVAL)
+                    return False
+                # 已送达或被飞书明确拒绝（重发也不会成功），都从发件箱移除
+                self.outbox.mark_delivered(record['id'])
+                if result == self.REJECTED:
+                    if not replayed:
+                        return False
+                    continue
+                if replayed:
+                    log(f"补发通知成功: {record['title']} ({record['timestamp']})")
+            return True
+    
+    def _replay_loop(self):
+        """后台补发线程：定期检查发件箱，网络恢复后补发积压消息"""
+        while True:
+            timeout = max(0.0, self._next_replay_at - time.monotonic())
+            if self._replay_event.wait(timeout):
+                self._replay_event.clear()
+                continue  # 补发时间被提前，重新计算等待时间
+            self._next_replay_at = time.monotonic() + Constants.FEISHU_REPLAY_INTERVAL
+            try:
+                if self.outbox.pending_count():
+                    self.replay_pending()
+            except Exception as e:
+                log(f"补发飞书通知异常: {e}")
+    
+    def _schedule_replay(self, delay):
+        """让补发线程在 delay 秒后检查发件箱"""
+        replay_at = time.monotonic() + max(delay, 0.1)
+        if replay_at < self._next_replay_at:
+            self._next_replay_at = replay_at
+            self._replay_event.set()
+    
+    def get_stats(self):
+        """获取通知发送统计（已发送/去重丢弃/推迟）"""
+        stats = self.rate_limiter.get_stats()
+        if self.outbox is not None:
+            stats['pending'] = self.outbox.pending_count()
+        return stats
+    
+    def _deliver(self, title, content, msg_type, timestamp):
+        """实际发送一条飞书卡片消息，返回 DELIVERED / RETRY / REJECTED"""
         try:
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             color_map = {"info": "blue", "warning": "orange", "error": "red", "success": "green"}
             color = color_map.get(msg_type, "blue")
             message = {
@@ -445,38 +2265,425 @@ class FeishuNotifier:
                 result = response.json()
                 if result.get("code") == 0:
                     log(f"飞书通知发送成功: {title}")
-                    return True
+                    return self.DELIVERED
                 else:
                     log(f"飞书通知发送失败: {result.get('msg', '未知错误')}")
-                    return False
+                    if result.get("code") == Constants.FEISHU_FREQUENCY_LIMIT_CODE:
+                        return self.RETRY
+                    return self.REJECTED
             else:
                 log(f"飞书通知发送失败，HTTP状态码: {response.status_code}")
-                return False
+                if response.status_code == 429 or response.status_code >= 500:
+                    return self.RETRY
+                return self.REJECTED
                 
         except Exception as e:
             log(f"发送飞书通知异常: {str(e)}")
-            return False
+            return self.RETRY
     
     def should_send_notification(self, notification_key, interval_seconds=300):
-        """检查是否应该发送通知（防频繁通知）"""
-        current_time = time.time()
-        last_time = self.last_notification_time.get(notification_key, 0)
-        
-        if current_time - last_time >= interval_seconds:
-            self.last_notification_time[notification_key] = current_time
-            return True
-        return False
+        """检查是否应该发送通知（防频繁通知，线程安全）"""
+        return self.rate_limiter.allow_key(notification_key, interval_seconds)
     
     def is_notification_time(self, start_time="09:00:00", end_time="15:30:00"):
-        """检查当前是否在通知时间段内"""
+        """检查当前是否在通知时间段内
+
+        start_time/end_time 可以是 datetime.time（配置快照中预解析的值）或 HH:MM:SS 字符串
+        """
         try:
-            current_time = datetime.now().time()
-            start = datetime.strptime(start_time, "%H:%M:%S").time()
-            end = datetime.strptime(end_time, "%H:%M:%S").time()
+            current_time = self.clock.now().time()
+            start = start_time if isinstance(start_time, dt_time) else parse_time_of_day(start_time)
+            end = end_time if isinstance(end_time, dt_time) else parse_time_of_day(end_time)
             return start <= current_time <= end
         except:
             return True  # 如果时间格式错误，默认允许通知
 
+class NotificationAggregator:
+    """通知聚合器 - 将短时间窗口内的多条通知合并为一张摘要卡片
+
+    同一标题的事件合并为一条，记录次数、首次/最近时间和最差值；
+    被频率限制拦下的事件保留在缓冲区中稍后重试，不会被静默丢弃。
+    """
+
+    SEVERITY_ORDER = {"success": 0, "info": 1, "warning": 2, "error": 3}
+
+    def __init__(self, notifier, window_seconds=Constants.NOTIFICATION_COALESCE_WINDOW,
+                 gate=None, retry_seconds=Constants.NOTIFICATION_DEFER_RETRY, clock=None):
+        """
+        Args:
+            notifier: 实际发送消息的通知器（需提供 send_message）
+            window_seconds: 聚合窗口（秒），0 表示每条事件立即发送
+            gate: 可选回调 gate(notification_key) -> bool，决定某类通知此刻能否发出
+            retry_seconds: 被 gate 拦下的事件重新尝试发送的间隔（秒）
+            clock: 事件时间和延迟发送使用的时钟
+        """
+        self.notifier = notifier
+        self.window_seconds = window_seconds
+        self.gate = gate
+        self.retry_seconds = retry_seconds
+        self.clock = clock or SYSTEM_CLOCK
+        self._lock = threading.Lock()
+        self._pending = {}  # 标题 -> 聚合条目，保持事件首次出现的顺序
+        self._timer = None
+
+    def add(self, title, content, msg_type="info", notification_key=None, value=None, unit=""):
+        """加入一条通知事件
+
+        Args:
+            title: 通知标题，同标题事件会被合并
+            content: 通知内容（合并时保留最新一条）
+            msg_type: 消息类型 info/warning/error/success，合并后取最严重的
+            notification_key: 频率限制分组，为空则不经过 gate 检查
+            value: 可选数值（如延迟毫秒），合并后保留最差（最大）值
+            unit: 数值单位，仅用于展示
+        """
+        now = self.clock.now()
+        with self._lock:
+            entry = self._pending.get(title)
+            if entry is None:
+                entry = {
+                    'title': title,
+                    'key': notification_key,
+                    'msg_type': msg_type,
+                    'count': 0,
+                    'first_time': now,
+                    'last_time': now,
+                    'content': content,
+                    'worst_value': None,
+                    'unit': unit
+                }
+                self._pending[title] = entry
+
+            entry['count'] += 1
+            entry['last_time'] = now
+            entry['content'] = content
+            if self._severity(msg_type) > self._severity(entry['msg_type']):
+                entry['msg_type'] = msg_type
+            if value is not None and (entry['worst_value'] is None or value > entry['worst_value']):
+                entry['worst_value'] = value
+
+            self._schedule_flush_locked(self.window_seconds)
+
+        if self.window_seconds <= 0:
+            self.flush()
+
+    def flush(self, force=False):
+        """发送缓冲区中的事件
+
+        Args:
+            force: 为 True 时忽略 gate，全部发送（用于程序退出前）
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+            allowed_keys = {}
+            ready = []
+            deferred = {}
+            for title, entry in self._pending.items():
+                key = entry['key']
+                if key not in allowed_keys:
+                    allowed_keys[key] = force or key is None or self.gate is None or self.gate(key)
+                if allowed_keys[key]:
+                    ready.append(entry)
+                else:
+                    deferred[title] = entry
+
+            self._pending = deferred
+            if deferred:
+                self._schedule_flush_locked(self.retry_seconds)
+
+        if ready:
+            self._send_digest(ready)
+        return len(ready)
+
+    def pending_count(self):
+        """当前缓冲中的事件条目数"""
+        with self._lock:
+            return len(self._pending)
+
+    def _schedule_flush_locked(self, delay):
+        """在持有锁的前提下安排一次延迟发送（已安排则不重复）"""
+        if self._timer is None and delay > 0:
+            self._timer = self.clock.call_later(delay, self.flush)
+
+    def _send_digest(self, entries):
+        """将聚合条目格式化为一张卡片发送"""
+        if len(entries) == 1 and entries[0]['count'] == 1:
+            entry = entries[0]
+            return self.notifier.send_message(entry['title'], entry['content'], entry['msg_type'])
+
+        total = sum(entry['count'] for entry in entries)
+        msg_type = max((entry['msg_type'] for entry in entries), key=self._severity)
+        title = entries[0]['title'] if len(entries) == 1 else f"监控事件汇总 ({len(entries)}类)"
+
+        sections = []
+        for entry in entries:
+            lines = [f"【{entry['title']}】 ×{entry['count']}"]
+            first = entry['first_time'].strftime(Constants.TIME_FORMAT)
+            last = entry['last_time'].strftime(Constants.TIME_FORMAT)
+            lines.append(f"首次: {first}  最近: {last}" if entry['count'] > 1 else f"时间: {first}")
+            if entry['worst_value'] is not None:
+                lines.append(f"最差值: {self._format_value(entry['worst_value'], entry['unit'])}")
+            lines.append(f"最新: {entry['content']}")
+            sections.append("\n".join(lines))
+
+        content = f"共 {total} 条事件\n\n" + "\n\n".join(sections)
+        return self.notifier.send_message(title, content, msg_type)
+
+    @classmethod
+    def _severity(cls, msg_type):
+        return cls.SEVERITY_ORDER.get(msg_type, 1)
+
+    @staticmethod
+    def _format_value(value, unit):
+        if value == float('inf'):
+            return "无响应"
+        return f"{value:.2f}{unit}"
+
+# ====================================================================
+# 通知分发模块
+# ====================================================================
+class NotificationEvent:
+    """通知事件 - 由监控线程、定时任务等发布，交给分发器投递到各后端"""
+
+    def __init__(self, title, content, msg_type="info", key=None, value=None, unit="", source=""):
+        """
+        Args:
+            title: 事件标题
+            content: 事件内容
+            msg_type: 消息类型 info/warning/error/success
+            key: 频率限制分组（如 network_status），为空则不按分类限频
+            value: 可选数值（如延迟毫秒）
+            unit: 数值单位
+            source: 事件来源（monitor/schedule）
+        """
+        self.title = title
+        self.content = content
+        self.msg_type = msg_type
+        self.key = key
+        self.value = value
+        self.unit = unit
+        self.source = source
+        self.timestamp = datetime.now().strftime(Constants.DATETIME_FORMAT)
+
+    def to_dict(self):
+        """转换为可JSON序列化的字典"""
+        value = self.value
+        if value is not None and value == float('inf'):
+            value = None  # JSON不支持inf，无响应以null表示
+        return {
+            'timestamp': self.timestamp,
+            'source': self.source,
+            'title': self.title,
+            'content': self.content,
+            'msg_type': self.msg_type,
+            'key': self.key,
+            'value': value,
+            'unit': self.unit
+        }
+
+class NotificationBackend:
+    """通知后端基类 - 子类实现 deliver"""
+
+    name = "backend"
+
+    def __init__(self, timeout=Constants.NOTIFY_BACKEND_TIMEOUT):
+        self.timeout = timeout  # 单次投递的I/O超时（秒）
+
+    def deliver(self, event):
+        """投递一条事件，成功返回True"""
+        raise NotImplementedError
+
+    def close(self):
+        """释放资源（程序退出或后端被移除时调用）"""
+        pass
+
+class FeishuBackend(NotificationBackend):
+    """飞书后端 - 按通知开关和时间段过滤，经聚合器合并后发送卡片"""
+
+    name = "feishu"
+
+    def __init__(self, notifier, config_manager, timeout=Constants.NOTIFY_BACKEND_TIMEOUT):
+        super().__init__(timeout)
+        self.notifier = notifier
+        self.config_manager = config_manager
+        self.aggregator = NotificationAggregator(
+            notifier,
+            window_seconds=config_manager.get('notification_coalesce_window', Constants.NOTIFICATION_COALESCE_WINDOW),
+            gate=self._notification_gate,
+            clock=notifier.clock
+        )
+
+    def deliver(self, event):
+        snapshot = self.config_manager.snapshot
+        if not snapshot.enable_feishu_notification:
+            return False
+
+        start_time = snapshot.notification_start_time or dt_time.min
+        end_time = snapshot.notification_end_time or dt_time.max
+        if not self.notifier.is_notification_time(start_time, end_time):
+            return False
+
+        self.aggregator.add(event.title, event.content, event.msg_type,
+                            notification_key=event.key, value=event.value, unit=event.unit)
+        return True
+
+    def reconfigure(self):
+        """应用新的飞书配置"""
+        self.notifier.webhook_url = self.config_manager.get('feishu_webhook_url', '')
+        self.notifier.at_all = self.config_manager.get('feishu_at_all', False)
+        self.aggregator.window_seconds = self.config_manager.get(
+            'notification_coalesce_window', Constants.NOTIFICATION_COALESCE_WINDOW)
+
+    def close(self):
+        self.aggregator.flush(force=True)
+
+    def _notification_gate(self, notification_key):
+        """聚合器发送前的分类频率检查 - 未通过的事件留在缓冲区稍后合并发送"""
+        interval = self.config_manager.snapshot.notification_interval
+        return self.notifier.should_send_notification(notification_key, interval)
+
+class WebhookBackend(NotificationBackend):
+    """通用JSON Webhook后端 - 将事件字典以JSON POST到指定URL"""
+
+    name = "webhook"
+
+    def __init__(self, url, timeout=Constants.NOTIFY_BACKEND_TIMEOUT):
+        super().__init__(timeout)
+        self.url = url
+        self.name = f"webhook:{url}"
+
+    def deliver(self, event):
+        response = requests.post(self.url, json=event.to_dict(), timeout=self.timeout)
+        if response.status_code >= 300:
+            log(f"Webhook通知发送失败，HTTP状态码: {response.status_code} ({self.url})")
+            return False
+        return True
+
+class FileBackend(NotificationBackend):
+    """本地文件后端 - 以JSON Lines追加写入事件"""
+
+    name = "file"
+
+    def __init__(self, path, timeout=Constants.NOTIFY_BACKEND_TIMEOUT):
+        super().__init__(timeout)
+        self.path = path
+
+    def deliver(self, event):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(event.to_dict(), ensure_ascii=False) + '\n')
+        return True
+
+class SocketBackend(NotificationBackend):
+    """本地套接字后端 - 以UDP或Unix数据报发送事件JSON，供自建看板订阅
+
+    地址格式: udp://127.0.0.1:9999 或 unix:///tmp/guardian.sock
+    """
+
+    name = "socket"
+
+    def __init__(self, address, timeout=Constants.NOTIFY_BACKEND_TIMEOUT):
+        super().__init__(timeout)
+        self.name = f"socket:{address}"
+        if address.startswith('udp://'):
+            host, _, port = address[len('udp://'):].rpartition(':')
+            self.family = socket.AF_INET
+            self.target = (host or '127.0.0.1', int(port))
+        elif address.startswith('unix://'):
+            if not hasattr(socket, 'AF_UNIX'):
+                raise ValueError("当前系统不支持Unix套接字")
+            self.family = socket.AF_UNIX
+            self.target = address[len('unix://'):]
+        else:
+            raise ValueError(f"不支持的套接字地址: {address}")
+
+    def deliver(self, event):
+        data = json.dumps(event.to_dict(), ensure_ascii=False).encode('utf-8')
+        with socket.socket(self.family, socket.SOCK_DGRAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.sendto(data, self.target)
+        return True
+
+class NotificationDispatcher:
+    """通知分发器 - 事件只发布一次，由分发器并行投递到所有后端
+
+    每个后端拥有独立的单线程投递队列：同一后端内保持事件顺序，
+    某个后端变慢只会积压它自己的队列，不会拖慢其他后端。
+    """
+
+    def __init__(self, backends=None, clock=None):
+        self.clock = clock or SYSTEM_CLOCK
+        self._lock = threading.Lock()
+        self._lanes = []
+        self.set_backends(backends or [])
+
+    def set_backends(self, backends):
+        """设置后端列表（已存在的后端实例保留原投递队列）"""
+        with self._lock:
+            old_lanes = {id(lane['backend']): lane for lane in self._lanes}
+            new_lanes = []
+            for backend in backends:
+                lane = old_lanes.pop(id(backend), None)
+                if lane is None:
+                    lane = {
+                        'backend': backend,
+                        'executor': ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"notify-{backend.name}"),
+                        'queued': 0
+                    }
+                new_lanes.append(lane)
+            self._lanes = new_lanes
+
+        for lane in old_lanes.values():
+            self._close_lane(lane)
+
+    def publish(self, event):
+        """发布事件（立即返回，投递在后台进行）"""
+        log_event('notify.publish', title=event.title, msg_type=event.msg_type, key=event.key,
+                  source=event.source, value=event.value)
+        with self._lock:
+            lanes = list(self._lanes)
+        for lane in lanes:
+            with self._lock:
+                if lane['queued'] >= Constants.NOTIFY_BACKEND_MAX_QUEUE:
+                    log(f"通知后端 {lane['backend'].name} 积压过多，丢弃事件: {event.title}")
+                    continue
+                lane['queued'] += 1
+            try:
+                lane['executor'].submit(self.clock.tracked(self._deliver), lane, event)
+            except RuntimeError:
+                pass  # 后端已关闭
+
+    def close(self):
+        """关闭所有后端"""
+        with self._lock:
+            lanes, self._lanes = self._lanes, []
+        for lane in lanes:
+            self._close_lane(lane)
+
+    def _deliver(self, lane, event):
+        backend = lane['backend']
+        start = time.monotonic()
+        try:
+            backend.deliver(event)
+        except Exception as e:
+            log(f"通知后端 {backend.name} 投递失败: {e}")
+            log_event('notify.error', backend=backend.name, title=event.title, error=str(e))
+        finally:
+            with self._lock:
+                lane['queued'] -= 1
+        elapsed = time.monotonic() - start
+        if elapsed > backend.timeout:
+            log(f"⚠ 通知后端 {backend.name} 投递耗时 {elapsed:.1f}s，超过超时设置 {backend.timeout}s")
+
+    def _close_lane(self, lane):
+        try:
+            lane['executor'].shutdown(wait=False)
+            lane['backend'].close()
+        except Exception as e:
+            log(f"关闭通知后端 {lane['backend'].name} 失败: {e}")
+
 # ====================================================================
 # 行情源优选模块（保持原有逻辑不变）
 # ====================================================================
@@ -488,13 +2695,12 @@ class ServerOptimizer:
         self.only_vip = only_vip
         self.network_tester = NetworkTester()
     
-    def find_best_servers(self):
-        """查找最佳行情和交易服务器"""
-        log(f"开始查找最佳服务器，QMT路径: {self.qmt_dir_path}")
-        
-        # 终止QMT进程
-        self._terminate_qmt_processes()
-        
+    def probe_servers(self):
+        """解析服务器列表并测速，不影响运行中的QMT（盘前流程中与关闭QMT并行执行）
+
+        Returns:
+            (best_hq, best_jy, tree, quoter_server_map, config_path)，失败时均为 None
+        """
         # 解析配置文件
         config_path = fr'{self.qmt_dir_path}\userdata_mini\users\xtquoterconfig.xml'
         if not os.path.exists(config_path):
@@ -517,22 +2723,12 @@ class ServerOptimizer:
             
             return best_hq, best_jy, tree, quoter_server_map, config_path
         
+        except OperationCancelled:
+            raise
         except Exception as e:
             log(f"解析配置文件出错: {str(e)}")
             return None, None, None, None, None
     
-    def _terminate_qmt_processes(self):
-        """终止QMT进程"""
-        for proc in psutil.process_iter(['pid', 'name', 'exe']):
-            try:
-                if proc.info['name'] == 'XtMiniQmt.exe':
-                    exe_path = (proc.info['exe'] or '').lower()
-                    if self.qmt_dir_path.lower() in exe_path:
-                        log(f"终止进程: PID={proc.pid}, Path={exe_path}")
-                        proc.kill()
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                continue
-    
     def _parse_server_info(self, quoter_server_list):
         """解析服务器信息"""
         qs_infos = {}
@@ -562,6 +2758,8 @@ class ServerOptimizer:
             results.append(info)
             
             server_type = "行情" if info['type'] == '0' else "交易"
+            log_event('probe.server', kind='hq' if info['type'] == '0' else 'jy', server=info['servername'],
+                      ip=info['ip'], port=info['port'], latency_ms=median_value)
             log(f'{server_type}-{info["servername"]} {info["ip"]} 延迟: {median_value:.2f} ms')
         
         return results
@@ -628,7 +2826,8 @@ class ProcessManager:
     
     @staticmethod
     def terminate_processes_by_name(process_name, target_path=None, graceful_timeout=10):
-        """根据进程名终止进程 - 优雅关闭机制"""
+        """根据进程名终止进程 - 优雅关闭机制（等待进程退出时检查当前操作的取消令牌）"""
+        current_token().check()
         processes_to_kill = []
         
         for proc in psutil.process_iter(['pid', 'name', 'exe', 'status']):
@@ -657,7 +2856,7 @@ class ProcessManager:
                 proc.terminate()
                 
                 try:
-                    proc.wait(timeout=graceful_timeout)
+                    ProcessManager._wait_for_exit(proc, graceful_timeout)
                     log(f"✓ 进程 {proc.pid} 已优雅退出")
                     success_count += 1
                     continue
@@ -667,7 +2866,7 @@ class ProcessManager:
                 if proc.is_running():
                     proc.kill()
                     try:
-                        proc.wait(timeout=5)
+                        ProcessManager._wait_for_exit(proc, 5)
                         log(f"✓ 进程 {proc.pid} 已强制终止")
                         success_count += 1
                     except psutil.TimeoutExpired:
@@ -680,6 +2879,8 @@ class ProcessManager:
             except psutil.AccessDenied:
                 log(f"✗ 权限不足，无法终止进程 {proc.pid}")
                 failed_count += 1
+            except OperationCancelled:
+                raise
             except Exception as e:
                 log(f"✗ 终止进程 {proc.pid} 时发生异常: {e}")
                 failed_count += 1
@@ -690,6 +2891,21 @@ class ProcessManager:
         log(f"进程终止完成: 成功 {success_count} 个，失败 {failed_count} 个")
         return success_count, failed_count
     
+    @staticmethod
+    def _wait_for_exit(proc, timeout):
+        """分片等待进程退出，每片之间检查取消令牌；超时抛出 psutil.TimeoutExpired"""
+        token = current_token()
+        deadline = time.monotonic() + timeout
+        while True:
+            token.check()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise psutil.TimeoutExpired(timeout, proc.pid)
+            try:
+                return proc.wait(timeout=min(Constants.CANCEL_CHECK_INTERVAL, remaining))
+            except psutil.TimeoutExpired:
+                continue
+    
     @staticmethod
     def _cleanup_zombie_processes(process_name):
         """清理僵尸进程 - 检测并报告僵尸进程状态"""
@@ -755,7 +2971,9 @@ class ProcessManager:
     
     @staticmethod
     def start_process(exe_path, wait_for_start=True, start_timeout=30):
-        """启动进程 - 增强版启动机制"""
+        """启动进程 - 增强版启动机制（轮询启动状态时检查当前操作的取消令牌）"""
+        token = current_token()
+        token.check()
         if not os.path.exists(exe_path):
             error_msg = f"可执行文件不存在: {exe_path}"
             log(f"✗ {error_msg}")
@@ -780,13 +2998,15 @@ class ProcessManager:
                     log(f"✓ 进程启动成功: {process_name} (PID={running_process['pid']})")
                     return True, running_process['pid']
                 
-                time.sleep(1)  # 每秒检查一次
+                token.sleep(1)  # 每秒检查一次
             
             # 启动超时
             error_msg = f"进程启动超时 ({start_timeout}s): {process_name}"
             log(f"✗ {error_msg}")
             return False, error_msg
             
+        except OperationCancelled:
+            raise
         except Exception as e:
             error_msg = f"启动进程时发生异常: {str(e)}"
             log(f"✗ {error_msg}")
@@ -844,12 +3064,20 @@ class ProcessManager:
 # 实时监控模块
 # ====================================================================
 class MonitoringThread(threading.Thread):
-    """实时监控线程 - 监控QMT进程和网络状态"""
+    """实时监控线程 - 监控QMT进程和网络状态
+
+    clock 和 environment 供模拟运行注入：environment 提供 process_iter / measure_latency / server_config，
+    替代 psutil、网络测速和读取 xtquoterconfig.xml。接入 worker（WorkerClient）时进程扫描在辅助进程执行。
+    """
     
-    def __init__(self, config_manager, feishu_notifier, status_callback=None, server_update_callback=None):
+    def __init__(self, config_manager, notifier, status_callback=None, server_update_callback=None,
+                 clock=None, environment=None, worker=None):
         super().__init__(daemon=True)
         self.config_manager = config_manager
-        self.feishu_notifier = feishu_notifier
+        self.clock = clock or SYSTEM_CLOCK
+        self.environment = environment
+        self.worker = worker
+        self.notifier = notifier  # NotificationDispatcher，事件发布一次由其投递到各后端
         self.status_callback = status_callback
         self.server_update_callback = server_update_callback
         self.running = False
@@ -858,17 +3086,45 @@ class MonitoringThread(threading.Thread):
         
         self.last_qmt_status = False
         self.last_network_status = False
+        self._last_status_messages = {}
+        self._wake = threading.Condition()  # 停止监控时唤醒等待中的监控线程，使其立即退出
+        
+    # 影响服务器检测的配置项，变化后重建服务器优选器
+    SERVER_CONFIG_KEYS = ('qmt_dir', 'qmt_only_vip')
         
     def start_monitoring(self):
         """启动监控"""
         self.running = True
-        self.start()
+        self.config_manager.subscribe(self._on_config_changed, keys=self.SERVER_CONFIG_KEYS)
+        self.clock.start_thread(self)
         log("实时监控已启动")
         
     def stop_monitoring(self):
         """停止监控"""
         self.running = False
+        self.config_manager.unsubscribe(self._on_config_changed)
+        with self._wake:
+            self.clock.notify(self._wake)
         log("实时监控已停止")
+    
+    def restore_state(self, qmt_running, network_connected):
+        """接续上一个守护进程的检测结果，重新拉起后状态未变化时不重复通知"""
+        self.last_status['qmt_running'] = qmt_running
+        self.last_qmt_status = qmt_running
+        self.last_network_status = network_connected
+    
+    def export_state(self):
+        return {'qmt_running': self.last_status.get('qmt_running'), 'network_connected': self.last_network_status}
+    
+    def _sleep(self, seconds):
+        with self._wake:
+            if self.running:
+                self.clock.wait(self._wake, seconds)
+    
+    def _on_config_changed(self, event):
+        """QMT路径或VIP设置变化：下一轮检测时按新配置重建服务器优选器"""
+        self.server_optimizer = None
+        log(f"监控配置已更新: {', '.join(sorted(event.changed_keys & set(self.SERVER_CONFIG_KEYS)))}")
         
     def run(self):
         """监控主循环"""
@@ -877,27 +3133,28 @@ class MonitoringThread(threading.Thread):
                 self._check_qmt_status()
                 self._check_network_status()
                 
-                interval = self.config_manager.get('monitor_interval', 10)
-                time.sleep(interval)
+                interval = self.config_manager.snapshot.monitor_interval
+                self._sleep(interval)
                 
             except Exception as e:
                 log(f"监控线程异常: {str(e)}")
-                time.sleep(10)
+                self._sleep(10)
                 
     def _check_qmt_status(self):
         """检查QMT进程状态"""
-        qmt_dir = self.config_manager.get('qmt_dir')
-        if not qmt_dir:
+        snapshot = self.config_manager.snapshot
+        if not snapshot.qmt_dir:
             return
+        qmt_dir_lower = snapshot.qmt_dir_lower
             
         qmt_running = False
         qmt_processes = []
         
-        for proc in psutil.process_iter(['pid', 'name', 'exe']):
+        for proc in self._process_iter(['pid', 'name', 'exe']):
             try:
                 if proc.info['name'] == 'XtMiniQmt.exe':
                     exe_path = (proc.info['exe'] or '').lower()
-                    if qmt_dir.lower() in exe_path:
+                    if qmt_dir_lower in exe_path:
                         qmt_running = True
                         qmt_processes.append(proc.info)
             except (psutil.NoSuchProcess, psutil.AccessDenied):
@@ -909,26 +3166,35 @@ class MonitoringThread(threading.Thread):
         }
         
         if self.last_status.get('qmt_running') != qmt_running:
+            log_event('state.qmt', running=qmt_running, process_count=len(qmt_processes),
+                      pids=[info['pid'] for info in qmt_processes])
             self._send_qmt_status_notification(qmt_running, qmt_processes)
             
         self.last_status.update(current_status)
         # 更新QMT状态标志，用于界面显示
         self.last_qmt_status = qmt_running
         
-        if self.status_callback:
-            status_msg = f"QMT状态: {'运行中' if qmt_running else '未运行'} ({len(qmt_processes)}个进程)"
-            self.status_callback(status_msg)
+        self._report_status('qmt', f"QMT状态: {'运行中' if qmt_running else '未运行'} ({len(qmt_processes)}个进程)")
             
+    def _process_iter(self, attrs):
+        if self.environment:
+            return self.environment.process_iter(attrs)
+        if self.worker:
+            try:
+                return self.worker.process_iter(attrs)
+            except WorkerError as e:
+                log(f"辅助进程扫描进程失败（{e}），改为本进程扫描")
+        return psutil.process_iter(attrs)
+    
     def _check_network_status(self):
         """检查网络连接状态"""
-        qmt_dir = self.config_manager.get('qmt_dir')
-        if not qmt_dir:
+        snapshot = self.config_manager.snapshot
+        if not snapshot.qmt_dir:
             return
             
         try:
             if not self.server_optimizer:
-                only_vip = self.config_manager.get('qmt_only_vip', True)
-                self.server_optimizer = ServerOptimizer(qmt_dir, only_vip)
+                self.server_optimizer = ServerOptimizer(snapshot.qmt_dir, snapshot.qmt_only_vip)
                 
             current_servers = self._get_current_server_config()
             if not current_servers:
@@ -942,16 +3208,17 @@ class MonitoringThread(threading.Thread):
                 'jy_server': jy_server,
                 'hq_latency': float('inf'),
                 'jy_latency': float('inf'),
-                'last_test_time': datetime.now().strftime('%H:%M:%S')
+                'last_test_time': self.clock.now().strftime('%H:%M:%S')
             }
+            measure_latency = self.environment.measure_latency if self.environment else NetworkTester.measure_latency
             
             if hq_server:
-                network_status['hq_latency'] = NetworkTester.measure_latency(
+                network_status['hq_latency'] = measure_latency(
                     hq_server['ip'], hq_server['port']
                 )
                 
             if jy_server:
-                network_status['jy_latency'] = NetworkTester.measure_latency(
+                network_status['jy_latency'] = measure_latency(
                     jy_server['ip'], jy_server['port']
                 )
             
@@ -960,22 +3227,35 @@ class MonitoringThread(threading.Thread):
             jy_connected = network_status['jy_latency'] != float('inf') if jy_server else True
             network_status['connected'] = hq_connected and jy_connected
             
+            if self.last_network_status != network_status['connected']:
+                log_event('state.network', connected=network_status['connected'],
+                          hq_server=hq_server['servername'] if hq_server else None,
+                          hq_latency_ms=network_status['hq_latency'],
+                          jy_server=jy_server['servername'] if jy_server else None,
+                          jy_latency_ms=network_status['jy_latency'])
+            
             # 更新网络状态标志，用于界面显示
             self.last_network_status = network_status['connected']
                 
             self._check_network_status_change(network_status)
             
-            if self.status_callback:
-                status_msg = f"网络状态: {'正常' if network_status.get('connected', False) else '异常'}"
-                self.status_callback(status_msg)
+            self._report_status('network', f"网络状态: {'正常' if network_status.get('connected', False) else '异常'}")
                 
         except Exception as e:
             log(f"网络状态检查异常: {str(e)}")
             
+    def _report_status(self, kind, status_msg):
+        """状态变化时才推送到状态栏，避免每个监控周期重复刷新和记录相同消息"""
+        if self.status_callback and self._last_status_messages.get(kind) != status_msg:
+            self._last_status_messages[kind] = status_msg
+            self.status_callback(status_msg)
+            
     def _get_current_server_config(self):
         """获取当前服务器配置"""
+        if self.environment:
+            return self.environment.server_config()
         try:
-            qmt_dir = self.config_manager.get('qmt_dir')
+            qmt_dir = self.config_manager.snapshot.qmt_dir
             config_path = os.path.join(qmt_dir, 'userdata_mini', 'users', 'xtquoterconfig.xml')
             
             if not os.path.exists(config_path):
@@ -1017,25 +3297,28 @@ class MonitoringThread(threading.Thread):
         
         high_latency_threshold = 200
         
+        if hq_latency > high_latency_threshold or jy_latency > high_latency_threshold:
+            log_event('probe.network', hq_latency_ms=hq_latency, jy_latency_ms=jy_latency,
+                      threshold_ms=high_latency_threshold)
+        
         if hq_latency > high_latency_threshold:
             self._send_network_notification(
                 "行情服务器延迟过高",
                 f"当前延迟: {hq_latency:.2f}ms，建议切换服务器",
-                "warning"
+                "warning",
+                value=hq_latency
             )
             
         if jy_latency > high_latency_threshold:
             self._send_network_notification(
                 "交易服务器延迟过高",
                 f"当前延迟: {jy_latency:.2f}ms，建议切换服务器",
-                "warning"
+                "warning",
+                value=jy_latency
             )
             
     def _send_qmt_status_notification(self, is_running, processes):
         """发送QMT状态通知"""
-        if not self._should_send_notification('qmt_status'):
-            return
-            
         if is_running:
             title = "QMT启动通知"
             content = f"QMT已启动，当前运行 {len(processes)} 个进程"
@@ -1045,59 +3328,394 @@ class MonitoringThread(threading.Thread):
             content = "QMT已关闭或异常退出"
             msg_type = "warning"
             
-        self.feishu_notifier.send_message(title, content, msg_type)
+        self.notifier.publish(NotificationEvent(title, content, msg_type, key='qmt_status', source="monitor"))
         
-    def _send_network_notification(self, title, content, msg_type="info"):
+    def _send_network_notification(self, title, content, msg_type="info", value=None):
         """发送网络状态通知"""
-        if not self._should_send_notification('network_status'):
-            return
-            
-        self.feishu_notifier.send_message(title, content, msg_type)
-        
-    def _should_send_notification(self, notification_type):
-        """检查是否应该发送通知"""
-        if not self.config_manager.get('enable_feishu_notification', True):
-            return False
-            
-        start_time = self.config_manager.get('notification_start_time', '09:00:00')
-        end_time = self.config_manager.get('notification_end_time', '15:30:00')
-        
-        if not self.feishu_notifier.is_notification_time(start_time, end_time):
-            return False
-            
-        interval = self.config_manager.get('notification_interval', 300)
-        return self.feishu_notifier.should_send_notification(notification_type, interval)
+        self.notifier.publish(NotificationEvent(title, content, msg_type, key='network_status',
+                                                value=value, unit="ms", source="monitor"))
 
 # ====================================================================
 # 数据管理模块
 # ====================================================================
+class TrashPurger:
+    """回收区清理器 - 后台线程限速删除回收区中的文件夹
+
+    删除数据时文件夹先重命名移入同一磁盘上的回收区（即时完成，重启流程不必等待），再由本清理器逐个删除文件：
+    每删除 TRASH_PURGE_BATCH 个文件暂停 TRASH_PURGE_PAUSE 秒，避免清理占满磁盘影响行情数据写入。
+    被占用等原因删除失败的文件留在回收区，按 TRASH_PURGE_RETRY_INTERVAL 重试，仍有残留则留待下次启动清理。
+    每个回收区只有一个清理器实例（for_dir），清理进行中再次请求只会在本轮结束后补一轮。
+    """
+    
+    _instances = {}
+    _instances_lock = threading.Lock()
+    
+    def __init__(self, trash_dir, batch=Constants.TRASH_PURGE_BATCH, pause=Constants.TRASH_PURGE_PAUSE,
+                 retry_interval=Constants.TRASH_PURGE_RETRY_INTERVAL, retries=Constants.TRASH_PURGE_RETRIES):
+        self.trash_dir = trash_dir
+        self.batch = batch
+        self.pause = pause
+        self.retry_interval = retry_interval
+        self.retries = retries
+        self._lock = threading.Lock()
+        self._thread = None
+        self._requested = False
+    
+    @classmethod
+    def for_dir(cls, trash_dir):
+        key = os.path.normcase(os.path.abspath(trash_dir))
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(trash_dir)
+            return cls._instances[key]
+    
+    def schedule(self):
+        """请求后台清理回收区（已在清理时本轮结束后再清理一轮）"""
+        with self._lock:
+            self._requested = True
+            if self._thread and self._thread.is_alive():
+                return self._thread
+            self._thread = threading.Thread(target=self._run, name="TrashPurger", daemon=True)
+            self._thread.start()
+            return self._thread
+    
+    def _run(self):
+        attempt = 0
+        while True:
+            with self._lock:
+                if not self._requested:
+                    self._thread = None
+                    return
+                self._requested = False
+            remaining = self.purge_once()
+            if remaining and attempt < self.retries:
+                attempt += 1
+                time.sleep(self.retry_interval)
+                with self._lock:
+                    self._requested = True
+            elif remaining:
+                log(f"回收区仍有 {remaining} 项无法删除，留待下次启动清理: {self.trash_dir}")
+    
+    def purge_once(self):
+        """清理一轮，返回回收区中剩余的项数"""
+        try:
+            entries = os.listdir(self.trash_dir)
+        except FileNotFoundError:
+            return 0
+        except OSError as e:
+            log(f"读取回收区失败: {e}")
+            return 1
+        if not entries:
+            return 0
+        
+        started = time.perf_counter()
+        removed, errors = 0, 0
+        for entry in entries:
+            path = os.path.join(self.trash_dir, entry)
+            for root, dirs, files in os.walk(path, topdown=False):
+                for name in files:
+                    try:
+                        os.remove(os.path.join(root, name))
+                        removed += 1
+                    except FileNotFoundError:
+                        pass
+                    except OSError:
+                        errors += 1
+                    if removed and removed % self.batch == 0:
+                        time.sleep(self.pause)
+                for name in dirs:
+                    try:
+                        os.rmdir(os.path.join(root, name))
+                    except OSError:
+                        pass
+            try:
+                if os.path.isdir(path):
+                    os.rmdir(path)
+                else:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                errors += 1
+        
+        try:
+            remaining = len(os.listdir(self.trash_dir))
+        except OSError:
+            remaining = 0
+        elapsed = time.perf_counter() - started
+        log(f"回收区清理完成: 删除 {removed} 个文件，失败 {errors}，剩余 {remaining} 项，耗时 {elapsed:.1f}秒")
+        log_event('data.purge', trash_dir=self.trash_dir, files=removed, errors=errors, remaining=remaining,
+                  duration=round(elapsed, 3))
+        return remaining
+
+class BulkDeleter:
+    """批量删除器 - os.scandir 遍历目录树，文件的删除分批交给有界线程池并行执行
+
+    先完整扫描一遍（scandir 的目录项自带类型和大小，Windows 上不需要额外的 stat 调用）得到文件总数和总字节数，
+    再按 BULK_DELETE_BATCH 个文件一批提交到 workers 个线程删除，最后由深到浅删除空目录。
+    被占用或只读的文件清除只读属性后按 retries 次、retry_delay 递增间隔重试，仍失败的计入 errors，不中断其余删除。
+    progress 每 progress_interval 秒以 files / total_files / bytes / total_bytes / files_per_sec / mb_per_sec 关键字参数调用。
+    """
+    
+    def __init__(self, workers=Constants.BULK_DELETE_WORKERS, retries=Constants.BULK_DELETE_RETRIES,
+                 retry_delay=Constants.BULK_DELETE_RETRY_DELAY, batch=Constants.BULK_DELETE_BATCH,
+                 progress=None, progress_interval=Constants.BULK_DELETE_PROGRESS_INTERVAL):
+        self.workers = workers
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.batch = batch
+        self.progress = progress
+        self.progress_interval = progress_interval
+    
+    def delete_tree(self, path):
+        """删除目录及其全部内容，返回统计字典；有文件或目录删除失败时抛出 OSError（统计见 log / 事件）"""
+        token = current_token()
+        started = time.perf_counter()
+        files, dirs, total_bytes = self._scan(path, token)
+        scanned = time.perf_counter()
+        
+        stats = {'files': 0, 'bytes': 0, 'errors': 0, 'error_samples': []}
+        lock = threading.Lock()
+        
+        def delete_batch(batch):
+            removed, removed_bytes, failures = 0, 0, []
+            for file_path, size in batch:
+                error = self._unlink(file_path)
+                if error is None:
+                    removed += 1
+                    removed_bytes += size
+                else:
+                    failures.append(f"{file_path}: {error}")
+            with lock:
+                stats['files'] += removed
+                stats['bytes'] += removed_bytes
+                stats['errors'] += len(failures)
+                stats['error_samples'].extend(failures[:5 - len(stats['error_samples'])])
+        
+        batches = [files[i:i + self.batch] for i in range(0, len(files), self.batch)]
+        last_report = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="BulkDelete") as executor:
+            pending = {executor.submit(delete_batch, batch) for batch in batches}
+            while pending:
+                if token.cancelled:
+                    for future in pending:
+                        future.cancel()
+                done, pending = wait_futures(pending, timeout=self.progress_interval)
+                now = time.perf_counter()
+                if self.progress and (now - last_report >= self.progress_interval or not pending):
+                    last_report = now
+                    self._report(stats, lock, len(files), total_bytes, now - scanned)
+        token.check()
+        
+        dir_errors = 0
+        for dir_path in reversed(dirs):  # 扫描顺序为先父后子，倒序即由深到浅
+            if self._rmdir(dir_path) is not None:
+                dir_errors += 1
+        
+        elapsed = time.perf_counter() - started
+        result = {
+            'files': stats['files'], 'bytes': stats['bytes'], 'dirs': len(dirs),
+            'errors': stats['errors'] + dir_errors, 'scan_time': round(scanned - started, 3),
+            'duration': round(elapsed, 3),
+            'files_per_sec': round(stats['files'] / elapsed, 1) if elapsed > 0 else None,
+            'mb_per_sec': round(stats['bytes'] / 1024 / 1024 / elapsed, 2) if elapsed > 0 else None
+        }
+        log(f"批量删除 {path}: {result['files']} 个文件 {result['bytes'] / 1024 / 1024:.1f}MB，{result['dirs']} 个目录，"
+            f"耗时 {elapsed:.2f}秒（扫描 {result['scan_time']:.2f}秒，{result['files_per_sec']} 文件/秒，"
+            f"{result['mb_per_sec']} MB/秒，{self.workers} 线程），失败 {result['errors']}")
+        log_event('data.bulk_delete', path=path, workers=self.workers, **result)
+        if result['errors']:
+            samples = "; ".join(stats['error_samples'])
+            raise OSError(f"{result['errors']} 项删除失败" + (f"（{samples}）" if samples else ""))
+        return result
+    
+    def _scan(self, root, token):
+        """返回 (文件列表[(路径, 大小)], 目录列表（先父后子，含root）, 总字节数)；符号链接和目录联接只删除链接本身"""
+        files, dirs, total_bytes = [], [root], 0
+        stack = [root]
+        while stack:
+            token.check()
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False) and not self._is_link(entry):
+                            dirs.append(entry.path)
+                            stack.append(entry.path)
+                            continue
+                        size = entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        size = 0
+                    files.append((entry.path, size))
+                    total_bytes += size
+        return files, dirs, total_bytes
+    
+    @staticmethod
+    def _is_link(entry):
+        return entry.is_symlink() or (hasattr(entry, 'is_junction') and entry.is_junction())
+    
+    def _unlink(self, path):
+        """删除文件（或目录链接），成功返回 None，重试后仍失败返回最后的异常"""
+        for attempt in range(self.retries + 1):
+            try:
+                try:
+                    os.unlink(path)
+                except IsADirectoryError:
+                    os.rmdir(path)
+                except PermissionError:
+                    if os.path.isdir(path):
+                        os.rmdir(path)  # Windows 下目录符号链接/联接需要 rmdir
+                    else:
+                        os.chmod(path, stat.S_IWRITE)  # 清除只读属性
+                        os.unlink(path)
+                return None
+            except FileNotFoundError:
+                return None
+            except OSError as e:
+                error = e
+                if attempt < self.retries:
+                    time.sleep(self.retry_delay * (attempt + 1))
+        return error
+    
+    def _rmdir(self, path):
+        for attempt in range(self.retries + 1):
+            try:
+                os.rmdir(path)
+                return None
+            except FileNotFoundError:
+                return None
+            except OSError as e:
+                error = e
+                if attempt < self.retries:
+                    time.sleep(self.retry_delay * (attempt + 1))
+        log(f"删除目录失败: {path} ({error})")
+        return error
+    
+    def _report(self, stats, lock, total_files, total_bytes, elapsed):
+        with lock:
+            done_files, done_bytes = stats['files'], stats['bytes']
+        self.progress(files=done_files, total_files=total_files, bytes=done_bytes, total_bytes=total_bytes,
+                      files_per_sec=round(done_files / elapsed, 1) if elapsed > 0 else 0.0,
+                      mb_per_sec=round(done_bytes / 1024 / 1024 / elapsed, 2) if elapsed > 0 else 0.0)
+
+def _build_synthetic_tree(root, files, file_size, fanout):
+    """生成 files 个文件的测试目录树：每个子目录 fanout 个文件，子目录再按 fanout 分组"""
+    payload = b"x" * file_size
+    for index in range(files):
+        folder = os.path.join(root, f"g{index // (fanout * fanout):04d}", f"d{index // fanout:06d}")
+        if index % fanout == 0:
+            os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f"f{index:07d}.dat"), 'wb') as f:
+            f.write(payload)
+
+def run_delete_benchmark(argv):
+    """删除基准测试（--benchmark-delete）：在合成目录树上对比 shutil.rmtree 和 BulkDeleter 的耗时与吞吐"""
+    parser = argparse.ArgumentParser(prog="QMT实盘无限守护.py --benchmark-delete",
+                                     description="在合成目录树上对比 shutil.rmtree 与并行批量删除的耗时和吞吐")
+    parser.add_argument('--benchmark-delete', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--files', type=int, default=100000, help="合成文件数（默认100000）")
+    parser.add_argument('--size', type=int, default=1024, help="单个文件字节数（默认1024）")
+    parser.add_argument('--fanout', type=int, default=100, help="每个目录的文件数（默认100）")
+    parser.add_argument('--workers', type=int, default=Constants.BULK_DELETE_WORKERS,
+                        help=f"批量删除线程数（默认{Constants.BULK_DELETE_WORKERS}）")
+    parser.add_argument('--dir', help="生成测试目录树的位置（应与实际数据在同一磁盘，默认系统临时目录）")
+    args = parser.parse_args(argv)
+    
+    base = tempfile.mkdtemp(prefix="guardian-delete-bench-", dir=args.dir)
+    results = []
+    try:
+        for name in ("shutil.rmtree", f"BulkDeleter({args.workers}线程)"):
+            tree = os.path.join(base, "tree")
+            started = time.perf_counter()
+            _build_synthetic_tree(tree, args.files, args.size, args.fanout)
+            print(f"生成 {args.files} 个文件用时 {time.perf_counter() - started:.1f}秒，开始 {name}")
+            started = time.perf_counter()
+            if name == "shutil.rmtree":
+                shutil.rmtree(tree)
+            else:
+                BulkDeleter(workers=args.workers, progress=lambda **p: print(
+                    f"  {p['files']}/{p['total_files']} 文件，{p['files_per_sec']:.0f} 文件/秒")).delete_tree(tree)
+            elapsed = time.perf_counter() - started
+            results.append((name, elapsed))
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+    
+    print(f"\n{args.files} 个文件，每个 {args.size} 字节，每目录 {args.fanout} 个：")
+    for name, elapsed in results:
+        print(f"  {name:<24} {elapsed:8.2f}秒  {args.files / elapsed:10.0f} 文件/秒  "
+              f"{args.files * args.size / 1024 / 1024 / elapsed:8.1f} MB/秒")
+    if len(results) == 2 and results[1][1] > 0:
+        print(f"  加速比 {results[0][1] / results[1][1]:.2f}x")
+    return 0
+
 class DataManager:
-    """数据管理器 - 早盘数据清理"""
+    """数据管理器 - 早盘数据清理
+
+    删除分两步：文件夹先重命名移入 base_path 下的回收区（同一磁盘上的重命名是原子操作，即时完成），
+    再由 TrashPurger 在后台限速删除；无法重命名（如文件夹内有文件被占用）时由 BulkDeleter 并行删除。
+    """
     
     def __init__(self, base_path, folder_names):
         self.base_path = base_path
         self.folder_names = [name.strip() for name in folder_names.split(',')]
+        self.trash_dir = os.path.join(base_path, Constants.TRASH_DIR_NAME)
     
-    def delete_early_market_data(self):
-        """删除早盘数据"""
+    def delete_early_market_data(self, progress=None):
+        """删除早盘数据：移入回收区后立即返回，回收区在后台清理
+
+        Args:
+            progress: 可选进度回调，每个文件夹开始前以 folder / index / total 关键字参数调用；
+                      文件夹需要直接删除时另以删除进度（files / total_files / files_per_sec 等）定期调用
+        """
         log("开始删除早盘数据...")
         deleted_folders = []
         failed_folders = []
+        token = current_token()
 
-        for folder_name in self.folder_names:
+        for index, folder_name in enumerate(self.folder_names, 1):
+            token.check()
+            if progress:
+                progress(folder=folder_name, index=index, total=len(self.folder_names))
             folder_path = os.path.join(self.base_path, folder_name)
             if os.path.exists(folder_path) and os.path.isdir(folder_path):
                 try:
-                    shutil.rmtree(folder_path)
+                    folder_progress = (lambda index=index, folder_name=folder_name, **stats: progress(
+                        folder=folder_name, index=index, total=len(self.folder_names), **stats)) if progress else None
+                    self._remove_folder(folder_name, folder_path, folder_progress)
                     deleted_folders.append(folder_name)
-                    log(f"成功删除文件夹: {folder_path}")
                 except Exception as e:
                     failed_folders.append((folder_name, str(e)))
                     log(f"删除文件夹 {folder_path} 时出错: {e}")
             else:
                 log(f"文件夹 {folder_path} 不存在，跳过删除")
         
+        if deleted_folders:
+            self.purge_trash()
         return deleted_folders, failed_folders
+    
+    def _remove_folder(self, folder_name, folder_path, progress=None):
+        """把文件夹重命名移入回收区；重命名失败时并行直接删除"""
+        started = time.perf_counter()
+        target = os.path.join(self.trash_dir, f"{folder_name}-{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}")
+        suffix = 0
+        while os.path.exists(target + (f"-{suffix}" if suffix else "")):
+            suffix += 1
+        target += f"-{suffix}" if suffix else ""
+        try:
+            os.makedirs(self.trash_dir, exist_ok=True)
+            os.rename(folder_path, target)
+            log(f"成功删除文件夹: {folder_path}（已移入回收区，后台清理）")
+            log_event('data.trash', folder=folder_name, moved=True, duration=round(time.perf_counter() - started, 3))
+        except OSError as e:
+            log(f"文件夹 {folder_path} 无法移入回收区（{e}），直接删除")
+            BulkDeleter(progress=progress).delete_tree(folder_path)
+            log(f"成功删除文件夹: {folder_path}")
+            log_event('data.trash', folder=folder_name, moved=False, duration=round(time.perf_counter() - started, 3))
+    
+    def purge_trash(self):
+        """在后台清理回收区（包括之前未清理完的残留），没有回收区时不做任何事"""
+        if os.path.isdir(self.trash_dir):
+            return TrashPurger.for_dir(self.trash_dir).schedule()
+        return None
 
 # ====================================================================
 # 开机启动管理模块
@@ -1247,68 +3865,1011 @@ class StartupManager:
         
         return True
 
+# ====================================================================
+# 定时调度模块
+# ====================================================================
+class TradingCalendar:
+    """交易日历 - 从本地日历文件加载交易日，构建紧凑的有序日期索引
+
+    文件格式：每行一个交易日（YYYY-MM-DD、YYYY/MM/DD 或 YYYYMMDD，逗号后可带其他列），# 开头为注释。
+    交易日以日期序号（date.toordinal）存入有序数组和集合：
+    is_trading_day 为集合查询 O(1)，next_trading_day 为二分查找 O(log n)。
+    日期超出日历覆盖范围（或日历文件缺失）时按周一至周五判断，并记录一次日志提示更新日历文件。
+    """
+
+    DATE_PATTERN = re.compile(r'^(\d{4})[-/]?(\d{1,2})[-/]?(\d{1,2})$')
+
+    def __init__(self, dates=(), source=None):
+        ordinals = sorted({d.toordinal() for d in dates})
+        self._ordinals = array('l', ordinals)
+        self._ordinal_set = frozenset(ordinals)
+        self.source = source
+        self._warned = False
+
+    @classmethod
+    def load(cls, path):
+        """从文件加载日历，文件不存在或无法读取时返回空日历（全部按工作日判断）"""
+        dates = []
+        try:
+            with open(path, 'r', encoding='utf-8-sig') as f:
+                for line_no, line in enumerate(f, 1):
+                    text = line.split('#', 1)[0].split(',', 1)[0].strip()
+                    if not text:
+                        continue
+                    match = cls.DATE_PATTERN.match(text)
+                    try:
+                        dates.append(datetime(*map(int, match.groups())).date())
+                    except (AttributeError, ValueError):
+                        log(f"交易日历第 {line_no} 行无法解析，已跳过: {text}")
+        except FileNotFoundError:
+            log(f"未找到交易日历文件 {path}，按周一至周五判断交易日")
+        except OSError as e:
+            log(f"读取交易日历失败: {e}，按周一至周五判断交易日")
+        calendar = cls(dates, path)
+        if dates:
+            log(f"交易日历已加载: {len(calendar)} 个交易日 ({calendar.first} ~ {calendar.last})")
+        return calendar
+
+    def __len__(self):
+        return len(self._ordinals)
+
+    @property
+    def first(self):
+        return date_cls.fromordinal(self._ordinals[0]) if self._ordinals else None
+
+    @property
+    def last(self):
+        return date_cls.fromordinal(self._ordinals[-1]) if self._ordinals else None
+
+    def covers(self, day):
+        """日期是否在日历覆盖范围内"""
+        return bool(self._ordinals) and self._ordinals[0] <= day.toordinal() <= self._ordinals[-1]
+
+    def is_trading_day(self, day):
+        if self.covers(day):
+            return day.toordinal() in self._ordinal_set
+        self._warn_uncovered(day)
+        return day.weekday() < 5
+
+    def next_trading_day(self, day, inclusive=False):
+        """day 之后（inclusive 为 True 时含 day 本身）的第一个交易日"""
+        ordinal = day.toordinal() if inclusive else day.toordinal() + 1
+        if self._ordinals and self._ordinals[0] <= ordinal <= self._ordinals[-1]:
+            return date_cls.fromordinal(self._ordinals[bisect_left(self._ordinals, ordinal)])
+        
+        # 超出日历范围：按工作日顺延（日历开始之前顺延到日历内时以日历为准）
+        candidate = date_cls.fromordinal(ordinal)
+        self._warn_uncovered(candidate)
+        while candidate.weekday() >= 5:
+            candidate += timedelta(days=1)
+        if self._ordinals and ordinal < self._ordinals[0] <= candidate.toordinal():
+            return date_cls.fromordinal(self._ordinals[0])
+        return candidate
+
+    def previous_trading_day(self, day, inclusive=False):
+        """day 之前（inclusive 为 True 时含 day 本身）的最后一个交易日"""
+        ordinal = day.toordinal() if inclusive else day.toordinal() - 1
+        if self._ordinals and self._ordinals[0] <= ordinal <= self._ordinals[-1]:
+            return date_cls.fromordinal(self._ordinals[bisect_right(self._ordinals, ordinal) - 1])
+        
+        candidate = date_cls.fromordinal(ordinal)
+        self._warn_uncovered(candidate)
+        while candidate.weekday() >= 5:
+            candidate -= timedelta(days=1)
+        if self._ordinals and candidate.toordinal() <= self._ordinals[-1] < ordinal:
+            return date_cls.fromordinal(self._ordinals[-1])
+        return candidate
+
+    def _warn_uncovered(self, day):
+        if not self._warned and self._ordinals:
+            self._warned = True
+            log(f"⚠ 日期 {day} 超出交易日历范围 ({self.first} ~ {self.last})，按工作日判断，请更新交易日历文件")
+
+class ScheduledJob:
+    """每日定时任务 - 记录下次触发时间、错过后的补执行策略和每次触发的延迟"""
+
+    # 错过触发时间（休眠唤醒、程序晚启动）后的补执行策略
+    CATCHUP_GRACE = 'grace'          # 延迟在宽限时间内立即补执行，否则跳过
+    CATCHUP_SKIP = 'skip'            # 跳过，等下一次
+    CATCHUP_NEXT_SAFE = 'next_safe'  # 当前处于交易时段则推迟到本时段结束，否则立即补执行
+    CATCHUP_POLICIES = (CATCHUP_GRACE, CATCHUP_SKIP, CATCHUP_NEXT_SAFE)
+
+    def __init__(self, name, at, func, calendar=None, key=None, catchup=CATCHUP_SKIP, grace=0):
+        self.name = name
+        self.key = key or name        # 持久化状态使用的标识
+        self.at = at                  # datetime.time，每日触发时刻
+        self.func = func
+        self.calendar = calendar      # TradingCalendar，设置后只在交易日触发
+        self.catchup = catchup
+        self.grace = grace            # 宽限时间（秒），用于 grace 策略
+        self.slot = None              # 本次要执行的计划时刻（墙上时间）
+        self.next_run = None          # 下次实际触发的墙上时间（补执行/推迟时晚于 slot）
+        self.deadline = None          # 下次触发的单调时钟时间
+        self.deferred = False         # 已按 next_safe 策略推迟，到期直接执行
+        self.handled = None           # 最近一次处理（执行或跳过）的计划时刻，同一天不再触发
+        self.lateness = deque(maxlen=Constants.SCHEDULER_LATENESS_HISTORY)  # 最近各次触发延迟（秒）
+        self.cancelled = False
+
+    def plan_next(self, now_wall, now_mono):
+        """计算严格晚于当前时间、且不在已处理过的日期的下一次触发时刻
+
+        触发时刻改变（如盘前流程按新耗时重新倒推）后，当天已执行过的任务不会在新时刻再执行一次。
+        """
+        candidate = datetime.combine(now_wall.date(), self.at)
+        if candidate <= now_wall:
+            candidate += timedelta(days=1)
+        if self.handled is not None and candidate.date() <= self.handled.date():
+            candidate = datetime.combine(self.handled.date() + timedelta(days=1), self.at)
+        if self.calendar is not None:
+            candidate = datetime.combine(self.calendar.next_trading_day(candidate.date(), inclusive=True), self.at)
+        self.plan_at(candidate, candidate, now_wall, now_mono)
+
+    def plan_at(self, slot, run_at, now_wall, now_mono, deferred=False):
+        """安排在 run_at 执行计划时刻 slot 的任务"""
+        self.slot = slot
+        self.next_run = run_at
+        self.deadline = now_mono + (run_at - now_wall).total_seconds()
+        self.deferred = deferred
+
+    def previous_slot(self, now_wall):
+        """不晚于当前时间的最近一个计划时刻"""
+        candidate = datetime.combine(now_wall.date(), self.at)
+        if candidate > now_wall:
+            candidate -= timedelta(days=1)
+        if self.calendar is not None:
+            candidate = datetime.combine(self.calendar.previous_trading_day(candidate.date(), inclusive=True), self.at)
+        return candidate
+
+    def __lt__(self, other):
+        return self.deadline < other.deadline
+
+class DeadlineScheduler:
+    """实例级定时调度器 - 任务按截止时间放入最小堆，调度线程睡到最近的截止时间
+
+    截止时间使用单调时钟，不受系统校时影响；添加或清除任务时立即唤醒调度线程重新计算等待时间。
+    单次等待不超过 SCHEDULER_MAX_WAIT 秒，醒来后与墙上时间核对，
+    发现系统休眠或时钟跳变（偏差超过 SCHEDULER_CLOCK_DRIFT_TOLERANCE 秒）时按墙上时间重新对齐截止时间。
+    到期任务在独立工作线程中执行，耗时任务不会推迟其他任务；每次触发记录延迟（实际触发时间 - 计划时间）。
+
+    触发时已晚于计划时刻 SCHEDULER_LATE_THRESHOLD 秒以上（休眠唤醒、程序晚启动）的任务按其补执行策略处理。
+    每个任务最近一次处理的计划时刻持久化到 state_path，启动时据此找出停机期间错过的任务（recover_missed）。
+    时间和等待都通过 clock 获取，模拟运行时传入 SimulatedClock；on_fire(job, slot, lateness) 在每次执行前回调。
+    """
+
+    def __init__(self, name="Scheduler", state_path=None, clock=None, on_fire=None):
+        self.name = name
+        self.state_path = state_path
+        self.clock = clock or SYSTEM_CLOCK
+        self.on_fire = on_fire
+        self._state = self._load_state()
+        self._heap = []
+        self._jobs = {}
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def add_daily(self, name, time_str, func, calendar=None, key=None, catchup=ScheduledJob.CATCHUP_SKIP, grace=0):
+        """添加每日任务（同名任务会被替换；指定 calendar 时只在交易日触发）"""
+        job = ScheduledJob(name, parse_time_of_day(time_str), func, calendar, key, catchup, grace)
+        with self._cond:
+            old = self._jobs.pop(name, None)
+            if old:
+                old.cancelled = True
+            last_slot = self._state.get(job.key, {}).get('last_slot')
+            job.handled = datetime.fromisoformat(last_slot) if last_slot else None
+            job.plan_next(self.clock.now(), self.clock.monotonic())
+            self._jobs[name] = job
+            heapq.heappush(self._heap, job)
+            self.clock.notify(self._cond)
+        return job
+
+    def recover_missed(self, max_age=Constants.SCHEDULER_CATCHUP_MAX_AGE):
+        """找出上次运行以来错过的计划时刻，立即交给补执行策略处理
+
+        只处理有历史记录的任务（首次运行不补执行），且只补最近一个、不早于 max_age 秒的计划时刻。
+        """
+        now_wall, now_mono = self.clock.now(), self.clock.monotonic()
+        with self._cond:
+            for job in self._jobs.values():
+                last_slot = self._state.get(job.key, {}).get('last_slot')
+                if not last_slot:
+                    continue
+                previous = job.previous_slot(now_wall)
+                if (previous.date() <= datetime.fromisoformat(last_slot).date()
+                        or (now_wall - previous).total_seconds() > max_age):
+                    continue
+                job.plan_at(previous, now_wall, now_wall, now_mono)
+                log(f"检测到错过的定时任务: {job.name} (计划 {previous.strftime('%Y-%m-%d %H:%M:%S')}，"
+                    f"上次处理 {last_slot})")
+            heapq.heapify(self._heap)
+            self.clock.notify(self._cond)
+
+    def update_daily(self, name, time_str, func, calendar=None, key=None, catchup=ScheduledJob.CATCHUP_SKIP, grace=0):
+        """就地更新同名任务的设置（不存在时添加），只有触发时刻或交易日历变化时才重新计算下次触发
+
+        与 add_daily 替换任务不同，任务的触发延迟记录和推迟补执行状态都会保留。
+        """
+        at = parse_time_of_day(time_str)
+        with self._cond:
+            job = self._jobs.get(name)
+            if job is None or job.key != (key or name):
+                return self.add_daily(name, time_str, func, calendar, key, catchup, grace)
+            replan = job.at != at or job.calendar is not calendar
+            job.at, job.func, job.calendar, job.catchup, job.grace = at, func, calendar, catchup, grace
+            if replan and not job.deferred:
+                job.plan_next(self.clock.now(), self.clock.monotonic())
+                heapq.heapify(self._heap)
+                self.clock.notify(self._cond)
+        return job
+
+    def remove(self, name):
+        """移除任务，返回是否存在"""
+        with self._cond:
+            job = self._jobs.pop(name, None)
+            if job is None:
+                return False
+            job.cancelled = True
+            self.clock.notify(self._cond)
+        return True
+
+    def reschedule(self, name, time_str):
+        """修改任务的每日触发时刻并重新计算下次触发（其他任务及其补执行推迟状态不受影响），任务不存在返回 None"""
+        with self._cond:
+            job = self._jobs.get(name)
+            if job is None:
+                return None
+            job.at = parse_time_of_day(time_str)
+            if not job.deferred:
+                job.plan_next(self.clock.now(), self.clock.monotonic())
+                heapq.heapify(self._heap)
+            self.clock.notify(self._cond)
+        return job
+
+    def replace_calendar(self, calendar):
+        """把仅交易日任务换成新加载的交易日历并重新计算下次触发（推迟补执行中的任务保持不变）"""
+        with self._cond:
+            jobs = [job for job in self._jobs.values() if job.calendar is not None]
+            now_wall, now_mono = self.clock.now(), self.clock.monotonic()
+            for job in jobs:
+                job.calendar = calendar
+                if not job.deferred:
+                    job.plan_next(now_wall, now_mono)
+            heapq.heapify(self._heap)
+            self.clock.notify(self._cond)
+        return jobs
+
+    def clear(self):
+        """移除全部任务"""
+        with self._cond:
+            for job in self._jobs.values():
+                job.cancelled = True
+            self._jobs.clear()
+            self._heap.clear()
+            self.clock.notify(self._cond)
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = self.clock.start_thread(threading.Thread(target=self._run, name=self.name, daemon=True))
+
+    def stop(self, timeout=2):
+        with self._cond:
+            self._running = False
+            self.clock.notify(self._cond)
+        if self._thread and self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout=timeout)
+
+    def jobs(self):
+        """按下次触发时间排序的任务列表"""
+        with self._cond:
+            return sorted(self._jobs.values(), key=lambda job: job.deadline)
+
+    def next_run(self):
+        """最近一次触发的墙上时间，无任务时返回 None"""
+        with self._cond:
+            return min((job.next_run for job in self._jobs.values()), default=None)
+
+    def get_lateness_stats(self):
+        """各任务的触发延迟统计（毫秒）"""
+        stats = {}
+        for job in self.jobs():
+            samples = [lateness * 1000 for lateness in job.lateness]
+            if samples:
+                stats[job.name] = {'count': len(samples), 'last_ms': samples[-1],
+                                   'max_ms': max(samples), 'mean_ms': statistics.mean(samples)}
+        return stats
+
+    def _run(self):
+        with self._cond:
+            while self._running:
+                if not self._heap:
+                    self.clock.wait(self._cond)
+                    continue
+
+                job = self._heap[0]
+                if job.cancelled:
+                    heapq.heappop(self._heap)
+                    continue
+
+                now_mono = self.clock.monotonic()
+                remaining = job.deadline - now_mono
+                if remaining > 0:
+                    self.clock.wait(self._cond, min(remaining, Constants.SCHEDULER_MAX_WAIT))
+                    self._resync_locked()
+                    continue
+
+                heapq.heappop(self._heap)
+                self._dispatch_locked(job, now_mono)
+
+    def _resync_locked(self):
+        """核对单调时钟与墙上时间，休眠唤醒或系统校时后重新对齐截止时间"""
+        now_wall, now_mono = self.clock.now(), self.clock.monotonic()
+        drifted = False
+        for job in self._jobs.values():
+            expected = now_mono + (job.next_run - now_wall).total_seconds()
+            if abs(expected - job.deadline) > Constants.SCHEDULER_CLOCK_DRIFT_TOLERANCE:
+                job.deadline = expected
+                drifted = True
+        if drifted:
+            log("⚠ 检测到系统时钟跳变或休眠唤醒，已按当前时间重新对齐定时任务")
+            heapq.heapify(self._heap)
+
+    def _dispatch_locked(self, job, now_mono):
+        """到期任务：准时则执行，错过计划时刻则按补执行策略执行、推迟或跳过"""
+        now_wall = self.clock.now()
+        slot = job.slot
+        slot_lateness = (now_wall - slot).total_seconds()
+        # 准时触发以单调时钟计算延迟（毫秒级精度），补执行以计划时刻计算
+        lateness = slot_lateness if slot_lateness > Constants.SCHEDULER_LATE_THRESHOLD else now_mono - job.deadline
+
+        decision = 'run'
+        if slot_lateness > Constants.SCHEDULER_LATE_THRESHOLD and not job.deferred:
+            decision, run_at = self._catchup_decision(job, slot_lateness, now_wall)
+            action = {'run': "立即补执行", 'skip': "跳过本次",
+                      'defer': f"推迟到 {run_at:%H:%M:%S} 执行" if run_at else ""}[decision]
+            log(f"定时任务 {job.name} 错过计划时刻 {slot.strftime('%Y-%m-%d %H:%M:%S')}，"
+                f"延迟 {slot_lateness:.0f} 秒，补执行策略 {job.catchup}: {action}")
+            log_event('schedule.catchup', job=job.name, slot=slot.isoformat(timespec='seconds'),
+                      policy=job.catchup, decision=decision, lateness_s=round(slot_lateness, 3),
+                      run_at=run_at.isoformat(timespec='seconds') if run_at else None)
+            if decision == 'defer':
+                job.plan_at(slot, run_at, now_wall, now_mono, deferred=True)
+                heapq.heappush(self._heap, job)
+                return
+
+        # 以计划时刻为下限推算下一次（单调时钟可能比墙上时间略早到期），避免同一时刻重复触发
+        job.handled = slot
+        job.plan_next(max(now_wall, slot), self.clock.monotonic())
+        heapq.heappush(self._heap, job)
+        self._record_locked(job.key, slot, now_wall if decision == 'run' else None, decision)
+        if decision != 'run':
+            return
+
+        job.lateness.append(lateness)
+        log(f"定时任务触发: {job.name} (计划 {slot.strftime('%H:%M:%S')}，延迟 {lateness * 1000:.1f} ms)")
+        log_event('schedule.fire', job=job.name, scheduled=slot.isoformat(timespec='seconds'),
+                  lateness_ms=round(lateness * 1000, 3))
+        if self.on_fire:
+            self.on_fire(job, slot, lateness)
+        self.clock.spawn(job.func)
+
+    @staticmethod
+    def _catchup_decision(job, lateness, now_wall):
+        """返回 (决定, 推迟到的时刻)，决定为 run / skip / defer"""
+        if job.catchup == ScheduledJob.CATCHUP_GRACE:
+            return ('run', None) if lateness <= job.grace else ('skip', None)
+        if job.catchup == ScheduledJob.CATCHUP_NEXT_SAFE:
+            session_end = trading_session_end(now_wall)
+            return ('defer', session_end) if session_end else ('run', None)
+        return 'skip', None
+
+    def _load_state(self):
+        if not self.state_path:
+            return {}
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            return state if isinstance(state, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            log(f"读取定时任务状态失败: {e}")
+            return {}
+
+    def _record_locked(self, key, slot, run_at, decision):
+        """记录任务最近一次处理的计划时刻并写入状态文件"""
+        self._state[key] = {
+            'last_slot': slot.isoformat(timespec='seconds'),
+            'last_run': run_at.isoformat(timespec='seconds') if run_at else None,
+            'decision': decision
+        }
+        if not self.state_path:
+            return
+        temp_path = self.state_path + ".tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._state, f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, self.state_path)
+        except OSError as e:
+            log(f"保存定时任务状态失败: {e}")
+
+def trading_session_end(now_wall):
+    """当前处于交易时段时返回本时段结束时刻，否则返回 None"""
+    current = now_wall.time()
+    for start, end in Constants.TRADING_SESSIONS:
+        if parse_time_of_day(start) <= current < parse_time_of_day(end):
+            return datetime.combine(now_wall.date(), parse_time_of_day(end))
+    return None
+
+# ====================================================================
+# 任务编排模块
+# ====================================================================
+class TaskStep:
+    """依赖图中的一个步骤"""
+
+    def __init__(self, name, func, deps=(), label=None):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.label = label or name
+
+class TaskGraphResult:
+    """依赖图执行结果 - 每个步骤的状态、相对开始时间和耗时，以及关键路径"""
+
+    SUCCESS, FAILED, SKIPPED = 'success', 'failed', 'skipped'
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.records = {}  # 步骤名 -> {'status', 'start', 'end', 'error'}，时间为相对流程开始的秒数
+        self.total = 0.0
+
+    @property
+    def success(self):
+        return all(record['status'] == self.SUCCESS for record in self.records.values())
+
+    def failed_steps(self):
+        return [name for name, record in self.records.items() if record['status'] == self.FAILED]
+
+    def critical_path(self):
+        """从最晚结束的步骤沿"最晚完成的依赖"回溯，得到决定总耗时的步骤链"""
+        finished = {name: record for name, record in self.records.items() if record['status'] != self.SKIPPED}
+        if not finished:
+            return []
+        current = max(finished, key=lambda name: finished[name]['end'])
+        path = [current]
+        while True:
+            deps = [dep for dep in self.graph.steps[current].deps if dep in finished]
+            if not deps:
+                break
+            current = max(deps, key=lambda name: finished[name]['end'])
+            path.append(current)
+        return path[::-1]
+
+    def critical_path_text(self):
+        return " → ".join(
+            f"{self.graph.steps[name].label}({self.records[name]['end'] - self.records[name]['start']:.1f}s)"
+            for name in self.critical_path()
+        )
+
+    def summary_text(self):
+        """按开始时间排列的步骤时间线"""
+        lines = []
+        for name, record in sorted(self.records.items(), key=lambda item: item[1]['start']):
+            label = self.graph.steps[name].label
+            if record['status'] == self.SKIPPED:
+                lines.append(f"  {label}: 已跳过（{record['error'] or '依赖步骤失败'}）")
+                continue
+            line = (f"  {label}: +{record['start']:.1f}s 开始，耗时 {record['end'] - record['start']:.1f}s，"
+                    f"{'成功' if record['status'] == self.SUCCESS else '失败'}")
+            if record['error']:
+                line += f" ({record['error']})"
+            lines.append(line)
+        return "\n".join(lines)
+
+class ExecutionRun:
+    """一次操作执行的记录 - 由 ExecutionHistory.begin 创建，phase() 为各阶段计时，finish() 写入历史
+
+    也可作为上下文管理器使用：退出时若尚未 finish，按是否有异常记为成功或失败。
+    """
+
+    def __init__(self, history, operation, clock):
+        self.history = history
+        self.operation = operation
+        self.clock = clock
+        self.started_at = clock.now()
+        self._start = clock.monotonic()
+        self.phases = []
+        self.finished = False
+
+    @contextmanager
+    def phase(self, name):
+        """为一个阶段计时，阶段内抛出的异常记为该阶段失败后继续抛出；可通过产出的字典标记失败"""
+        start = self.clock.monotonic()
+        record = {'name': name, 'start': round(start - self._start, 3), 'duration': None,
+                  'outcome': ExecutionHistory.SUCCESS, 'error': None}
+        self.phases.append(record)
+        try:
+            yield record
+        except Exception as e:
+            record.update(outcome=ExecutionHistory.FAILED, error=str(e))
+            raise
+        finally:
+            record['duration'] = round(self.clock.monotonic() - start, 3)
+
+    def timed(self, name, func, *args, **kwargs):
+        """在一个阶段中执行函数并返回其结果（可作为子操作在其他线程执行）"""
+        with self.phase(name):
+            return func(*args, **kwargs)
+
+    def add_phase(self, name, start, duration, outcome, error=None):
+        """添加外部计时的阶段（如盘前流程依赖图的步骤）"""
+        self.phases.append({'name': name, 'start': round(start, 3), 'duration': round(duration, 3),
+                            'outcome': outcome, 'error': error})
+
+    def finish(self, success, error=None):
+        if self.finished:
+            return
+        self.finished = True
+        self.history.record({
+            'operation': self.operation,
+            'start': self.started_at.isoformat(timespec='seconds'),
+            'end': self.clock.now().isoformat(timespec='seconds'),
+            'duration': round(self.clock.monotonic() - self._start, 3),
+            'outcome': ExecutionHistory.SUCCESS if success else ExecutionHistory.FAILED,
+            'error': error,
+            'phases': self.phases
+        })
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.finish(exc is None, str(exc) if exc else None)
+        return False
+
+class ExecutionHistory:
+    """操作执行历史 - 每次执行（开始/结束、各阶段耗时、结果、错误）追加一行JSON到 logs/execution_history.jsonl
+
+    内存中每个操作保留最近 max_samples 次记录，统计（p50/p95耗时、成功率、最近一次）按需计算并缓存，
+    界面每秒查询也不读文件。文件超过 EXECUTION_HISTORY_MAX_LINES 行时只保留内存中的记录重写。
+    """
+
+    SUCCESS = "success"
+    FAILED = "failed"
+    SKIPPED = "skipped"
+
+    def __init__(self, path, max_samples=Constants.EXECUTION_HISTORY_SAMPLES, clock=None):
+        self.path = path
+        self.max_samples = max_samples
+        self.clock = clock or SYSTEM_CLOCK
+        self._lock = threading.Lock()
+        self._runs = {}   # 操作 -> deque(最近的执行记录)
+        self._stats = {}  # 操作 -> 缓存的统计，记录新执行时失效
+        self._lines = 0
+        self._load()
+
+    def begin(self, operation):
+        """开始记录一次执行"""
+        return ExecutionRun(self, operation, self.clock)
+
+    def record(self, run):
+        """保存一条执行记录（ExecutionRun.finish 调用）"""
+        line = json.dumps(run, ensure_ascii=False, separators=(',', ':'))
+        with self._lock:
+            self._runs.setdefault(run['operation'], deque(maxlen=self.max_samples)).append(run)
+            self._stats.pop(run['operation'], None)
+            self._lines += 1
+            try:
+                if self._lines > Constants.EXECUTION_HISTORY_MAX_LINES:
+                    self._compact_locked()
+                else:
+                    with open(self.path, 'a', encoding='utf-8') as f:
+                        f.write(line + "\n")
+            except OSError as e:
+                log(f"保存执行历史失败: {e}")
+
+    def operations(self):
+        with self._lock:
+            return list(self._runs)
+
+    def recent(self, operation, limit=10):
+        """最近 limit 次执行记录（新的在前）"""
+        with self._lock:
+            runs = list(self._runs.get(operation, ()))
+        return runs[::-1][:limit]
+
+    def percentile(self, operation, q=0.95, default=None, phase=None):
+        """最近成功执行（或指定阶段成功执行）耗时的 q 分位数（最近秩法），无样本时返回 default"""
+        with self._lock:
+            runs = list(self._runs.get(operation, ()))
+        if phase is None:
+            samples = [run['duration'] for run in runs if run['outcome'] == self.SUCCESS]
+        else:
+            samples = [item['duration'] for run in runs for item in run.get('phases', ())
+                       if item['name'] == phase and item['outcome'] == self.SUCCESS]
+        return self._nearest_rank(sorted(samples), q, default)
+
+    def stats(self, operation):
+        """操作的耗时统计：count / success_rate / p50 / p95 / last_start / last_duration / last_outcome，无记录返回 None"""
+        with self._lock:
+            cached = self._stats.get(operation)
+            if cached is not None:
+                return cached
+            runs = list(self._runs.get(operation, ()))
+            if not runs:
+                return None
+            durations = sorted(run['duration'] for run in runs if run['outcome'] == self.SUCCESS)
+            last = runs[-1]
+            stats = self._stats[operation] = {
+                'count': len(runs),
+                'success_rate': sum(run['outcome'] == self.SUCCESS for run in runs) / len(runs),
+                'p50': self._nearest_rank(durations, 0.5),
+                'p95': self._nearest_rank(durations, 0.95),
+                'last_start': last['start'],
+                'last_duration': last['duration'],
+                'last_outcome': last['outcome'],
+                'last_error': last['error']
+            }
+            return stats
+
+    @staticmethod
+    def _nearest_rank(samples, q, default=None):
+        if not samples:
+            return default
+        return samples[max(0, math.ceil(q * len(samples)) - 1)]
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    self._lines += 1
+                    try:
+                        run = json.loads(line)
+                        self._runs.setdefault(run['operation'], deque(maxlen=self.max_samples)).append(run)
+                    except (ValueError, KeyError, TypeError):
+                        continue  # 跳过损坏的行（如写入时断电）
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            log(f"读取执行历史失败: {e}")
+
+    def _compact_locked(self):
+        """只保留内存中各操作最近的记录，按开始时间重写文件"""
+        runs = sorted((run for recent in self._runs.values() for run in recent), key=lambda run: run['start'])
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for run in runs:
+                f.write(json.dumps(run, ensure_ascii=False, separators=(',', ':')) + "\n")
+        os.replace(temp_path, self.path)
+        self._lines = len(runs)
+
+class TaskGraph:
+    """任务依赖图执行器 - 步骤声明依赖，依赖全部成功的步骤立即提交到线程池并行执行
+
+    步骤函数抛出异常即为失败，依赖它的步骤（及其下游）被跳过，互不依赖的分支继续执行。
+    执行结束后记录每个步骤的时间线和关键路径。步骤完成通过 clock 通知，模拟运行时按虚拟时间计时。
+    """
+
+    def __init__(self, name, max_workers=Constants.TASK_GRAPH_MAX_WORKERS, clock=None):
+        self.name = name
+        self.max_workers = max_workers
+        self.clock = clock or SYSTEM_CLOCK
+        self.steps = OrderedDict()
+
+    def add_step(self, name, func, deps=(), label=None):
+        if name in self.steps:
+            raise ValueError(f"步骤重复: {name}")
+        self.steps[name] = TaskStep(name, func, deps, label)
+        return self
+
+    def validate(self):
+        """检查依赖是否存在以及是否有环"""
+        for step in self.steps.values():
+            missing = [dep for dep in step.deps if dep not in self.steps]
+            if missing:
+                raise ValueError(f"步骤 {step.name} 依赖不存在的步骤: {', '.join(missing)}")
+        indegree = {name: len(step.deps) for name, step in self.steps.items()}
+        ready = [name for name, degree in indegree.items() if degree == 0]
+        visited = 0
+        while ready:
+            current = ready.pop()
+            visited += 1
+            for step in self.steps.values():
+                if current in step.deps:
+                    indegree[step.name] -= 1
+                    if indegree[step.name] == 0:
+                        ready.append(step.name)
+        if visited != len(self.steps):
+            raise ValueError(f"{self.name} 存在循环依赖")
+
+    def predict(self, duration_of):
+        """按给定的步骤耗时估算总耗时
+
+        Args:
+            duration_of: 步骤名 -> 预计耗时（秒）的函数
+        Returns:
+            (预计总耗时, 关键路径步骤名列表)
+        """
+        self.validate()
+        finish, via = {}, {}
+        remaining = list(self.steps.values())
+        while remaining:
+            for step in list(remaining):
+                if all(dep in finish for dep in step.deps):
+                    latest = max(step.deps, key=lambda dep: finish[dep], default=None)
+                    finish[step.name] = (finish[latest] if latest else 0.0) + duration_of(step.name)
+                    via[step.name] = latest
+                    remaining.remove(step)
+        if not finish:
+            return 0.0, []
+        current = max(finish, key=finish.get)
+        total, path = finish[current], []
+        while current:
+            path.append(current)
+            current = via[current]
+        return total, path[::-1]
+
+    def run(self):
+        """执行全部步骤，返回 TaskGraphResult
+
+        步骤在调用方的取消令牌下执行；令牌取消后不再开始新步骤，尚未开始的步骤记为跳过。
+        """
+        self.validate()
+        result = TaskGraphResult(self)
+        token = current_token()
+        start = self.clock.monotonic()
+        pending = dict(self.steps)
+        running = set()
+        finished = deque()  # (步骤名, 结束时间, 错误信息)
+        cond = threading.Condition()
+
+        def execute(name, func):
+            error = None
+            try:
+                run_with_token(token, func)
+            except Exception as e:
+                error = str(e)
+            with cond:
+                finished.append((name, self.clock.monotonic() - start, error))
+                self.clock.notify(cond)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="task-graph") as executor:
+            while pending or running:
+                for name, step in list(pending.items()):
+                    dep_status = [result.records.get(dep, {}).get('status') for dep in step.deps]
+                    if token.cancelled or any(status in (TaskGraphResult.FAILED, TaskGraphResult.SKIPPED)
+                                              for status in dep_status):
+                        now = self.clock.monotonic() - start
+                        reason = f"操作已取消: {token.reason}" if token.cancelled else None
+                        result.records[name] = {'status': TaskGraphResult.SKIPPED, 'start': now, 'end': now,
+                                                'error': reason}
+                        del pending[name]
+                        log(f"[{self.name}] 跳过 {step.label}：{reason or '依赖步骤失败'}")
+                    elif all(status == TaskGraphResult.SUCCESS for status in dep_status):
+                        result.records[name] = {'status': None, 'start': self.clock.monotonic() - start, 'end': None,
+                                                'error': None}
+                        executor.submit(self.clock.tracked(execute), name, step.func)
+                        running.add(name)
+                        del pending[name]
+                        log(f"[{self.name}] 开始 {step.label}")
+
+                if not running:
+                    continue  # 本轮只产生了跳过的步骤，继续处理其下游
+                with cond:
+                    while not finished:
+                        self.clock.wait(cond)
+                    done = list(finished)
+                    finished.clear()
+                for name, end, error in done:
+                    running.discard(name)
+                    record = result.records[name]
+                    record['end'] = end
+                    record['status'] = TaskGraphResult.FAILED if error is not None else TaskGraphResult.SUCCESS
+                    record['error'] = error
+                    log(f"[{self.name}] {'完成' if record['status'] == TaskGraphResult.SUCCESS else '失败'} "
+                        f"{self.steps[name].label}，耗时 {record['end'] - record['start']:.1f}s"
+                        f"{'：' + record['error'] if record['error'] else ''}")
+                    log_event('taskgraph.step', graph=self.name, step=name, status=record['status'],
+                              start=round(record['start'], 3), duration=round(record['end'] - record['start'], 3),
+                              error=record['error'])
+
+        result.total = self.clock.monotonic() - start
+        log(f"[{self.name}] 结束，总耗时 {result.total:.1f}s，{'全部成功' if result.success else '存在失败步骤'}\n"
+            f"{result.summary_text()}\n  关键路径: {result.critical_path_text()}")
+        log_event('taskgraph.run', graph=self.name, success=result.success, total=round(result.total, 3),
+                  critical_path=result.critical_path())
+        return result
+
 # ====================================================================
 # 定时任务管理模块
 # ====================================================================
 class ScheduleManager:
     """定时任务管理器"""
     
-    def __init__(self, config_manager, status_callback, server_update_callback=None):
+    SCHEDULE_CONFIG_KEYS = ('qmt_run_time', 'rainbow_restart_time', 'qmt_shutdown_time',
+                            'rainbow_shutdown_time', 'system_shutdown_time',
+                            'trading_calendar_path', 'trading_day_only_tasks',
+                            'schedule_catchup_policy', 'schedule_catchup_grace', 'preopen_routine_time',
+                            'preopen_ready_by')
+    
+    def __init__(self, config_manager, status_callback, server_update_callback=None, notifier=None,
+                 clock=None, environment=None):
         self.config = config_manager
         self.status_callback = status_callback
         self.server_update_callback = server_update_callback
+        self.notifier = notifier  # NotificationDispatcher，可选
+        self.clock = clock or SYSTEM_CLOCK
+        self.environment = environment  # 模拟运行环境，提供虚拟的进程管理、行情源测速和关机
+        self.worker = None  # WorkerClient，接入后行情源测速和数据删除在辅助进程执行
         self.is_running = False
-        self.schedule_thread = None
-        self.process_manager = ProcessManager()
+        self.scheduler = DeadlineScheduler("ScheduleManager",
+                                           os.path.join(get_log_dir(), Constants.SCHEDULE_STATE_FILENAME),
+                                           clock=self.clock)
+        self.calendar = None
+        self._calendar_signature = None
+        self._calendar_lock = threading.Lock()  # 交易日历的检查、替换和交给调度器须一起完成，避免两次重新加载交错
+        self.history = ExecutionHistory(os.path.join(get_log_dir(), Constants.EXECUTION_HISTORY_FILENAME), clock=self.clock)
+        self.process_manager = environment.process_manager if environment else ProcessManager()
         self.startup_manager = StartupManager()
+        
+        self.config.subscribe(self._on_schedule_config_changed, keys=self.SCHEDULE_CONFIG_KEYS)
+    
+    def _on_schedule_config_changed(self, event):
+        """定时时间变化：定时任务运行中则按新时间重新排程（调度线程立即按新的截止时间等待）"""
+        if not self.is_running:
+            return
+        log(f"定时配置已更新，重新排程: {', '.join(sorted(event.changed_keys & set(self.SCHEDULE_CONFIG_KEYS)))}")
+        self._register_jobs()
     
     def start_schedule(self):
         """启动定时任务"""
         if self.is_running:
             return
         
-        schedule.clear()
-        
-        qmt_time = self.config.get('qmt_run_time')
-        if qmt_time and is_valid_time(qmt_time):
-            schedule.every().day.at(qmt_time).do(self._scheduled_qmt_restart)
-        
-        rainbow_time = self.config.get('rainbow_restart_time')
-        if rainbow_time and is_valid_time(rainbow_time):
-            schedule.every().day.at(rainbow_time).do(self._scheduled_rainbow_restart)
-        
-        qmt_shutdown_time = self.config.get('qmt_shutdown_time')
-        if qmt_shutdown_time and is_valid_time(qmt_shutdown_time):
-            schedule.every().day.at(qmt_shutdown_time).do(self._scheduled_qmt_shutdown)
-
-        rainbow_shutdown_time = self.config.get('rainbow_shutdown_time')
-        if rainbow_shutdown_time and is_valid_time(rainbow_shutdown_time):
-            schedule.every().day.at(rainbow_shutdown_time).do(self._scheduled_rainbow_shutdown)
-
-        system_shutdown_time = self.config.get('system_shutdown_time')
-        if system_shutdown_time and is_valid_time(system_shutdown_time):
-            schedule.every().day.at(system_shutdown_time).do(self._scheduled_system_shutdown)
+        self._register_jobs()
+        self.scheduler.recover_missed()
+        self.scheduler.start()
         
         self.is_running = True
-        self.schedule_thread = threading.Thread(target=self._run_schedule, daemon=True)
-        self.schedule_thread.start()
         log("定时任务已启动")
         self.status_callback("定时任务已启动")
     
+    def _register_jobs(self):
+        """按当前配置登记定时任务：不再需要的任务移除，其余就地更新（未变化的任务保留推迟补执行状态和触发延迟记录）"""
+        with self._calendar_lock:
+            calendar = self._load_calendar()
+            snapshot = self.config.snapshot
+            trading_day_only = snapshot.trading_day_only_task_set
+        
+            planned_times = {}
+            if snapshot.preopen_routine_time or snapshot.preopen_ready_by:
+                # 盘前流程包含QMT重启和彩虹客户端重启，取代这两个独立的定时任务
+                jobs = (("盘前流程", 'preopen_routine_time', self._scheduled_preopen_routine),)
+                planned_times['preopen_routine_time'] = self._plan_preopen_start()
+            else:
+                jobs = (("QMT重启", 'qmt_run_time', self._scheduled_qmt_restart),
+                        ("彩虹客户端重启", 'rainbow_restart_time', self._scheduled_rainbow_restart))
+            jobs += (
+                ("QMT关闭", 'qmt_shutdown_time', self._scheduled_qmt_shutdown),
+                ("彩虹客户端关闭", 'rainbow_shutdown_time', self._scheduled_rainbow_shutdown),
+                ("系统关机", 'system_shutdown_time', self._scheduled_system_shutdown),
+            )
+            wanted = set()
+            for name, config_key, func in jobs:
+                job_time = planned_times.get(config_key) or self.config.get(config_key)
+                if job_time and is_valid_time(job_time):
+                    wanted.add(name)
+                    # 旧配置文件中没有盘前流程的交易日/补执行设置时，沿用QMT重启任务的设置
+                    setting_key = config_key
+                    if config_key == 'preopen_routine_time' and config_key not in snapshot.catchup_policy_map:
+                        setting_key = 'qmt_run_time'
+                    only_trading_days = setting_key in trading_day_only
+                    job = self.scheduler.update_daily(
+                        name, job_time, func, calendar if only_trading_days else None, key=config_key,
+                        catchup=snapshot.catchup_policy_map.get(setting_key, ScheduledJob.CATCHUP_SKIP),
+                        grace=snapshot.schedule_catchup_grace
+                    )
+                    log(f"定时任务 {name}: 下次运行 {job.next_run.strftime('%Y-%m-%d %H:%M:%S')}"
+                        f"{'（仅交易日）' if only_trading_days else ''}")
+            for job in self.scheduler.jobs():
+                if job.name not in wanted and self.scheduler.remove(job.name):
+                    log(f"定时任务 {job.name}: 已取消")
+    
+    def _plan_preopen_start(self):
+        """由就绪期限和各步骤历史 p95 耗时倒推盘前流程开始时间
+
+        Returns:
+            开始时间字符串 HH:MM:SS；未设置就绪期限时返回 preopen_routine_time
+        """
+        snapshot = self.config.snapshot
+        if not snapshot.preopen_ready_by:
+            return self.config.get('preopen_routine_time')
+        
+        predicted, path = self._build_preopen_graph().predict(
+            lambda step: self.history.percentile("盘前流程", 0.95, Constants.PREOPEN_DEFAULT_STEP_SECONDS.get(step, 30),
+                                                 phase=step)
+        )
+        ready_by = datetime.combine(self.clock.now().date(), snapshot.preopen_ready_by)
+        start = ready_by - timedelta(seconds=predicted + Constants.PREOPEN_SAFETY_MARGIN)
+        
+        earliest = snapshot.preopen_routine_time
+        if earliest and start.time() < earliest:
+            start = datetime.combine(start.date(), earliest)
+        finish = start + timedelta(seconds=predicted)
+        if finish > ready_by:
+            log(f"⚠ 盘前流程预计 {predicted:.0f}s，从最早开始时间 {earliest.strftime('%H:%M:%S')} 开始将于 "
+                f"{finish.strftime('%H:%M:%S')} 完成，无法满足就绪期限 {snapshot.preopen_ready_by.strftime('%H:%M:%S')}")
+            self._publish_event("盘前流程可能无法按时就绪",
+                                f"预计耗时 {predicted:.0f}s，预计完成 {finish.strftime('%H:%M:%S')}，"
+                                f"就绪期限 {snapshot.preopen_ready_by.strftime('%H:%M:%S')}", "warning")
+        
+        log(f"盘前流程计划: {start.strftime('%H:%M:%S')} 开始，按p95耗时预计 {predicted:.0f}s"
+            f"（另留 {Constants.PREOPEN_SAFETY_MARGIN}s 余量），就绪期限 {snapshot.preopen_ready_by.strftime('%H:%M:%S')}，"
+            f"关键路径: {' → '.join(path)}")
+        log_event('preopen.plan', start=start.strftime('%H:%M:%S'), predicted=round(predicted, 3),
+                  ready_by=snapshot.preopen_ready_by.strftime('%H:%M:%S'), critical_path=path)
+        return start.strftime('%H:%M:%S')
+    
+    def _replan_preopen(self):
+        """检查是否按时就绪，并按执行历史中的新耗时重新计划下次开始时间"""
+        ready_by = self.config.snapshot.preopen_ready_by
+        finished = self.clock.now()
+        if ready_by and finished.time() > ready_by:
+            log(f"⚠ 盘前流程于 {finished.strftime('%H:%M:%S')} 完成，晚于就绪期限 {ready_by.strftime('%H:%M:%S')}")
+            self._publish_event("盘前流程未按时就绪",
+                                f"完成时间 {finished.strftime('%H:%M:%S')}，就绪期限 {ready_by.strftime('%H:%M:%S')}",
+                                "warning")
+        if ready_by and self.is_running:
+            # 只调整盘前流程的开始时间，其他任务不动
+            job = self.scheduler.reschedule("盘前流程", self._plan_preopen_start())
+            if job:
+                log(f"定时任务 盘前流程: 下次运行 {job.next_run.strftime('%Y-%m-%d %H:%M:%S')}")
+    
+    def _load_calendar(self):
+        """加载交易日历（文件未变化时沿用已加载的索引），调用方须持有 _calendar_lock"""
+        path = self.config.snapshot.trading_calendar_path or os.path.join(get_log_dir(), Constants.TRADING_CALENDAR_FILENAME)
+        try:
+            stat = os.stat(path)
+            signature = (path, stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            signature = (path, None, None)
+        if self.calendar is None or signature != self._calendar_signature:
+            self.calendar = TradingCalendar.load(path)
+            self._calendar_signature = signature
+        return self.calendar
+    
+    def reload_calendar_if_changed(self):
+        """交易日历文件变化时重新加载，并就地更新仅交易日任务的下次触发（由 ConfigWatcher 定期调用）"""
+        if not self.is_running:
+            return
+        with self._calendar_lock:
+            previous = self.calendar
+            calendar = self._load_calendar()
+            if calendar is previous:
+                return
+            jobs = self.scheduler.replace_calendar(calendar)
+        log("交易日历文件已变化，已重新加载")
+        for job in jobs:
+            log(f"定时任务 {job.name}: 下次运行 {job.next_run.strftime('%Y-%m-%d %H:%M:%S')}（仅交易日）")
+    
     def stop_schedule(self):
         """停止定时任务"""
         if not self.is_running:
             return
         
-        schedule.clear()
+        self.scheduler.clear()
+        self.scheduler.stop()
         self.is_running = False
-        
-        if self.schedule_thread and self.schedule_thread.is_alive():
-            self.schedule_thread.join(timeout=2)
             
         log("定时任务已停止")
         self.status_callback("定时任务已停止")
     
+    def next_run(self):
+        """下次定时任务的触发时间，未启动或无任务时返回 None"""
+        return self.scheduler.next_run() if self.is_running else None
+    
     # 公共接口方法 - 避免直接访问protected成员
     def restart_qmt_service(self):
         """公共接口：重启QMT服务"""
@@ -1330,55 +4891,43 @@ class ScheduleManager:
         """公共接口：关闭系统"""
         return self._shutdown_system()
     
-    def _run_schedule(self):
-        """定时任务运行循环"""
-        while self.is_running:
-            schedule.run_pending()
-            time.sleep(1)
-    
     def _scheduled_qmt_restart(self):
-        log(f"定时任务触发: QMT重启 ({self.config.get('qmt_run_time')})")
         self._restart_qmt()
     
     def _scheduled_rainbow_restart(self):
-        log(f"定时任务触发: 彩虹客户端重启 ({self.config.get('rainbow_restart_time')})")
         self._restart_rainbow_client()
     
     def _scheduled_qmt_shutdown(self):
-        log(f"定时任务触发: QMT关闭 ({self.config.get('qmt_shutdown_time')})")
         self._shutdown_qmt()
     
     def _scheduled_rainbow_shutdown(self):
-        log(f"定时任务触发: 彩虹客户端关闭 ({self.config.get('rainbow_shutdown_time')})")
         self._shutdown_rainbow()
     
     def _scheduled_system_shutdown(self):
-        log(f"定时任务触发: 系统关机 ({self.config.get('system_shutdown_time')})")
         self._shutdown_system()
     
-    @async_operation("qmt_restart")
+    @async_operation("qmt_restart", timeout=Constants.PROCESS_RESTART_TIMEOUT)
     def _restart_qmt(self):
-        """重启QMT（包含行情源优选）"""
+        """重启QMT（包含行情源优选）：测速与关闭QMT并行，QMT关闭后写入本次选出的服务器再启动"""
         try:
+            optimizer = self._create_server_optimizer()
             result = self._execute_process_operation(
                 operation_name="重启QMT",
                 process_name=Constants.QMT_PROCESS_NAME,
                 exe_path=os.path.join(self.config.get('qmt_dir'), 'bin.x64', 'XtItClient.exe'),
-                pre_operation=self._optimize_servers,
+                concurrent_operation=('probe', optimizer.probe_servers),
+                pre_launch=('apply', lambda probe_result: self._apply_server_selection(optimizer, probe_result)),
                 operation_type="restart"
             )
-            
-            if hasattr(self, 'memory_manager'):
-                self.memory_manager.cleanup_if_needed()
-                
+
             return result
         except Exception as e:
             log(f"QMT重启过程中发生错误: {e}")
             return False
     
-    @async_operation("rainbow_restart")
+    @async_operation("rainbow_restart", timeout=Constants.PROCESS_RESTART_TIMEOUT)
     def _restart_rainbow_client(self):
-        """重启彩虹客户端（包含删除数据）"""
+        """重启彩虹客户端（包含删除数据）：关闭客户端、删除早盘数据完成后再启动"""
         try:
             exe_path = self.config.get('rainbow_exe_path')
             exe_name = os.path.basename(exe_path)
@@ -1387,13 +4936,10 @@ class ScheduleManager:
                 operation_name="重启彩虹客户端",
                 process_name=exe_name,
                 exe_path=exe_path,
-                pre_operation=self._delete_early_market_data,
+                pre_launch=('cleanup', lambda _: self._delete_early_market_data()),
                 operation_type="restart"
             )
-            
-            if hasattr(self, 'memory_manager'):
-                self.memory_manager.cleanup_if_needed()
-                
+
             return result
         except Exception as e:
             log(f"彩虹客户端重启过程中发生错误: {e}")
@@ -1401,7 +4947,8 @@ class ScheduleManager:
     
     @async_operation("data_cleanup")
     def _delete_early_market_data(self):
-        """删除早盘数据"""
+        """删除早盘数据，返回是否全部删除成功；异常记录后继续抛出给调用方（重启流程、盘前流程）"""
+        run = self.history.begin("删除早盘数据")
         try:
             self.status_callback("正在删除早盘数据...")
             
@@ -1410,35 +4957,83 @@ class ScheduleManager:
                 self.config.get('delete_folders')
             )
             
-            # 注册大对象到内存管理器
-            if hasattr(self, 'memory_manager'):
-                self.memory_manager.register_large_object(data_manager)
-            
-            deleted_folders, failed_folders = data_manager.delete_early_market_data()
+            deleted_folders, failed_folders = self._run_data_cleanup(data_manager)
+            run.finish(not failed_folders,
+                       "; ".join(f"{name}: {error}" for name, error in failed_folders) if failed_folders else None)
             
             if not failed_folders:
                 self.status_callback("早盘数据删除成功！")
             else:
                 self.status_callback(f"部分数据删除失败: {failed_folders}")
+            return not failed_folders
                 
+        except OperationCancelled as e:
+            run.finish(False, str(e))
+            raise
         except Exception as e:
             log(f"数据删除过程中发生错误: {e}")
             self.status_callback(f"数据删除失败: {e}")
-        finally:
-            # 执行内存清理
-            if hasattr(self, 'memory_manager'):
-                self.memory_manager.cleanup_if_needed()
+            run.finish(False, str(e))
+            raise
+    
+    def _run_data_cleanup(self, data_manager):
+        """删除数据文件夹：接入辅助进程时在辅助进程中执行并把进度显示到状态栏，否则（或辅助进程不可用时）在本进程执行"""
+        def show_progress(message):
+            text = f"正在删除早盘数据 ({message['index']}/{message['total']}): {message['folder']}"
+            if 'files' in message:
+                text += (f" {message['files']}/{message['total_files']} 个文件，"
+                         f"{message['files_per_sec']:.0f} 文件/秒，{message['mb_per_sec']:.1f} MB/秒")
+            self.status_callback(text)
+        
+        if self.worker:
+            try:
+                deleted_folders, failed_folders = self.worker.call(
+                    'delete_folders',
+                    {'base_path': data_manager.base_path, 'folder_names': ','.join(data_manager.folder_names)},
+                    progress=show_progress)
+                return deleted_folders, [tuple(item) for item in failed_folders]
+            except WorkerError as e:
+                log(f"辅助进程删除数据失败（{e}），改为本进程删除")
+        return data_manager.delete_early_market_data(progress=lambda **message: show_progress(message))
+    
+    def purge_data_trash(self):
+        """清理上次未清理完的数据回收区：接入辅助进程时在辅助进程中后台清理，否则在本进程后台清理"""
+        base_path = self.config.get('delete_base_path')
+        if not base_path or not os.path.isdir(os.path.join(base_path, Constants.TRASH_DIR_NAME)):
+            return
+        log("发现未清理完的数据回收区，开始后台清理")
+        if self.worker:
+            try:
+                self.worker.call('purge_trash', {'base_path': base_path}, timeout=Constants.WORKER_SCAN_TIMEOUT)
+                return
+            except WorkerError as e:
+                log(f"辅助进程清理回收区失败（{e}），改为本进程清理")
+        DataManager(base_path, '').purge_trash()
     
+    def _cancel_restarts(self, operation_ids, operation_name):
+        """紧急关闭前取消常规通道中正在进行的重启/盘前流程，等其退出后再关闭，避免关闭后又被重新启动"""
+        if not hasattr(self, 'async_manager'):
+            return
+        cancelled = self.async_manager.cancel_operations(operation_ids, f"让位于{operation_name}",
+                                                         wait=Constants.ASYNC_CANCEL_GRACE)
+        if cancelled:
+            log(f"{operation_name}：已取消进行中的 {', '.join(cancelled)}")
+    
+    @async_operation("qmt_shutdown", lane=AsyncOperationManager.URGENT, preempt=(AsyncOperationManager.BACKGROUND,))
     def _shutdown_qmt(self):
-        """关闭QMT - 优化版"""
+        """关闭QMT - 优化版（紧急通道，抢占后台测量，并取消会重新启动QMT的重启和盘前流程）"""
+        self._cancel_restarts(("qmt_restart", "preopen_routine"), "关闭QMT")
         return self._execute_process_operation(
             operation_name="关闭QMT",
             process_name=Constants.QMT_PROCESS_NAME,
             operation_type="shutdown"
         )
     
+    @async_operation("rainbow_shutdown", lane=AsyncOperationManager.URGENT,
+                     preempt=(AsyncOperationManager.BACKGROUND,))
     def _shutdown_rainbow(self):
-        """关闭彩虹客户端 - 优化版"""
+        """关闭彩虹客户端 - 优化版（紧急通道，抢占后台测量，并取消会重新启动彩虹客户端的重启和盘前流程）"""
+        self._cancel_restarts(("rainbow_restart", "preopen_routine"), "关闭彩虹客户端")
         exe_path = self.config.get('rainbow_exe_path')
         exe_name = os.path.basename(exe_path)
         
@@ -1449,38 +5044,99 @@ class ScheduleManager:
         )
     
     def _execute_process_operation(self, operation_name, process_name, exe_path=None, 
-                                 pre_operation=None, operation_type="restart"):
-        """通用进程操作方法"""
+                                 concurrent_operation=None, pre_launch=None, operation_type="restart"):
+        """通用进程操作方法
+        
+        Args:
+            concurrent_operation: (阶段名, 函数)，操作开始时作为子操作与关闭进程并行执行（如行情源测速）
+            pre_launch: (阶段名, 函数)，进程关闭后、启动前执行，参数为 concurrent_operation 的结果（没有时为 None），
+                抛出异常则不再启动进程
+        """
         log(f"开始执行{operation_name}任务...")
         self.status_callback(f"正在{operation_name}...")
         
+        start = self.clock.monotonic()
+        event = {'operation': operation_name, 'process': process_name}
+        run = self.history.begin(operation_name)
         try:
-            if pre_operation and callable(pre_operation):
-                pre_operation()
-            
-            if operation_type in ["restart", "shutdown"]:
-                self.status_callback(f"正在关闭{process_name}进程...")
+            result = self._run_process_operation(operation_name, process_name, exe_path, concurrent_operation,
+                                                 pre_launch, operation_type, event, run)
+        except Exception as e:
+            log(f"{operation_name}失败: {e}")
+            self.status_callback(f"✗ {operation_name}失败: {e}")
+            self._publish_event(f"{operation_name}失败", str(e), "error")
+            event['error'] = str(e)
+            result = False
+        run.finish(bool(result), event.get('error'))
+        log_event(f'process.{operation_type}', success=bool(result),
+                  duration=round(self.clock.monotonic() - start, 3), **event)
+        return result
+    
+    def _run_process_operation(self, operation_name, process_name, exe_path, concurrent_operation, pre_launch,
+                               operation_type, event, run):
+        child = None
+        if concurrent_operation:
+            phase_name, func = concurrent_operation
+            child = ChildOperation(phase_name, run.timed, phase_name, func, clock=self.clock,
+                                   lane=self._lane(AsyncOperationManager.BACKGROUND))
+        try:
+            return self._run_process_steps(operation_name, process_name, exe_path, child, pre_launch,
+                                           operation_type, event, run)
+        finally:
+            if child and not child.done():
+                child.cancel(f"{operation_name}已结束")
+    
+    def _run_process_steps(self, operation_name, process_name, exe_path, child, pre_launch, operation_type, event, run):
+        if operation_type in ["restart", "shutdown"]:
+            self.status_callback(f"正在关闭{process_name}进程...")
+            with run.phase('terminate') as phase:
                 success_count, failed_count = self.process_manager.terminate_processes_by_name(process_name)
-                self._report_process_status(operation_name, success_count, failed_count, "关闭")
+                if failed_count:
+                    phase.update(outcome=ExecutionHistory.FAILED, error=f"{failed_count} 个进程未能关闭")
+            event.update(terminated=success_count, terminate_failed=failed_count)
+            self._report_process_status(operation_name, success_count, failed_count, "关闭")
+        
+        if operation_type in ["restart", "start"] and exe_path:
+            prepared = None
+            if child:
+                try:
+                    prepared = child.result()
+                except OperationCancelled as e:
+                    current_token().check()  # 本操作被取消时继续抛出；仅子操作被抢占时按无结果继续
+                    log(f"{operation_name}: {child.name} 已被取消（{e}），按无结果继续")
+            if pre_launch:
+                phase_name, func = pre_launch
+                run.timed(phase_name, func, prepared)
             
-            if operation_type in ["restart", "start"] and exe_path:
-                self.status_callback(f"正在启动{operation_name.replace('重启', '').replace('关闭', '')}...")
+            self.status_callback(f"正在启动{operation_name.replace('重启', '').replace('关闭', '')}...")
+            with run.phase('launch') as phase:
                 success, result = self.process_manager.start_process(exe_path)
-                
-                if success:
-                    self.status_callback(f"✓ {operation_name}成功！(PID={result})")
-                    return True
-                else:
-                    self.status_callback(f"✗ {operation_name}失败: {result}")
-                    return False
+                if not success:
+                    phase.update(outcome=ExecutionHistory.FAILED, error=str(result))
             
-            if operation_type == "shutdown":
+            if success:
+                event['pid'] = result
+                self.status_callback(f"✓ {operation_name}成功！(PID={result})")
+                self._publish_event(f"{operation_name}成功", f"{operation_name}成功，进程PID={result}", "success")
                 return True
-                
-        except Exception as e:
-            log(f"{operation_name}失败: {e}")
-            self.status_callback(f"✗ {operation_name}失败: {e}")
-            return False
+            else:
+                event['error'] = str(result)
+                self.status_callback(f"✗ {operation_name}失败: {result}")
+                self._publish_event(f"{operation_name}失败", str(result), "error")
+                return False
+        
+        if operation_type == "shutdown":
+            self._publish_event(f"{operation_name}完成", f"{operation_name}完成", "info")
+            return True
+    
+    def _lane(self, name):
+        """异步管理器的执行通道，未接入异步管理器（如模拟运行）时返回 None"""
+        return self.async_manager.lanes[name] if hasattr(self, 'async_manager') else None
+    
+    def _publish_event(self, title, content, msg_type="info"):
+        """发布定时任务/进程操作事件到通知分发器"""
+        if self.notifier:
+            self.notifier.publish(NotificationEvent(title, content, msg_type, source="schedule"))
     
     def _report_process_status(self, operation_name, success_count, failed_count, action="操作"):
         if failed_count > 0:
@@ -1490,65 +5146,125 @@ class ScheduleManager:
         else:
             self.status_callback(f"ℹ 未发现运行中的进程")
     
+    @async_operation("system_shutdown", lane=AsyncOperationManager.URGENT,
+                     preempt=(AsyncOperationManager.BACKGROUND,))
     def _shutdown_system(self):
         """系统关机"""
         log("系统将在1分钟后关机...")
         self.status_callback("系统将在1分钟后关机...")
-        os.system("shutdown -s -t 60")
+        self._publish_event("系统关机通知", "系统将在1分钟后关机", "warning")
+        if self.environment:
+            self.environment.shutdown_system()
+        else:
+            os.system("shutdown -s -t 60")
     
-    @async_operation("server_optimization")
-    def _optimize_servers(self):
-        """执行行情源优选"""
-        log("开始执行行情源自动切换任务...")
-        self.status_callback("正在优选行情源...")
-        
-        try:
-            optimizer = ServerOptimizer(
-                self.config.get('qmt_dir'),
-                self.config.get('qmt_only_vip', True)
-            )
-            
-            # 注册大对象到内存管理器
-            if hasattr(self, 'memory_manager'):
-                self.memory_manager.register_large_object(optimizer)
-            
-            best_hq, best_jy, tree, quoter_server_map, config_path = optimizer.find_best_servers()
-            
-            # 初始化变量避免未定义错误
-            hq_info = "未知服务器"
-            jy_info = "未知服务器"
-            
-            if best_hq and best_jy:
-                if optimizer.update_qmt_config(best_hq, best_jy, tree, quoter_server_map, config_path):
-                    log("✅ 行情源自动切换任务执行完成")
-                    hq_info = f"{best_hq['servername']} ({best_hq['median_value']:.2f}ms)"
-                    jy_info = f"{best_jy['servername']} ({best_jy['median_value']:.2f}ms)"
-                    log(f"最佳行情服务器: {hq_info}")
-                    log(f"最佳交易服务器: {jy_info}")
-                    
-                    self.status_callback("行情源优选完成")
-                    # 更新UI显示的服务器信息
-                    if self.server_update_callback:
-                        self.server_update_callback(hq_info, jy_info)
-                else:
-                    log("❌ 配置更新失败，将使用默认配置启动QMT")
-                    self.status_callback("行情源配置更新失败，将使用默认配置启动QMT")
-                    # 更新UI显示失败状态
-                    if self.server_update_callback:
-                        self.server_update_callback("配置更新失败", "配置更新失败")
+    def _create_server_optimizer(self):
+        if self.environment:
+            return self.environment.server_optimizer()
+        if self.worker:
+            return WorkerServerOptimizer(self.worker, self.config.get('qmt_dir'), self.config.get('qmt_only_vip', True))
+        return ServerOptimizer(
+            self.config.get('qmt_dir'),
+            self.config.get('qmt_only_vip', True)
+        )
+    
+    def _apply_server_selection(self, optimizer, probe_result):
+        """把测速选出的服务器写入QMT配置，并更新界面显示（QMT需已关闭），返回是否已写入"""
+        best_hq, best_jy, tree, quoter_server_map, config_path = probe_result or (None,) * 5
+        
+        # 初始化变量避免未定义错误
+        hq_info = "未知服务器"
+        jy_info = "未知服务器"
+        
+        if best_hq and best_jy:
+            if optimizer.update_qmt_config(best_hq, best_jy, tree, quoter_server_map, config_path):
+                log("✅ 行情源自动切换任务执行完成")
+                hq_info = f"{best_hq['servername']} ({best_hq['median_value']:.2f}ms)"
+                jy_info = f"{best_jy['servername']} ({best_jy['median_value']:.2f}ms)"
+                log(f"最佳行情服务器: {hq_info}")
+                log(f"最佳交易服务器: {jy_info}")
+                
+                self.status_callback("行情源优选完成")
+                # 更新UI显示的服务器信息
+                if self.server_update_callback:
+                    self.server_update_callback(hq_info, jy_info)
+                return True
             else:
-                log("❌ 未找到有效的服务器，将使用默认配置启动QMT")
-                self.status_callback("未找到有效的行情服务器，将使用默认配置启动QMT")
-                # 更新UI显示未找到服务器状态
+                log("❌ 配置更新失败，将使用默认配置启动QMT")
+                self.status_callback("行情源配置更新失败，将使用默认配置启动QMT")
+                # 更新UI显示失败状态
                 if self.server_update_callback:
-                    self.server_update_callback("未找到有效服务器", "未找到有效服务器")
-                    
-        except Exception as e:
-            log(f"服务器优化过程中发生错误: {e}")
-        finally:
-            # 执行内存清理
-            if hasattr(self, 'memory_manager'):
-                self.memory_manager.cleanup_if_needed()
+                    self.server_update_callback("配置更新失败", "配置更新失败")
+        else:
+            log("❌ 未找到有效的服务器，将使用默认配置启动QMT")
+            self.status_callback("未找到有效的行情服务器，将使用默认配置启动QMT")
+            # 更新UI显示未找到服务器状态
+            if self.server_update_callback:
+                self.server_update_callback("未找到有效服务器", "未找到有效服务器")
+        return False
+    
+    def _scheduled_preopen_routine(self):
+        self._run_preopen_routine()
+    
+    @async_operation("preopen_routine", timeout=Constants.PREOPEN_ROUTINE_TIMEOUT)
+    def _run_preopen_routine(self):
+        """按依赖图执行盘前流程：行情源测速与关闭QMT、关闭彩虹客户端与数据清理并行，最后依次启动"""
+        log("开始执行盘前流程...")
+        self.status_callback("正在执行盘前流程...")
+        
+        run = self.history.begin("盘前流程")
+        graph = self._build_preopen_graph()
+        result = graph.run()
+        for name, record in result.records.items():
+            run.add_phase(name, record['start'], record['end'] - record['start'], record['status'], record['error'])
+        run.finish(result.success, None if result.success else f"失败步骤: {', '.join(result.failed_steps())}")
+        self._replan_preopen()
+        
+        if result.success:
+            self.status_callback(f"✓ 盘前流程完成，耗时 {result.total:.1f}s")
+            self._publish_event("盘前流程完成", f"耗时 {result.total:.1f}s，关键路径: {result.critical_path_text()}", "success")
+        else:
+            failed = ", ".join(graph.steps[name].label for name in result.failed_steps())
+            self.status_callback(f"✗ 盘前流程失败: {failed}")
+            self._publish_event("盘前流程失败", f"失败步骤: {failed}\n{result.summary_text()}", "error")
+        return result
+    
+    def _build_preopen_graph(self):
+        """构建盘前流程依赖图
+
+        行情源测速 ─┐
+        关闭QMT ────┴→ 应用服务器配置 → 启动QMT ─┐
+        关闭彩虹客户端 → 删除早盘数据 ────────────┴→ 启动彩虹客户端
+        """
+        qmt_exe = os.path.join(self.config.get('qmt_dir'), 'bin.x64', 'XtItClient.exe')
+        rainbow_exe = self.config.get('rainbow_exe_path')
+        optimizer = self._create_server_optimizer()
+        probe = {}
+        
+        graph = TaskGraph("盘前流程", clock=self.clock)
+        graph.add_step('probe_servers', lambda: probe.update(result=optimizer.probe_servers()), label="行情源测速")
+        graph.add_step('stop_qmt', lambda: self._stop_process_step(Constants.QMT_PROCESS_NAME), label="关闭QMT")
+        graph.add_step('apply_servers', lambda: self._apply_server_selection(optimizer, probe['result']),
+                       deps=('probe_servers', 'stop_qmt'), label="应用服务器配置")
+        graph.add_step('start_qmt', lambda: self._start_process_step(qmt_exe), deps=('apply_servers',), label="启动QMT")
+        graph.add_step('stop_rainbow', lambda: self._stop_process_step(os.path.basename(rainbow_exe)),
+                       label="关闭彩虹客户端")
+        graph.add_step('delete_data', self._delete_early_market_data, deps=('stop_rainbow',), label="删除早盘数据")
+        graph.add_step('start_rainbow', lambda: self._start_process_step(rainbow_exe),
+                       deps=('delete_data', 'start_qmt'), label="启动彩虹客户端")
+        return graph
+    
+    def _stop_process_step(self, process_name):
+        success_count, failed_count = self.process_manager.terminate_processes_by_name(process_name)
+        self._report_process_status(process_name, success_count, failed_count, "关闭")
+        if failed_count:
+            raise RuntimeError(f"{failed_count} 个 {process_name} 进程未能关闭")
+    
+    def _start_process_step(self, exe_path):
+        success, result = self.process_manager.start_process(exe_path)
+        if not success:
+            raise RuntimeError(f"启动 {os.path.basename(exe_path)} 失败: {result}")
+        log(f"✓ {os.path.basename(exe_path)} 已启动 (PID={result})")
 
 # ====================================================================
 # 核心业务逻辑模块
@@ -1556,21 +5272,88 @@ class ScheduleManager:
 class CoreLogic:
     """核心业务逻辑控制器"""
 
-    def __init__(self, config_manager, status_callback, server_update_callback=None):
+    NOTIFICATION_CONFIG_KEYS = ('feishu_webhook_url', 'feishu_at_all', 'notification_coalesce_window',
+                                'notify_webhook_urls', 'notify_file_path', 'notify_socket_address',
+                                'notify_backend_timeout')
+
+    def __init__(self, config_manager, status_callback, server_update_callback=None, handoff=None):
         self.config = config_manager
         self.status_callback = status_callback
         self.server_update_callback = server_update_callback
         
-        self.process_manager = ProcessManager()
-        self.startup_manager = StartupManager()
-        self.schedule_manager = ScheduleManager(config_manager, status_callback, server_update_callback)
-        
+        self.notification_outbox = NotificationOutbox(
+            os.path.join(get_log_dir(), Constants.NOTIFICATION_OUTBOX_FILENAME)
+        )
         self.feishu_notifier = FeishuNotifier(
             webhook_url=config_manager.get('feishu_webhook_url', ''),
-            at_all=config_manager.get('feishu_at_all', False)
+            at_all=config_manager.get('feishu_at_all', False),
+            outbox=self.notification_outbox
         )
+        self.feishu_backend = FeishuBackend(self.feishu_notifier, config_manager)
+        self.notification_dispatcher = NotificationDispatcher(self._build_notification_backends())
+        
+        self.process_manager = ProcessManager()
+        self.startup_manager = StartupManager()
+        self.schedule_manager = ScheduleManager(config_manager, status_callback, server_update_callback,
+                                                notifier=self.notification_dispatcher)
+        
+        self.config.subscribe(self._on_notification_config_changed, keys=self.NOTIFICATION_CONFIG_KEYS)
+        self.config_watcher = ConfigWatcher(config_manager)
+        self.config_watcher.watch(self.schedule_manager.reload_calendar_if_changed)
+        self.config_watcher.start()
+        
+        self.worker = None
         self.monitoring_thread = None
-        self.start_monitoring()
+        self._stopped_monitor = None  # 已请求停止、可能仍在退出中的监控线程
+        self._monitor_handoff = None
+        if handoff:
+            self._restore_handoff(handoff)
+        if not handoff or handoff.get('monitoring_running', True):
+            self.start_monitoring()
+    
+    def _restore_handoff(self, handoff):
+        """接续监督进程重新拉起前的状态：监控检测结果和通知分类限频"""
+        elapsed = handoff.get('age', 0)
+        self.feishu_notifier.rate_limiter.restore_key_state(handoff.get('notification_keys', {}), elapsed)
+        self._monitor_handoff = handoff.get('monitor')
+        log(f"已接续上一个守护进程（PID={handoff.get('pid')}）的状态，交接间隔 {elapsed:.1f}秒")
+        log_event('guardian.handoff', direction='restore', previous_pid=handoff.get('pid'), age=round(elapsed, 1),
+                  reason=handoff.get('reason'))
+    
+    def export_handoff(self, reason):
+        """写入交接状态，供监督进程重新拉起的守护进程接续"""
+        state = {
+            'reason': reason,
+            'monitoring_running': bool(self.is_monitoring_running),
+            'monitor': self.monitoring_thread.export_state() if self.monitoring_thread else None,
+            'notification_keys': self.feishu_notifier.rate_limiter.export_key_state()
+        }
+        if write_handoff(state):
+            log_event('guardian.handoff', direction='export', reason=reason,
+                      monitoring_running=state['monitoring_running'])
+    
+    def _build_notification_backends(self):
+        """根据配置构建通知后端列表（飞书后端始终保留同一实例）"""
+        timeout = self.config.get('notify_backend_timeout', Constants.NOTIFY_BACKEND_TIMEOUT)
+        self.feishu_backend.timeout = timeout
+        backends = [self.feishu_backend]
+        
+        for url in self.config.get('notify_webhook_urls', '').split(','):
+            if url.strip():
+                backends.append(WebhookBackend(url.strip(), timeout))
+        
+        file_path = self.config.get('notify_file_path', '').strip()
+        if file_path:
+            backends.append(FileBackend(file_path, timeout))
+        
+        socket_address = self.config.get('notify_socket_address', '').strip()
+        if socket_address:
+            try:
+                backends.append(SocketBackend(socket_address, timeout))
+            except ValueError as e:
+                log(f"套接字通知后端配置无效: {e}")
+        
+        return backends
     
     def restart_qmt(self):
         """立即重启QMT"""
@@ -1592,6 +5375,29 @@ class CoreLogic:
         """立即关机"""
         self.schedule_manager.shutdown_system_service()
     
+    def attach_worker(self, worker):
+        """接入辅助进程：行情源测速、数据删除和监控的进程扫描改在辅助进程执行"""
+        self.worker = worker
+        self.schedule_manager.worker = worker
+        if self.monitoring_thread:
+            self.monitoring_thread.worker = worker
+        # 上次退出时未清理完的数据回收区（辅助进程被结束、文件被占用等）在启动后接着清理
+        Worker(self.schedule_manager.purge_data_trash).start()
+    
+    def report_stuck_operation(self, operation_id, elapsed, reason):
+        """看门狗发现取消后仍未退出的操作时上报到状态栏和通知"""
+        message = f"操作 {operation_id} 已运行 {elapsed:.0f}s，取消（{reason}）后仍未退出，可能已卡死"
+        self.status_callback(f"✗ {message}")
+        self.notification_dispatcher.publish(NotificationEvent("操作卡死", message, "error",
+                                                               key=f"stuck_{operation_id}", source="watchdog"))
+    
+    def report_memory_alarm(self, rss_mb, budget_mb):
+        """守护进程内存超出预算时上报到状态栏和通知"""
+        message = f"守护进程内存 {rss_mb:.0f}MB 超出预算 {budget_mb}MB，可点击“内存增长分析”定位增长来源"
+        self.status_callback(f"⚠ {message}")
+        self.notification_dispatcher.publish(NotificationEvent("内存超出预算", message, "warning",
+                                                               key="memory_budget", source="memory"))
+    
     def toggle_startup(self, enable):
         """切换开机启动状态"""
         if self.startup_manager.set_startup(enable):
@@ -1618,18 +5424,35 @@ class CoreLogic:
         """定时任务是否正在运行"""
         return self.schedule_manager.is_running
     
+    def next_schedule_run(self):
+        """下次定时任务的触发时间"""
+        return self.schedule_manager.next_run()
+    
+    def get_execution_stats(self, operation):
+        """操作（如 重启QMT、盘前流程）的执行耗时统计，无记录返回 None"""
+        return self.schedule_manager.history.stats(operation)
+    
     def start_monitoring(self):
         """启动实时监控"""
         if self.monitoring_thread and self.monitoring_thread.is_alive():
             log("监控线程已在运行")
             return
+        if self._stopped_monitor:
+            # 上一个监控线程已被唤醒退出，等它结束再启动新线程，避免两个线程同时检测
+            self._stopped_monitor.join(Constants.MONITOR_STOP_TIMEOUT)
+            self._stopped_monitor = None
         
         self.monitoring_thread = MonitoringThread(
             config_manager=self.config,
-            feishu_notifier=self.feishu_notifier,
+            notifier=self.notification_dispatcher,
             status_callback=self.status_callback,
-            server_update_callback=self.server_update_callback
+            server_update_callback=self.server_update_callback,
+            worker=self.worker
         )
+        if self._monitor_handoff:
+            self.monitoring_thread.restore_state(self._monitor_handoff.get('qmt_running'),
+                                                 self._monitor_handoff.get('network_connected', False))
+            self._monitor_handoff = None
         self.monitoring_thread.start_monitoring()
         log("实时监控已启动")
         self.status_callback("实时监控已启动")
@@ -1638,6 +5461,7 @@ class CoreLogic:
         """停止实时监控"""
         if self.monitoring_thread:
             self.monitoring_thread.stop_monitoring()
+            self._stopped_monitor = self.monitoring_thread
             self.monitoring_thread = None
             log("实时监控已停止")
             self.status_callback("实时监控已停止")
@@ -1647,17 +5471,1057 @@ class CoreLogic:
         """监控是否正在运行"""
         return self.monitoring_thread and self.monitoring_thread.is_alive()
     
-    def update_monitoring_config(self):
-        """更新监控配置"""
-        if self.monitoring_thread:
-            # 更新飞书通知器配置
-            self.feishu_notifier.webhook_url = self.config.get('feishu_webhook_url', '')
-            self.feishu_notifier.at_all = self.config.get('feishu_at_all', False)
-            
-            # 如果监控正在运行，重启以应用新配置
-            if self.is_monitoring_running:
-                self.stop_monitoring()
-                self.start_monitoring()
+    def _on_notification_config_changed(self, event):
+        """通知相关配置变化：只重建通知后端，不影响监控和定时任务"""
+        self.feishu_backend.reconfigure()
+        self.notification_dispatcher.set_backends(self._build_notification_backends())
+        log(f"通知配置已更新: {', '.join(sorted(event.changed_keys & set(self.NOTIFICATION_CONFIG_KEYS)))}")
+
+# ====================================================================
+# 辅助进程模块
+# ====================================================================
+class WorkerError(Exception):
+    """辅助进程不可用（未启动、崩溃、无响应），或任务在辅助进程中失败/超时"""
+
+class WorkerClient:
+    """辅助进程客户端 - 行情源测速、大目录删除、进程扫描等重任务交给常驻的辅助子进程执行，不与界面争用GIL
+
+    通过 stdin/stdout 的 JSON 行通信：请求 {"id", "job", "params"}（取消为 {"id", "type": "cancel"}），
+    辅助进程回传 progress / log / event / result / error 消息和定时心跳 heartbeat。
+    辅助进程退出或超过 heartbeat_timeout 无心跳视为崩溃或卡死：结束进程，等待中的调用以 WorkerError 失败
+    （调用方回退到本进程执行），按退避间隔自动重启。
+    """
+    
+    def __init__(self, command=None, heartbeat_timeout=Constants.WORKER_HEARTBEAT_TIMEOUT, on_crash=None):
+        self.command = command or self.default_command()
+        self.heartbeat_timeout = heartbeat_timeout
+        self.on_crash = on_crash  # 回调 (原因)
+        self.restarts = 0
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._proc = None
+        self._pending = {}  # 请求ID -> 等待中的请求
+        self._next_id = 0
+        self._last_heartbeat = 0.0
+        self._failures = 0  # 连续未能正常运行的次数，决定重启退避
+        self._restart_at = 0.0
+        self._running = False
+    
+    @staticmethod
+    def default_command():
+        """启动辅助进程的命令：与主程序相同的解释器和脚本（打包为exe时为exe本身），加 --worker"""
+        if getattr(sys, 'frozen', False):
+            return [sys.executable, '--worker']
+        return [sys.executable, os.path.abspath(__file__), '--worker']
+    
+    def start(self):
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            self._spawn_locked()
+        threading.Thread(target=self._supervise_loop, name="WorkerSupervisor", daemon=True).start()
+    
+    def stop(self):
+        """停止辅助进程（关闭 stdin 后辅助进程自行退出，超时则强制结束）"""
+        with self._lock:
+            self._running = False
+            proc, self._proc = self._proc, None
+        self._fail_pending("辅助进程已停止")
+        if proc:
+            try:
+                proc.stdin.close()
+                proc.wait(timeout=2)
+            except Exception:
+                proc.kill()
+    
+    @property
+    def available(self):
+        proc = self._proc
+        return proc is not None and proc.poll() is None
+    
+    def get_stats(self):
+        proc = self._proc
+        return {
+            'pid': proc.pid if proc else None,
+            'available': self.available,
+            'restarts': self.restarts,
+            'pending': len(self._pending),
+            'heartbeat_age': round(time.monotonic() - self._last_heartbeat, 1) if proc else None
+        }
+    
+    def call(self, job, params=None, progress=None, timeout=Constants.WORKER_CALL_TIMEOUT):
+        """在辅助进程中执行任务并等待结果（阻塞调用线程，不应在界面线程调用）
+        
+        Args:
+            job: 任务名（见 WORKER_JOBS）
+            params: 任务参数（可JSON序列化）
+            progress: 进度回调，参数为辅助进程回传的进度消息字典（在读取线程中调用）
+            timeout: 最长等待时间（秒），0 表示不限
+        Raises:
+            WorkerError: 辅助进程不可用、崩溃、超时或任务失败
+            OperationCancelled: 当前操作被取消（同时通知辅助进程取消该任务）
+        """
+        token = current_token()
+        with self._lock:
+            proc = self._proc
+            if proc is None or proc.poll() is not None:
+                raise WorkerError("辅助进程不可用")
+            self._next_id += 1
+            request_id = self._next_id
+            request = SimpleNamespace(done=threading.Event(), result=None, error=None, progress=progress)
+            self._pending[request_id] = request
+        try:
+            self._send(proc, {'id': request_id, 'job': job, 'params': params or {}})
+        except (OSError, ValueError) as e:
+            self._pending.pop(request_id, None)
+            raise WorkerError(f"发送任务失败: {e}")
+        
+        deadline = time.monotonic() + timeout if timeout else None
+        while not request.done.wait(Constants.CANCEL_CHECK_INTERVAL):
+            if token.cancelled or (deadline is not None and time.monotonic() >= deadline):
+                self._pending.pop(request_id, None)
+                try:
+                    self._send(proc, {'id': request_id, 'type': 'cancel'})
+                except (OSError, ValueError):
+                    pass
+                token.check()
+                raise WorkerError(f"任务 {job} 超过 {timeout}s 未完成")
+        if request.error is not None:
+            raise WorkerError(request.error)
+        return request.result
+    
+    def process_iter(self, attrs):
+        """在辅助进程中扫描进程，返回与 psutil.process_iter 用法相同的对象列表（带 pid 和 info）"""
+        infos = self.call('process_scan', {'attrs': list(attrs)}, timeout=Constants.WORKER_SCAN_TIMEOUT)
+        return [SimpleNamespace(pid=info.get('pid'), info=info) for info in infos]
+    
+    def _send(self, proc, message):
+        line = json.dumps(message, ensure_ascii=True)
+        with self._send_lock:
+            proc.stdin.write(line + "\n")
+            proc.stdin.flush()
+    
+    def _spawn_locked(self):
+        try:
+            proc = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE, encoding='utf-8', errors='replace', bufsize=1,
+                                    creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0))
+        except OSError as e:
+            log(f"✗ 辅助进程启动失败: {e}")
+            self._schedule_restart_locked()
+            return
+        self._proc = proc
+        self._last_heartbeat = time.monotonic()
+        threading.Thread(target=self._read_loop, args=(proc,), name="WorkerReader", daemon=True).start()
+        threading.Thread(target=self._stderr_loop, args=(proc,), name="WorkerStderr", daemon=True).start()
+        log(f"辅助进程已启动 (PID={proc.pid})")
+        log_event('worker.start', pid=proc.pid, restarts=self.restarts)
+    
+    def _schedule_restart_locked(self):
+        backoff = Constants.WORKER_RESTART_BACKOFF
+        self._restart_at = time.monotonic() + backoff[min(self._failures, len(backoff) - 1)]
+        self._failures += 1
+    
+    def _read_loop(self, proc):
+        for line in proc.stdout:
+            try:
+                message = json.loads(line)
+                kind = message.get('type')
+            except (ValueError, AttributeError):
+                log(f"辅助进程输出无法解析: {line.strip()[:200]}")
+                continue
+            if kind == 'heartbeat':
+                self._last_heartbeat = time.monotonic()
+                self._failures = 0
+            elif kind == 'log':
+                log(f"[辅助进程] {message.get('message')}")
+            elif kind == 'event':
+                log_event(message.get('event_type'), **message.get('fields', {}))
+            elif kind == 'progress':
+                request = self._pending.get(message.get('id'))
+                if request and request.progress:
+                    try:
+                        request.progress(message)
+                    except Exception as e:
+                        log(f"辅助进程进度回调失败: {e}")
+            elif kind in ('result', 'error'):
+                request = self._pending.pop(message.get('id'), None)
+                if request:
+                    request.result = message.get('result')
+                    request.error = message.get('error') if kind == 'error' else None
+                    request.done.set()
+    
+    def _stderr_loop(self, proc):
+        for line in proc.stderr:
+            if line.strip():
+                log(f"[辅助进程 stderr] {line.rstrip()}")
+    
+    def _supervise_loop(self):
+        while True:
+            time.sleep(Constants.WORKER_HEARTBEAT_INTERVAL)
+            reason = None
+            with self._lock:
+                if not self._running:
+                    return
+                proc = self._proc
+                now = time.monotonic()
+                if proc is None:
+                    if now >= self._restart_at:
+                        self.restarts += 1
+                        self._spawn_locked()
+                    continue
+                if proc.poll() is not None:
+                    reason = f"辅助进程已退出（返回码 {proc.returncode}）"
+                elif now - self._last_heartbeat > self.heartbeat_timeout:
+                    reason = f"辅助进程 {self.heartbeat_timeout:.0f}s 无心跳，判定为卡死"
+                    proc.kill()
+                if reason:
+                    self._proc = None
+                    self._schedule_restart_locked()
+                    delay = self._restart_at - now
+            if reason:
+                log(f"✗ {reason}，{delay:.0f}s 后重启")
+                log_event('worker.crash', pid=proc.pid, reason=reason, restart_in=round(delay, 1))
+                self._fail_pending(reason)
+                if self.on_crash:
+                    try:
+                        self.on_crash(reason)
+                    except Exception as e:
+                        log(f"辅助进程异常上报失败: {e}")
+    
+    def _fail_pending(self, reason):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for request in pending.values():
+            request.error = reason
+            request.done.set()
+
+class WorkerServerOptimizer(ServerOptimizer):
+    """在辅助进程中测速的行情源优选器；写回配置需要XML树，解析和写回仍在本进程（开销很小）"""
+    
+    def __init__(self, worker, qmt_dir_path, only_vip=True):
+        super().__init__(qmt_dir_path, only_vip)
+        self.worker = worker
+    
+    def probe_servers(self):
+        try:
+            result = self.worker.call('probe_servers', {'qmt_dir': self.qmt_dir_path, 'only_vip': self.only_vip})
+        except WorkerError as e:
+            log(f"辅助进程测速失败（{e}），改为本进程测速")
+            return super().probe_servers()
+        
+        best_hq, best_jy, config_path = result['best_hq'], result['best_jy'], result['config_path']
+        if config_path is None:
+            return None, None, None, None, None
+        try:
+            tree = ET.parse(config_path)
+        except Exception as e:
+            log(f"解析配置文件出错: {str(e)}")
+            return None, None, None, None, None
+        return best_hq, best_jy, tree, tree.find('QuoterServers'), config_path
+
+def _worker_probe_servers(params, progress):
+    optimizer = ServerOptimizer(params['qmt_dir'], params.get('only_vip', True))
+    best_hq, best_jy, _, _, config_path = optimizer.probe_servers()
+    return {'best_hq': best_hq, 'best_jy': best_jy, 'config_path': config_path}
+
+def _worker_delete_folders(params, progress):
+    data_manager = DataManager(params['base_path'], params['folder_names'])
+    deleted_folders, failed_folders = data_manager.delete_early_market_data(progress=progress)
+    return [deleted_folders, failed_folders]
+
+def _worker_purge_trash(params, progress):
+    DataManager(params['base_path'], '').purge_trash()
+    return True
+
+def _worker_process_scan(params, progress):
+    infos = []
+    for proc in psutil.process_iter(params.get('attrs') or ['pid', 'name', 'exe']):
+        try:
+            infos.append(proc.info)
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+    return infos
+
+# 辅助进程可执行的任务：任务名 -> 函数(params, progress)，返回值需可JSON序列化
+WORKER_JOBS = {
+    'probe_servers': _worker_probe_servers,
+    'delete_folders': _worker_delete_folders,
+    'purge_trash': _worker_purge_trash,
+    'process_scan': _worker_process_scan,
+}
+
+def run_worker():
+    """辅助进程入口（--worker）：逐行读取任务请求，每个任务在独立线程中执行，进度、日志、事件和结果写回 stdout
+
+    日志和事件转发给主进程统一写入；stdin 关闭（主进程退出）时辅助进程随之退出。
+    """
+    channel = sys.stdout
+    sys.stdout = sys.stderr  # 任务中意外的 print 不得混入通信通道
+    send_lock = threading.Lock()
+    tokens = {}
+    
+    def send(message):
+        line = json.dumps(message, ensure_ascii=True, default=str)
+        with send_lock:
+            channel.write(line + "\n")
+            channel.flush()
+    
+    def heartbeat():
+        while True:
+            send({'type': 'heartbeat', 'pid': os.getpid()})
+            time.sleep(Constants.WORKER_HEARTBEAT_INTERVAL)
+    
+    def run_job(request, token):
+        request_id = request.get('id')
+        try:
+            job = WORKER_JOBS[request['job']]
+            progress = lambda **fields: send(dict(fields, id=request_id, type='progress'))
+            send({'id': request_id, 'type': 'result',
+                  'result': run_with_token(token, job, request.get('params') or {}, progress)})
+        except Exception as e:
+            send({'id': request_id, 'type': 'error', 'error': f"{type(e).__name__}: {e}"})
+        finally:
+            tokens.pop(request_id, None)
+    
+    set_log_forwarder(send)
+    threading.Thread(target=heartbeat, name="WorkerHeartbeat", daemon=True).start()
+    for line in sys.stdin:
+        try:
+            request = json.loads(line)
+        except ValueError:
+            continue
+        if request.get('type') == 'cancel':
+            token = tokens.get(request.get('id'))
+            if token:
+                token.cancel("主进程取消")
+            continue
+        token = tokens[request.get('id')] = CancellationToken()
+        threading.Thread(target=run_job, args=(request, token), daemon=True).start()
+    return 0
+
+# ====================================================================
+# 守护监督模块
+# ====================================================================
+def supervised_launch_reason():
+    """由监督进程启动时返回本次启动原因（首次启动为 "start"），否则返回 None"""
+    return os.environ.get(Constants.SUPERVISED_ENV)
+
+def is_supervised_relaunch():
+    """是否由监督进程重新拉起（QMT、彩虹客户端和定时任务在此期间保持运行，不做启动时重启）"""
+    return supervised_launch_reason() not in (None, "start")
+
+def write_handoff(state):
+    """写入交接状态，供重新拉起的守护进程接续监控和通知限频"""
+    path = os.path.join(get_log_dir(), Constants.HANDOFF_FILENAME)
+    temp_path = path + ".tmp"
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(dict(state, written_at=time.time(), pid=os.getpid()), f, ensure_ascii=False)
+        os.replace(temp_path, path)
+        return True
+    except OSError as e:
+        log(f"写入交接状态失败: {e}")
+        return False
+
+def take_handoff():
+    """读取并删除交接状态；不存在、无法解析或超过 HANDOFF_MAX_AGE 时返回 None"""
+    path = os.path.join(get_log_dir(), Constants.HANDOFF_FILENAME)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        log(f"读取交接状态失败: {e}")
+        state = None
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+    if not isinstance(state, dict):
+        return None
+    age = time.time() - state.get('written_at', 0)
+    if not 0 <= age <= Constants.HANDOFF_MAX_AGE:
+        log(f"交接状态已过期（{age:.0f}秒前写入），不再恢复")
+        return None
+    state['age'] = age
+    return state
+
+class SupervisorLink(threading.Thread):
+    """守护进程一侧的监督通道 - 从 stdin 逐行读取监督进程的JSON消息
+
+    目前只有 {"type": "restart", "reason": ...}：守护进程在空闲时写入交接状态并以
+    GUARDIAN_RESTART_EXIT_CODE 退出。stdin 关闭（监督进程退出）时通道结束，守护进程继续运行。
+    """
+    
+    def __init__(self, on_restart, stream):
+        super().__init__(name="SupervisorLink", daemon=True)
+        self.on_restart = on_restart  # 回调 (原因)
+        self.stream = stream
+    
+    @classmethod
+    def attach(cls, on_restart):
+        """由监督进程启动时开始读取监督通道，否则返回 None"""
+        if supervised_launch_reason() is None or sys.stdin is None:
+            return None
+        link = cls(on_restart, sys.stdin)
+        link.start()
+        return link
+    
+    def run(self):
+        for line in self.stream:
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            if message.get('type') == 'restart':
+                log(f"监督进程请求重启守护进程: {message.get('reason')}")
+                self.on_restart(message.get('reason') or "监督进程请求")
+        log("监督通道已关闭，守护进程继续独立运行")
+
+class GuardianSupervisor:
+    """守护监督进程（--supervise）- 启动守护进程，在其退出、崩溃或超出资源预算时重新拉起
+
+    每 SUPERVISOR_CHECK_INTERVAL 秒检查一次守护进程的RSS、线程数和句柄数（非Windows为文件描述符数），
+    连续 SUPERVISOR_BUDGET_STRIKES 次超出预算时经 stdin 请求重启：守护进程等正在执行的操作结束后写入交接状态，
+    以 GUARDIAN_RESTART_EXIT_CODE 退出，监督进程立即重新拉起；SUPERVISOR_RESTART_GRACE 秒内未退出则强制结束。
+    异常退出按 SUPERVISOR_RESTART_BACKOFF 退避后重新拉起；退出码为0（用户关闭窗口）时监督随之结束。
+    预算取自配置文件（guardian_rss_limit_mb / guardian_thread_limit / guardian_handle_limit，0为不限制），修改后下次检查生效。
+    """
+    
+    def __init__(self, command, config_manager, interval=Constants.SUPERVISOR_CHECK_INTERVAL,
+                 strikes=Constants.SUPERVISOR_BUDGET_STRIKES, grace=Constants.SUPERVISOR_RESTART_GRACE):
+        self.command = command
+        self.config_manager = config_manager
+        self.interval = interval
+        self.strikes = strikes
+        self.grace = grace
+        self.launches = 0
+        self._proc = None
+        self._ps_proc = None
+        self._started_at = 0.0
+        self._over_budget_count = 0
+        self._restart_reason = None
+        self._restart_deadline = None
+        self._failures = 0
+    
+    @staticmethod
+    def default_command(argv):
+        """守护进程的启动命令：与监督进程相同的解释器和脚本（打包为exe时为exe本身），去掉 --supervise"""
+        args = [arg for arg in argv if arg != '--supervise']
+        if getattr(sys, 'frozen', False):
+            return [sys.executable] + args
+        return [sys.executable, os.path.abspath(__file__)] + args
+    
+    def run(self):
+        """监督主循环，守护进程正常退出时返回其退出码"""
+        self._launch("start")
+        try:
+            while True:
+                time.sleep(self.interval)
+                code = self._proc.poll()
+                if code is not None:
+                    if not self._handle_exit(code):
+                        return code
+                    continue
+                self._check()
+        except KeyboardInterrupt:
+            log("监督进程被中断，守护进程继续独立运行")
+            return 0
+    
+    def _launch(self, reason):
+        env = dict(os.environ)
+        env[Constants.SUPERVISED_ENV] = reason
+        self._proc = subprocess.Popen(self.command, stdin=subprocess.PIPE, env=env)
+        self._ps_proc = psutil.Process(self._proc.pid)
+        self._started_at = time.monotonic()
+        self._over_budget_count = 0
+        self._restart_reason = None
+        self._restart_deadline = None
+        self.launches += 1
+        log(f"[监督] 已启动守护进程 PID={self._proc.pid}（{reason}）")
+        log_event('supervisor.launch', pid=self._proc.pid, reason=reason, launches=self.launches)
+    
+    def _handle_exit(self, code):
+        """守护进程已退出：返回是否重新拉起"""
+        uptime = time.monotonic() - self._started_at
+        log_event('supervisor.exit', pid=self._proc.pid, exit_code=code, uptime=round(uptime, 1),
+                  requested=self._restart_reason)
+        if code == 0 and self._restart_reason is None:
+            log(f"[监督] 守护进程正常退出（运行 {uptime:.0f}秒），监督结束")
+            return False
+        
+        if code == Constants.GUARDIAN_RESTART_EXIT_CODE or self._restart_reason:
+            reason = self._restart_reason or "守护进程请求重启"
+            log(f"[监督] 守护进程已为重启退出（{reason}），立即重新拉起")
+            self._failures = 0
+        else:
+            if uptime >= Constants.SUPERVISOR_STABLE_SECONDS:
+                self._failures = 0
+            backoff = Constants.SUPERVISOR_RESTART_BACKOFF
+            delay = backoff[min(self._failures, len(backoff) - 1)]
+            self._failures += 1
+            reason = f"异常退出(退出码 {code})"
+            log(f"[监督] 守护进程{reason}，运行 {uptime:.0f}秒，{delay}秒后重新拉起")
+            time.sleep(delay)
+        self._launch(reason)
+        return True
+    
+    def sample(self):
+        """守护进程当前的RSS（MB）、线程数和句柄数"""
+        with self._ps_proc.oneshot():
+            handles = self._ps_proc.num_handles() if hasattr(self._ps_proc, 'num_handles') else self._ps_proc.num_fds()
+            return {
+                'rss_mb': round(self._ps_proc.memory_info().rss / 1024 / 1024, 1),
+                'threads': self._ps_proc.num_threads(),
+                'handles': handles
+            }
+    
+    def over_budget(self, usage):
+        """返回超出预算的描述列表，未超出返回空列表"""
+        self.config_manager.reload_if_changed()
+        snapshot = self.config_manager.snapshot
+        exceeded = []
+        if snapshot.guardian_rss_limit_mb and usage['rss_mb'] > snapshot.guardian_rss_limit_mb:
+            exceeded.append(f"内存 {usage['rss_mb']:.0f}MB > {snapshot.guardian_rss_limit_mb}MB")
+        if snapshot.guardian_thread_limit and usage['threads'] > snapshot.guardian_thread_limit:
+            exceeded.append(f"线程 {usage['threads']} > {snapshot.guardian_thread_limit}")
+        if snapshot.guardian_handle_limit and usage['handles'] > snapshot.guardian_handle_limit:
+            exceeded.append(f"句柄 {usage['handles']} > {snapshot.guardian_handle_limit}")
+        return exceeded
+    
+    def _check(self):
+        if self._restart_deadline is not None:
+            if time.monotonic() >= self._restart_deadline:
+                log(f"[监督] 守护进程 {self.grace}秒内未退出，强制结束")
+                self._kill()
+            return
+        
+        try:
+            usage = self.sample()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return
+        exceeded = self.over_budget(usage)
+        self._over_budget_count = self._over_budget_count + 1 if exceeded else 0
+        if self._over_budget_count >= self.strikes:
+            self.request_restart("超出预算: " + "，".join(exceeded), usage)
+    
+    def request_restart(self, reason, usage=None):
+        """经 stdin 请求守护进程保存交接状态后退出，超过宽限时间未退出则强制结束"""
+        self._restart_reason = reason
+        self._restart_deadline = time.monotonic() + self.grace
+        log(f"[监督] 请求守护进程重启: {reason}")
+        log_event('supervisor.restart_request', pid=self._proc.pid, reason=reason, **(usage or {}))
+        try:
+            self._proc.stdin.write((json.dumps({'type': 'restart', 'reason': reason}) + "\n").encode('utf-8'))
+            self._proc.stdin.flush()
+        except OSError:
+            self._kill()
+    
+    def _kill(self):
+        """结束守护进程及其子进程（辅助进程）"""
+        try:
+            children = self._ps_proc.children(recursive=True)
+        except psutil.Error:
+            children = []
+        for proc in [self._ps_proc] + children:
+            try:
+                proc.kill()
+            except psutil.Error:
+                pass
+        try:
+            self._proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            log(f"[监督] 守护进程 PID={self._proc.pid} 未能结束")
+
+def run_supervisor(argv):
+    """监督进程入口（--supervise）"""
+    # 守护进程独占 guardian.log 和 events-*.jsonl（滚动、事件索引都假定只有一个写入方）
+    set_log_files(Constants.SUPERVISOR_LOG_FILENAME, Constants.SUPERVISOR_EVENT_LOG_PREFIX)
+    log("="*60)
+    log("∞MeowTech.实盘无限守护 - 监督进程")
+    log("="*60)
+    supervisor = GuardianSupervisor(GuardianSupervisor.default_command(argv), ConfigManager())
+    return supervisor.run()
+
+# ====================================================================
+# 模拟运行模块
+# ====================================================================
+class SimulatedClock(Clock):
+    """虚拟时钟 - 离散事件推进，虚拟时间只在 run_until 中跳到最近的等待截止时间
+
+    通过本时钟等待的线程登记虚拟截止时间。驱动线程等所有被唤醒或新提交的工作都重新进入等待（或结束）后，
+    才把时间跳到下一个截止时间并唤醒到期的等待者，一整天的调度、监控和通知在几秒内按正确的先后顺序回放。
+    在时钟之外阻塞的线程（锁、队列）不被跟踪，需通过 tracked / notify 让时钟知道工作尚未完成。
+    """
+
+    def __init__(self, start):
+        self._start = start
+        self._elapsed = 0.0
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._waiters = {}     # 线程 -> (虚拟截止时间或None, Condition)
+        self._running = set()  # 被唤醒或正在执行 tracked 任务、尚未重新进入等待的线程
+        self._queued = 0       # 已提交到线程池、尚未开始执行的 tracked 任务数
+
+    def now(self):
+        return self._start + timedelta(seconds=self._elapsed)
+
+    def monotonic(self):
+        return self._elapsed
+
+    def sleep(self, seconds):
+        cond = threading.Condition()
+        end = self._elapsed + max(seconds, 0)
+        with cond:
+            while self._elapsed < end:
+                self.wait(cond, end - self._elapsed)
+
+    def wait(self, cond, timeout=None):
+        me = threading.current_thread()
+        deadline = None if timeout is None else self._elapsed + max(timeout, 0)
+        with self._lock:
+            self._waiters[me] = (deadline, cond)
+            self._running.discard(me)
+            self._idle.notify_all()
+        notified = False
+        try:
+            while not notified:
+                notified = cond.wait(Constants.SIMULATION_POLL_INTERVAL)
+                with self._lock:
+                    if me not in self._waiters:
+                        break  # 已被驱动线程按截止时间唤醒
+        finally:
+            with self._lock:
+                self._waiters.pop(me, None)
+                self._running.add(me)
+        return notified
+
+    def notify(self, cond):
+        with self._lock:
+            for thread, (_, waiting_on) in list(self._waiters.items()):
+                if waiting_on is cond:
+                    del self._waiters[thread]
+                    self._running.add(thread)
+        cond.notify_all()
+
+    def tracked(self, func):
+        with self._lock:
+            self._queued += 1
+
+        @wraps(func)
+        def run(*args, **kwargs):
+            me = threading.current_thread()
+            with self._lock:
+                self._queued -= 1
+                self._running.add(me)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._running.discard(me)
+                    self._idle.notify_all()
+        return run
+
+    def start_thread(self, thread):
+        with self._lock:
+            self._running.add(thread)
+        thread.start()
+        return thread
+
+    def call_later(self, delay, func):
+        timer = SimulatedTimer()
+
+        def fire():
+            self.sleep(delay)
+            if not timer.cancelled:
+                func()
+        self.spawn(fire)
+        return timer
+
+    def run_until(self, end):
+        """推进虚拟时间到 end（datetime），依次唤醒期间到期的等待者"""
+        end_elapsed = (end - self._start).total_seconds()
+        while True:
+            self._settle()
+            with self._lock:
+                target = min((deadline for deadline, _ in self._waiters.values() if deadline is not None),
+                             default=end_elapsed)
+                self._elapsed = max(self._elapsed, min(target, end_elapsed))
+                due = [(thread, cond) for thread, (deadline, cond) in self._waiters.items()
+                       if deadline is not None and deadline <= self._elapsed]
+                for thread, _ in due:
+                    del self._waiters[thread]
+                    self._running.add(thread)
+            if not due and self._elapsed >= end_elapsed:
+                return
+            for _, cond in due:
+                with cond:
+                    cond.notify_all()
+
+    def _settle(self):
+        """等待所有被唤醒的线程和提交的任务重新进入等待或结束"""
+        deadline = time.monotonic() + Constants.SIMULATION_SETTLE_TIMEOUT
+        with self._idle:
+            while True:
+                self._running = {thread for thread in self._running if thread.ident is None or thread.is_alive()}
+                if not self._running and not self._queued:
+                    return
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    names = ", ".join(sorted(thread.name for thread in self._running)) or f"{self._queued} 个排队任务"
+                    log(f"⚠ 模拟时钟: {names} 在 {Constants.SIMULATION_SETTLE_TIMEOUT}s 内未进入等待，继续推进虚拟时间")
+                    self._running.clear()
+                    self._queued = 0
+                    return
+                self._idle.wait(min(remaining, 0.05))
+
+class SimulatedTimer:
+    """SimulatedClock.call_later 返回的定时器"""
+
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+class SimulationEnvironment:
+    """模拟运行环境 - 虚拟进程表、服务器延迟、关机命令和场景事件，记录按虚拟时间排序的时间线"""
+
+    HQ_SERVER = {'ip': "10.0.0.1", 'port': 55300, 'servername': "模拟行情主站", 'type': '0'}
+    JY_SERVER = {'ip': "10.0.0.2", 'port': 55301, 'servername': "模拟交易主站", 'type': '1'}
+
+    def __init__(self, clock, qmt_dir, rainbow_exe_path, step_seconds=None):
+        self.clock = clock
+        self.step_seconds = dict(Constants.SIMULATION_STEP_SECONDS, **(step_seconds or {}))
+        self.latency = dict(Constants.SIMULATION_LATENCY_MS)
+        self.timeline = []
+        self.notifications = []
+        self.job_fires = []
+        self.process_ops = []   # (操作, 进程名, 开始, 结束, 是否成功)
+        self.qmt_downtime = []  # (开始, 结束)
+        self.schedule_manager = None
+        self._lock = threading.Lock()
+        self._processes = {}
+        self._next_pid = 1000
+        self._fail_next_start = set()
+        self._qmt_down_since = None
+        self.process_manager = SimulatedProcessManager(self)
+        self.launch(os.path.join(qmt_dir, 'bin.x64', Constants.QMT_CLIENT_PROCESS_NAME), announce=False)
+        self.launch(rainbow_exe_path, announce=False)
+
+    def record(self, category, text):
+        with self._lock:
+            self.timeline.append((self.clock.now(), category, text))
+
+    # 进程表
+    def process_iter(self, attrs=None):
+        with self._lock:
+            return [SimpleNamespace(pid=info['pid'], info=dict(info)) for info in self._processes.values()]
+
+    def launch(self, exe_path, announce=True):
+        """启动进程：QMT客户端启动器拉起 XtMiniQmt.exe"""
+        name = os.path.basename(exe_path)
+        if name == Constants.QMT_CLIENT_PROCESS_NAME:
+            name, exe_path = Constants.QMT_PROCESS_NAME, os.path.join(os.path.dirname(exe_path), Constants.QMT_PROCESS_NAME)
+        with self._lock:
+            pid = self._next_pid
+            self._next_pid += 4
+            self._processes[pid] = {'pid': pid, 'name': name, 'exe': exe_path}
+        if announce:
+            self.record("进程", f"{name} 已启动 (PID={pid})")
+        self._update_qmt_state()
+        return pid
+
+    def kill(self, process_name, reason="关闭"):
+        with self._lock:
+            pids = [pid for pid, info in self._processes.items() if info['name'] == process_name]
+            for pid in pids:
+                del self._processes[pid]
+        if pids:
+            self.record("进程", f"{process_name} 已{reason} (PID={', '.join(map(str, pids))})")
+        self._update_qmt_state()
+        return len(pids)
+
+    def take_start_failure(self, name):
+        with self._lock:
+            if name in self._fail_next_start:
+                self._fail_next_start.discard(name)
+                return True
+            return False
+
+    def _update_qmt_state(self):
+        now = self.clock.now()
+        with self._lock:
+            running = any(info['name'] == Constants.QMT_PROCESS_NAME for info in self._processes.values())
+            if not running and self._qmt_down_since is None:
+                self._qmt_down_since = now
+            elif running and self._qmt_down_since is not None:
+                self.qmt_downtime.append((self._qmt_down_since, now))
+                self._qmt_down_since = None
+
+    # 网络
+    def server_config(self):
+        return {'hq_server': dict(self.HQ_SERVER), 'jy_server': dict(self.JY_SERVER)}
+
+    def measure_latency(self, ip, port, timeout=Constants.NETWORK_TEST_TIMEOUT):
+        return self.latency['hq' if ip == self.HQ_SERVER['ip'] else 'jy']
+
+    def server_optimizer(self):
+        return SimulatedServerOptimizer(self)
+
+    def shutdown_system(self):
+        self.record("系统", "执行关机命令（模拟，未实际关机）")
+
+    # 调度
+    def on_job_fire(self, job, slot, lateness):
+        self.job_fires.append((job.name, slot, lateness))
+        self.record("调度", f"触发 {job.name} (计划 {slot.strftime('%H:%M:%S')}，延迟 {lateness * 1000:.1f} ms)")
+
+    # 场景
+    def run_scenario(self, events, start):
+        """按虚拟时间依次执行场景事件（在 clock.spawn 的线程中运行）"""
+        day = start.date()
+        for event in sorted(events, key=lambda item: item['at']):
+            at = datetime.combine(day, parse_time_of_day(event['at']))
+            if at < start:
+                at += timedelta(days=1)
+            self.clock.sleep((at - self.clock.now()).total_seconds())
+            try:
+                self.apply(event)
+            except Exception as e:
+                self.record("场景", f"事件执行失败 {event}: {e}")
+
+    def apply(self, event):
+        action = event['action']
+        if action == "crash":
+            self.kill(event['process'], reason="崩溃退出")
+        elif action == "fail_start":
+            with self._lock:
+                self._fail_next_start.add(event['process'])
+            self.record("场景", f"{event['process']} 下次启动将失败")
+        elif action == "latency":
+            self.latency[event['target']] = float(event['ms'])
+            self.record("场景", f"{'行情' if event['target'] == 'hq' else '交易'}服务器延迟变为 {event['ms']}ms")
+        elif action == "outage":
+            saved = dict(self.latency)
+            self.latency.update(hq=float('inf'), jy=float('inf'))
+            self.record("场景", f"网络中断 {event['seconds']}s")
+
+            def restore():
+                self.latency.update(saved)
+                self.record("场景", "网络恢复")
+            self.clock.call_later(event['seconds'], restore)
+        elif action == "slow_start":
+            self.step_seconds['start'] = float(event['seconds'])
+            self.record("场景", f"进程启动耗时变为 {event['seconds']}s")
+        elif action in ("restart_qmt", "restart_rainbow"):
+            self.record("场景", f"手动{'重启QMT' if action == 'restart_qmt' else '重启彩虹客户端'}")
+            manager = self.schedule_manager
+            manager.restart_qmt_service() if action == "restart_qmt" else manager.restart_rainbow_service()
+        else:
+            raise ValueError(f"未知的场景动作: {action}")
+
+class SimulatedProcessManager:
+    """虚拟进程管理器 - 与 ProcessManager 接口一致，关闭和启动按虚拟时间耗时"""
+
+    def __init__(self, environment):
+        self.environment = environment
+
+    def terminate_processes_by_name(self, process_name, target_path=None, graceful_timeout=Constants.GRACEFUL_SHUTDOWN_TIMEOUT):
+        env = self.environment
+        start = env.clock.now()
+        env.clock.sleep(env.step_seconds['stop'])
+        count = env.kill(process_name)
+        env.process_ops.append(("关闭", process_name, start, env.clock.now(), True))
+        return count, 0
+
+    def start_process(self, exe_path, wait_for_start=True, start_timeout=Constants.PROCESS_START_TIMEOUT):
+        env = self.environment
+        name = os.path.basename(exe_path)
+        start = env.clock.now()
+        if env.take_start_failure(name):
+            env.clock.sleep(start_timeout)
+            env.process_ops.append(("启动", name, start, env.clock.now(), False))
+            env.record("进程", f"{name} 启动超时")
+            return False, f"进程启动超时（{start_timeout}秒）"
+        env.clock.sleep(env.step_seconds['start'])
+        pid = env.launch(exe_path)
+        env.process_ops.append(("启动", name, start, env.clock.now(), True))
+        return True, pid
+
+class SimulatedServerOptimizer:
+    """虚拟行情源优选器 - 测速耗时按虚拟时间计算，结果取环境中的当前延迟"""
+
+    def __init__(self, environment):
+        self.environment = environment
+
+    def probe_servers(self):
+        env = self.environment
+        env.clock.sleep(env.step_seconds['probe'])
+        best_hq = dict(env.HQ_SERVER, median_value=env.latency['hq'])
+        best_jy = dict(env.JY_SERVER, median_value=env.latency['jy'])
+        if math.isinf(best_hq['median_value']) or math.isinf(best_jy['median_value']):
+            env.record("网络", "行情源测速失败：服务器无响应")
+            return None, None, None, None, None
+        env.record("网络", f"行情源测速完成: 行情 {best_hq['median_value']:.0f}ms，交易 {best_jy['median_value']:.0f}ms")
+        return best_hq, best_jy, None, None, None
+
+    def update_qmt_config(self, best_hq, best_jy, tree, quoter_server_map, config_path):
+        return True
+
+class SimulatedFeishuNotifier(FeishuNotifier):
+    """记录而不发送的飞书通知器 - 时间段判断、限流和聚合沿用真实逻辑"""
+
+    def __init__(self, environment):
+        super().__init__("simulation://feishu", clock=environment.clock)
+        self.environment = environment
+
+    def _deliver(self, title, content, msg_type, timestamp):
+        self.environment.notifications.append((self.clock.now(), msg_type, title))
+        first_line = content.splitlines()[0] if content else ""
+        self.environment.record("通知", f"[{msg_type}] {title}：{first_line}")
+        return self.DELIVERED
+
+def _prepare_simulation_dir(real_log_dir, sim_dir):
+    """把实盘配置复制到模拟目录，并改写会产生外部副作用的配置项"""
+    config = dict(ConfigManager.DEFAULT_CONFIG)
+    try:
+        with open(os.path.join(real_log_dir, Constants.CONFIG_FILENAME), 'r', encoding='utf-8') as f:
+            config.update(json.load(f))
+    except (OSError, ValueError):
+        pass
+
+    data_dir = os.path.join(sim_dir, "data")
+    for folder in config.get('delete_folders', '').split(','):
+        if folder.strip():
+            os.makedirs(os.path.join(data_dir, folder.strip()), exist_ok=True)
+    config.update(
+        delete_base_path=data_dir,
+        trading_calendar_path=config.get('trading_calendar_path') or os.path.join(
+            real_log_dir, Constants.TRADING_CALENDAR_FILENAME),
+        feishu_webhook_url="simulation://feishu",
+        enable_feishu_notification=True,
+        notify_webhook_urls="", notify_file_path="", notify_socket_address=""
+    )
+    with open(os.path.join(sim_dir, Constants.CONFIG_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+
+    # 沿用实盘积累的执行历史，盘前流程按同样的p95耗时倒推开始时间
+    history = os.path.join(real_log_dir, Constants.EXECUTION_HISTORY_FILENAME)
+    if os.path.exists(history):
+        shutil.copy2(history, os.path.join(sim_dir, Constants.EXECUTION_HISTORY_FILENAME))
+
+def _format_duration(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}小时{minutes:02d}分"
+    return f"{minutes}分{seconds:02d}秒" if minutes else f"{seconds}秒"
+
+def print_simulation_report(env, schedule_manager, notifier, start, end, real_elapsed):
+    """输出时间线和时间统计"""
+    print("=" * 60)
+    print(f"模拟时间线 {start:%Y-%m-%d %H:%M:%S} ~ {end:%Y-%m-%d %H:%M:%S}")
+    print("=" * 60)
+    for stamp, category, text in sorted(env.timeline, key=lambda item: item[0]):
+        print(f"{stamp:%H:%M:%S}  [{category}] {text}" if stamp.date() == start.date()
+              else f"{stamp:%m-%d %H:%M:%S}  [{category}] {text}")
+
+    print("=" * 60)
+    print("时间统计")
+    print("=" * 60)
+    simulated = (end - start).total_seconds()
+    print(f"模拟 {simulated / 3600:.1f} 小时，实际耗时 {real_elapsed:.2f}s（加速 {simulated / max(real_elapsed, 1e-6):.0f} 倍）")
+
+    print("定时任务触发延迟:")
+    fires = {}
+    for name, slot, lateness in env.job_fires:
+        fires.setdefault(name, []).append(lateness)
+    if not fires:
+        print("  （模拟区间内没有任务触发）")
+    for name, samples in fires.items():
+        print(f"  {name}: {len(samples)} 次，最大 {max(samples) * 1000:.1f} ms，平均 {statistics.mean(samples) * 1000:.1f} ms")
+
+    print("进程操作耗时:")
+    if not env.process_ops:
+        print("  （无）")
+    for action, name, op_start, op_end, success in env.process_ops:
+        print(f"  {op_start:%H:%M:%S} {action} {name}: {(op_end - op_start).total_seconds():.0f}s"
+              f"{'' if success else '（失败）'}")
+
+    downtime = list(env.qmt_downtime)
+    if env._qmt_down_since is not None:
+        downtime.append((env._qmt_down_since, end))
+    total_down = sum((down_end - down_start).total_seconds() for down_start, down_end in downtime)
+    print(f"QMT不可用: {len(downtime)} 次，共 {_format_duration(total_down)}"
+          + (f"，最长 {_format_duration(max((e - s).total_seconds() for s, e in downtime))}" if downtime else ""))
+    for down_start, down_end in downtime:
+        print(f"  {down_start:%H:%M:%S} ~ {down_end:%H:%M:%S} ({_format_duration((down_end - down_start).total_seconds())})")
+
+    stats = notifier.get_stats()
+    by_type = {}
+    for _, msg_type, _ in env.notifications:
+        by_type[msg_type] = by_type.get(msg_type, 0) + 1
+    print(f"通知: 发出 {len(env.notifications)} 条 {by_type or ''}，去重丢弃 {stats['suppressed']}，"
+          f"限频推迟 {stats['deferred']}")
+
+def run_simulation(argv):
+    """模拟运行：虚拟时钟 + 虚拟进程/网络，几秒内回放一整天的定时任务、监控和通知，输出时间线和时间统计"""
+    parser = argparse.ArgumentParser(prog="QMT实盘无限守护.py --simulate",
+                                     description="用虚拟时钟回放一整天的定时任务、监控和通知（不操作真实进程、不发送通知）")
+    parser.add_argument('--simulate', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--date', type=lambda text: datetime.strptime(text, "%Y-%m-%d").date(),
+                        default=date_cls.today(), help="模拟日期 YYYY-MM-DD（默认今天）")
+    parser.add_argument('--start', default="00:00:00", help="开始时刻 HH:MM:SS（默认 00:00:00）")
+    parser.add_argument('--hours', type=float, default=24, help="模拟时长（小时，默认24）")
+    parser.add_argument('--scenario', help="场景文件（JSON数组，元素如 {\"at\": \"10:15:00\", \"action\": \"crash\", "
+                                           "\"process\": \"XtMiniQmt.exe\"}），默认使用内置场景")
+    parser.add_argument('--dir', help="模拟运行目录（默认 logs/simulation-时间戳）")
+    args = parser.parse_args(argv)
+
+    scenario = Constants.SIMULATION_DEFAULT_SCENARIO
+    if args.scenario:
+        with open(args.scenario, 'r', encoding='utf-8') as f:
+            scenario = json.load(f)
+
+    real_log_dir = get_log_dir()
+    sim_dir = args.dir or os.path.join(real_log_dir, Constants.SIMULATION_DIR_PREFIX + time.strftime('%Y%m%d-%H%M%S'))
+    os.makedirs(sim_dir, exist_ok=True)
+    start = datetime.combine(args.date, parse_time_of_day(args.start))
+    end = start + timedelta(hours=args.hours)
+    _prepare_simulation_dir(real_log_dir, sim_dir)
+    set_log_dir(sim_dir, console=False)
+
+    clock = SimulatedClock(start)
+    config_manager = ConfigManager()
+    env = SimulationEnvironment(clock, config_manager.get('qmt_dir'), config_manager.get('rainbow_exe_path'))
+    notifier = SimulatedFeishuNotifier(env)
+    dispatcher = NotificationDispatcher([FeishuBackend(notifier, config_manager)], clock=clock)
+    schedule_manager = ScheduleManager(config_manager, lambda message: env.record("任务", message),
+                                       notifier=dispatcher, clock=clock, environment=env)
+    schedule_manager.scheduler.on_fire = env.on_job_fire
+    env.schedule_manager = schedule_manager
+    monitor = MonitoringThread(config_manager, dispatcher, lambda message: env.record("监控", message),
+                               clock=clock, environment=env)
+
+    log(f"模拟运行开始: {start:%Y-%m-%d %H:%M:%S} ~ {end:%Y-%m-%d %H:%M:%S}，目录 {sim_dir}")
+    real_start = time.perf_counter()
+    schedule_manager.start_schedule()
+    monitor.start_monitoring()
+    clock.spawn(lambda: env.run_scenario(scenario, start))
+    clock.run_until(end)
+    real_elapsed = time.perf_counter() - real_start
+
+    monitor.stop_monitoring()
+    schedule_manager.stop_schedule()
+    dispatcher.close()
+    print_simulation_report(env, schedule_manager, notifier, start, end, real_elapsed)
+    print(f"模拟运行目录（配置、日志、事件）: {sim_dir}")
+    _get_log_writer().flush()
+    return 0
 
 # ====================================================================
 # UI样式表
@@ -1749,13 +6613,17 @@ class MainWindow(QMainWindow):
     """主窗口界面"""
     status_update_signal = Signal(str)
     server_update_signal = Signal(str, str)
+    restart_requested = Signal(str)
 
     def __init__(self):
         super().__init__()
         
         self.config_manager = ConfigManager()
-        self.memory_manager = MemoryManager()
-        self.async_manager = AsyncOperationManager(max_workers=4)
+        self.memory_governor = MemoryGovernor(self.config_manager)
+        self.async_manager = AsyncOperationManager()
+        self.worker = WorkerClient(on_crash=lambda reason: self.update_status_bar(f"⚠ {reason}，正在重启辅助进程"))
+        self.worker.start()
+        self._status_message = None  # 状态栏当前文本，相同消息不重复刷新
         
         self.init_ui()
         self.connect_signals()
@@ -1764,11 +6632,22 @@ class MainWindow(QMainWindow):
         self.core_logic = CoreLogic(
             self.config_manager,
             self.update_status_bar,
-            self.update_server_info
+            self.update_server_info,
+            handoff=take_handoff() if is_supervised_relaunch() else None
         )
         
-        self.core_logic.memory_manager = self.memory_manager
         self.core_logic.async_manager = self.async_manager
+        # 重启、数据清理、盘前流程等操作经异步管理器执行，受截止时间和看门狗约束
+        self.core_logic.schedule_manager.async_manager = self.async_manager
+        self.async_manager.on_stuck = self.core_logic.report_stuck_operation
+        # 测速、数据删除和进程扫描在辅助进程执行，界面进程只负责显示
+        self.core_logic.attach_worker(self.worker)
+        # 内存采样和预算检查在后台线程执行，界面定时器只读取缓存的指标
+        self.memory_governor.on_alarm = self.core_logic.report_memory_alarm
+        self.memory_governor.start()
+        # 由监督进程（--supervise）启动时，接收其重启请求
+        self.restart_requested.connect(self.restart_for_supervisor)
+        self.supervisor_link = SupervisorLink.attach(self.restart_requested.emit)
         
         self.load_initial_state()
 
@@ -1831,8 +6710,11 @@ class MainWindow(QMainWindow):
         # 5. 恢复定时任务状态
         self.restore_schedule_state()
         
-        # 6. 启动时自动重启QMT和彩虹客户端
-        self.perform_startup_restart()
+        # 6. 启动时自动重启QMT和彩虹客户端（由监督进程重新拉起时QMT和彩虹客户端仍在运行，不重启）
+        if is_supervised_relaunch():
+            log(f"由监督进程重新拉起（{supervised_launch_reason()}），跳过启动时重启")
+        else:
+            self.perform_startup_restart()
     
     def restore_schedule_state(self):
         """恢复定时任务状态"""
@@ -1950,6 +6832,12 @@ class MainWindow(QMainWindow):
         status_layout.addWidget(self.network_status_label)
         status_layout.addWidget(qmt_label)
         status_layout.addWidget(self.qmt_process_label)
+        self.memory_label = QLabel("待检测")
+        self.memory_label.setAlignment(Qt.AlignLeft)
+        memory_label = QLabel("  守护进程内存:")
+        memory_label.setAlignment(Qt.AlignLeft)
+        status_layout.addWidget(memory_label)
+        status_layout.addWidget(self.memory_label)
         status_layout.addStretch()
         status_widget = QWidget()
         status_widget.setLayout(status_layout)
@@ -2014,6 +6902,11 @@ class MainWindow(QMainWindow):
         shutdown_system_btn.clicked.connect(lambda: Worker(self.core_logic.shutdown_system_now).start())
         system_layout.addWidget(shutdown_system_btn)
 
+        memory_btn = QPushButton("内存增长分析")
+        memory_btn.setToolTip("首次点击开始记录内存分配，之后每次点击在日志中列出相对首次点击时增长最多的代码位置")
+        memory_btn.clicked.connect(self.analyze_memory_growth)
+        system_layout.addWidget(memory_btn)
+
         system_group.setLayout(system_layout)
         return system_group
     
@@ -2306,7 +7199,7 @@ class MainWindow(QMainWindow):
         
         self.config_manager.update(config_updates)
         
-        if self.config_manager.save_config():
+        if self.config_manager.save_config(wait=True):
             self.update_status_bar("配置已保存！")
             
             # 自动测试飞书通知
@@ -2321,14 +7214,15 @@ class MainWindow(QMainWindow):
                     success = test_notifier.send_message(
                         title="🧪 配置保存测试通知",
                         content="配置已成功保存，这是一条来自∞MeowTech.实盘无限守护的测试通知",
-                        msg_type="info"
+                        msg_type="info",
+                        wait=False
                     )
                     
                     if success:
                         QMessageBox.information(self, "成功", "配置已成功保存！\n飞书通知测试成功！")
                         self.update_status_bar("配置已保存，飞书通知测试成功")
                     else:
-                        QMessageBox.warning(self, "部分成功", "配置已成功保存！\n但飞书通知测试失败，请检查Webhook URL")
+                        QMessageBox.warning(self, "部分成功", "配置已成功保存！\n但飞书通知测试失败（Webhook URL无效或被限流），详见日志")
                         self.update_status_bar("配置已保存，飞书通知测试失败")
                         
                 except Exception as e:
@@ -2339,26 +7233,35 @@ class MainWindow(QMainWindow):
         else:
             QMessageBox.warning(self, "错误", "配置保存失败！")
         
-        if self.core_logic.is_schedule_running:
-            self.core_logic.stop_schedule()
-            self.core_logic.start_schedule()
-        
-        self.core_logic.update_monitoring_config()
-        
+        # 定时任务、监控和通知后端已通过配置订阅按变化项各自更新
         self.update_button_states()
     
+    def restart_for_supervisor(self, reason):
+        """监督进程请求重启：等正在执行的操作结束后写入交接状态，以 GUARDIAN_RESTART_EXIT_CODE 退出"""
+        running = self.async_manager.running_operations()
+        if running:
+            log(f"等待操作完成后重启: {', '.join(running)}")
+            QTimer.singleShot(1000, lambda: self.restart_for_supervisor(reason))
+            return
+        self.core_logic.export_handoff(reason)
+        self.close()
+        QApplication.instance().exit(Constants.GUARDIAN_RESTART_EXIT_CODE)
+    
     def closeEvent(self, event):
         """关闭窗口前保存配置并清理资源"""
         try:
-            self.config_manager.save_config()
+            self.config_manager.save_config(wait=True)
+            
+            # 关闭通知后端（发出聚合缓冲中尚未发送的通知）
+            self.core_logic.notification_dispatcher.close()
+            self.core_logic.notification_outbox.close()
             
             if hasattr(self, 'async_manager'):
                 self.async_manager.shutdown()
+            self.worker.stop()
+            self.memory_governor.stop()
                 
-            # 强制清理内存
-            if hasattr(self, 'memory_manager'):
-                self.memory_manager.force_cleanup()
-                
+            log_event('guardian.stop', pid=os.getpid())
             log("程序资源清理完成")
         except Exception as e:
             log(f"资源清理时发生错误: {e}")
@@ -2384,24 +7287,26 @@ class MainWindow(QMainWindow):
 
     
     def update_next_run_time(self):
-        """更新下次运行时间显示并监控内存使用情况"""
-        if hasattr(self, 'memory_manager'):
-            self.memory_manager.cleanup_if_needed()
-            
+        """更新下次运行时间显示"""
         if self.core_logic.is_schedule_running:
-            next_run = schedule.next_run()
+            next_run = self.core_logic.next_schedule_run()
             if next_run:
                 restart_tasks = []
                 shutdown_tasks = []
                 system_tasks = []
                 
-                qmt_time = self.config_manager.get('qmt_run_time')
-                if qmt_time:
-                    restart_tasks.append(f"QMT重启: {qmt_time}")
-                
-                rainbow_time = self.config_manager.get('rainbow_restart_time')
-                if rainbow_time:
-                    restart_tasks.append(f"彩虹重启: {rainbow_time}")
+                preopen_time = self.config_manager.get('preopen_routine_time')
+                restart_operations = ("盘前流程",) if preopen_time else ("重启QMT", "重启彩虹客户端")
+                if preopen_time:
+                    restart_tasks.append(f"盘前流程: {preopen_time}")
+                else:
+                    qmt_time = self.config_manager.get('qmt_run_time')
+                    if qmt_time:
+                        restart_tasks.append(f"QMT重启: {qmt_time}")
+                    
+                    rainbow_time = self.config_manager.get('rainbow_restart_time')
+                    if rainbow_time:
+                        restart_tasks.append(f"彩虹重启: {rainbow_time}")
                 
                 qmt_shutdown_time = self.config_manager.get('qmt_shutdown_time')
                 if qmt_shutdown_time:
@@ -2423,6 +7328,19 @@ class MainWindow(QMainWindow):
                 if system_tasks:
                     status_lines.append("系统任务: " + " / ".join(system_tasks))
                 
+                durations = []
+                for operation in restart_operations:
+                    stats = self.core_logic.get_execution_stats(operation)
+                    if stats:
+                        text = f"{operation} {stats['last_duration']:.0f}s"
+                        if stats['last_outcome'] != ExecutionHistory.SUCCESS:
+                            text += "(失败)"
+                        if stats['p95'] is not None:
+                            text += f"，p95 {stats['p95']:.0f}s"
+                        durations.append(text)
+                if durations:
+                    status_lines.append("上次耗时: " + " / ".join(durations))
+                
                 if len(status_lines) > 1:
                     status = "\n".join(status_lines)
                 else:
@@ -2440,8 +7358,9 @@ class MainWindow(QMainWindow):
         """线程安全地更新状态栏文本"""
         if threading.current_thread() is not threading.main_thread():
             self.status_update_signal.emit(message)
-        else:
+        elif message != self._status_message:
             log(message)
+            self._status_message = message
             self.status_label.setText(message)
     
     def update_server_info(self, hq_info, jy_info):
@@ -2453,19 +7372,16 @@ class MainWindow(QMainWindow):
             self.best_jy_label.setText(jy_info)
     
     def update_monitoring_status(self):
-        """更新监控状态显示并检查内存使用情况"""
+        """更新监控状态显示和守护进程内存"""
         try:
-            if hasattr(self, 'memory_manager'):
-                self.memory_manager.cleanup_if_needed()
-                
+            self._update_memory_label()
+            
             if hasattr(self, 'network_status_label') and hasattr(self, 'qmt_process_label'):
                 is_running = self.core_logic.is_monitoring_running
                 if is_running and hasattr(self.core_logic, 'monitoring_thread') and self.core_logic.monitoring_thread:
                     network_status = "正常" if self.core_logic.monitoring_thread.last_network_status else "异常"
                     qmt_status = "运行中" if self.core_logic.monitoring_thread.last_qmt_status else "未运行"
                     
-                    # 内存显示已移除
-                    
                     self.network_status_label.setText(network_status)
                     self.qmt_process_label.setText(qmt_status)
                     
@@ -2481,9 +7397,37 @@ class MainWindow(QMainWindow):
                     self.qmt_process_label.setStyleSheet("color: #868e96; font-size: 14px;")
         except Exception as e:
             log(f"更新监控状态显示时发生错误: {e}")
+    
+    def _update_memory_label(self):
+        """显示后台采样的守护进程RSS，超出预算时标红"""
+        metrics = self.memory_governor.metrics()
+        if metrics['rss_mb'] is None:
+            return
+        budget = metrics['budget_mb']
+        text = f"{metrics['rss_mb']:.0f}MB" + (f" / {budget}MB" if budget else "")
+        color = "#ff6b6b" if metrics['alarmed'] else "#51cf66"
+        self.memory_label.setText(text)
+        self.memory_label.setStyleSheet(f"color: {color}; font-weight: bold; font-size: 14px;")
+    
+    def analyze_memory_growth(self):
+        """内存增长分析：首次点击开始记录分配，之后每次点击输出相对基线增长最多的代码位置"""
+        if self.memory_governor.metrics()['tracing']:
+            self.update_status_bar("正在分析内存增长，结果见日志")
+        else:
+            self.update_status_bar("已开始记录内存分配，稍后再次点击查看增长")
+        Worker(self.memory_governor.snapshot_diff).start()
 
 def main():
     """程序主入口"""
+    if '--simulate' in sys.argv[1:]:
+        sys.exit(run_simulation(sys.argv[1:]))
+    if '--worker' in sys.argv[1:]:
+        sys.exit(run_worker())
+    if '--supervise' in sys.argv[1:]:
+        sys.exit(run_supervisor(sys.argv[1:]))
+    if '--benchmark-delete' in sys.argv[1:]:
+        sys.exit(run_delete_benchmark(sys.argv[1:]))
+    
     app = QApplication(sys.argv)
     app.setApplicationName("QMT彩虹客户端工具")
     app.setApplicationVersion("2.2.31")
@@ -2495,6 +7439,8 @@ def main():
     log("∞MeowTech.实盘无限守护")
     log("功能：QMT和彩虹客户端的自动化管理工具")
     log("="*60)
+    log_event('guardian.start', pid=os.getpid(), version=app.applicationVersion(),
+              supervised=supervised_launch_reason())
     
     sys.exit(app.exec())
 
@@ -0,0 +1,258 @@
+"""实盘无限守护 - 事件日志查询工具
+作者： ∞MeowTech @萌新小强 @无限进化 @萌新小王 @大蒜
+版本：3.0
+
+查询守护程序写入的结构化事件日志（logs/events/events-YYYYMMDD.jsonl）。
+首次查询某个日志文件时在旁边生成索引文件（.idx），记录每种事件类型的行偏移和时间戳；
+之后的查询只读取索引命中的行，日志文件追加后索引增量更新。
+
+用法示例：
+    # 最近30天所有耗时超过20秒的QMT重启
+    python QMT实盘无限守护_事件查询.py --type process.restart --since 30d --where "duration>20" --where "process~XtMiniQmt"
+    # 9月3日 09:20-09:35 之间的所有事件
+    python QMT实盘无限守护_事件查询.py --since "2026-09-03 09:20" --until "2026-09-03 09:35"
+    # 本月各类事件数量、重启耗时统计
+    python QMT实盘无限守护_事件查询.py --since 2026-09-01 --count
+    python QMT实盘无限守护_事件查询.py --type "process.*" --stats duration
+"""
+
+import os, sys, json, time, re, argparse, fnmatch
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+
+# ====================================================================
+# 常量（与主程序 Constants.EVENT_LOG_DIR_NAME / EVENT_LOG_PREFIX 保持一致）
+# ====================================================================
+EVENT_LOG_PREFIX = "events-"
+EVENT_LOG_SUFFIX = ".jsonl"
+INDEX_SUFFIX = ".idx"
+INDEX_VERSION = 1
+DEFAULT_EVENT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs", "events")
+
+# ====================================================================
+# 索引
+# ====================================================================
+class EventIndex:
+    """单个事件日志文件的侧车索引
+
+    结构：{"version", "size", "types": {事件类型: {"offsets": [...], "ts": [...]}}}
+    同一类型内记录按写入顺序排列，时间戳单调不减，可按时间二分查找。
+    size 只记录到最后一个完整行，未写完的行留给下次增量索引。
+    """
+
+    def __init__(self, log_path):
+        self.log_path = log_path
+        self.index_path = log_path + INDEX_SUFFIX
+        self.types = {}
+        self.size = 0
+
+    def load(self, rebuild=False):
+        """加载索引，日志文件有新增内容时增量更新，被截断或版本不符时重建"""
+        data = None
+        if not rebuild:
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                data = None
+
+        file_size = os.path.getsize(self.log_path)
+        if data and data.get('version') == INDEX_VERSION and data.get('size', 0) <= file_size:
+            self.types = data.get('types', {})
+            self.size = data['size']
+        else:
+            self.types, self.size = {}, 0
+
+        if self.size < file_size:
+            self._scan_from(self.size)
+            self._save()
+        return self
+
+    def _scan_from(self, offset):
+        with open(self.log_path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # 写入中的半行，下次再索引
+                try:
+                    record = json.loads(line)
+                    entry = self.types.setdefault(record['type'], {'offsets': [], 'ts': []})
+                    entry['offsets'].append(offset)
+                    entry['ts'].append(record['ts'])
+                except (ValueError, KeyError, TypeError):
+                    pass  # 损坏的行不进入索引
+                offset += len(line)
+        self.size = offset
+
+    def _save(self):
+        tmp_path = self.index_path + ".tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': INDEX_VERSION, 'size': self.size, 'types': self.types}, f,
+                          separators=(',', ':'))
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"警告: 无法写入索引 {self.index_path}: {e}", file=sys.stderr)
+
+    def find(self, type_pattern, since_ts, until_ts):
+        """返回匹配类型且时间在 [since_ts, until_ts] 内的行偏移（按时间排序）"""
+        hits = []
+        for event_type, entry in self.types.items():
+            if type_pattern and not fnmatch.fnmatchcase(event_type, type_pattern):
+                continue
+            ts_list = entry['ts']
+            lo = bisect_left(ts_list, since_ts) if since_ts is not None else 0
+            hi = bisect_right(ts_list, until_ts) if until_ts is not None else len(ts_list)
+            hits.extend(zip(ts_list[lo:hi], entry['offsets'][lo:hi]))
+        hits.sort()
+        return [offset for _, offset in hits]
+
+    def read(self, offsets):
+        """按偏移读取并解析记录"""
+        with open(self.log_path, 'rb') as f:
+            for offset in offsets:
+                f.seek(offset)
+                try:
+                    yield json.loads(f.readline())
+                except ValueError:
+                    continue
+
+# ====================================================================
+# 查询条件
+# ====================================================================
+WHERE_PATTERN = re.compile(r'^\s*([\w.]+)\s*(>=|<=|!=|>|<|=|~)\s*(.*?)\s*$')
+
+def parse_where(expr):
+    """解析过滤条件，如 duration>20、success=false、process~XtMiniQmt"""
+    match = WHERE_PATTERN.match(expr)
+    if not match:
+        raise argparse.ArgumentTypeError(f"无法解析过滤条件: {expr}（格式: 字段 运算符 值，运算符为 = != > >= < <= ~）")
+    field, op, raw = match.groups()
+    try:
+        value = json.loads(raw)
+    except ValueError:
+        value = raw
+    return field, op, value
+
+def match_where(record, conditions):
+    for field, op, value in conditions:
+        actual = record.get(field)
+        try:
+            if op == '=' and actual != value:
+                return False
+            if op == '!=' and actual == value:
+                return False
+            if op == '~' and str(value) not in str(actual):
+                return False
+            if op in ('>', '>=', '<', '<='):
+                if actual is None:
+                    return False
+                if op == '>' and not actual > value:
+                    return False
+                if op == '>=' and not actual >= value:
+                    return False
+                if op == '<' and not actual < value:
+                    return False
+                if op == '<=' and not actual <= value:
+                    return False
+        except TypeError:
+            return False
+    return True
+
+def parse_time_arg(text):
+    """解析时间参数：2026-09-01、2026-09-01 09:28[:00]，或相对时间 30d / 12h / 90m"""
+    relative = re.fullmatch(r'(\d+)([dhm])', text.strip())
+    if relative:
+        amount, unit = int(relative.group(1)), relative.group(2)
+        delta = {'d': timedelta(days=amount), 'h': timedelta(hours=amount), 'm': timedelta(minutes=amount)}[unit]
+        return (datetime.now() - delta).timestamp()
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(text.strip(), fmt).timestamp()
+        except ValueError:
+            continue
+    raise argparse.ArgumentTypeError(f"无法解析时间: {text}")
+
+# ====================================================================
+# 查询
+# ====================================================================
+def iter_log_files(event_dir, since_ts, until_ts):
+    """按日期列出与时间范围相交的日志文件（文件名中的日期用于跳过无关文件）"""
+    since_date = time.strftime('%Y%m%d', time.localtime(since_ts)) if since_ts is not None else None
+    until_date = time.strftime('%Y%m%d', time.localtime(until_ts)) if until_ts is not None else None
+    try:
+        names = sorted(os.listdir(event_dir))
+    except OSError:
+        return
+    for name in names:
+        if not (name.startswith(EVENT_LOG_PREFIX) and name.endswith(EVENT_LOG_SUFFIX)):
+            continue
+        date = name[len(EVENT_LOG_PREFIX):-len(EVENT_LOG_SUFFIX)]
+        if since_date and date < since_date or until_date and date > until_date:
+            continue
+        yield os.path.join(event_dir, name)
+
+def query(event_dir, type_pattern=None, since_ts=None, until_ts=None, conditions=(), rebuild=False):
+    """查询事件，按时间顺序逐条返回"""
+    for log_path in iter_log_files(event_dir, since_ts, until_ts):
+        index = EventIndex(log_path).load(rebuild=rebuild)
+        for record in index.read(index.find(type_pattern, since_ts, until_ts)):
+            if match_where(record, conditions):
+                yield record
+
+def format_record(record):
+    stamp = datetime.fromtimestamp(record['ts']).strftime('%Y-%m-%d %H:%M:%S')
+    fields = ' '.join(f"{key}={json.dumps(value, ensure_ascii=False)}"
+                      for key, value in record.items() if key not in ('ts', 'type'))
+    return f"{stamp}  {record['type']:<18} {fields}"
+
+def print_stats(records, field):
+    values = sorted(r[field] for r in records if isinstance(r.get(field), (int, float)) and not isinstance(r.get(field), bool))
+    if not values:
+        print(f"没有包含数值字段 {field} 的事件")
+        return
+    p95 = values[min(len(values) - 1, int(round(0.95 * (len(values) - 1))))]
+    print(f"{field}: 数量={len(values)} 最小={values[0]:g} 平均={sum(values) / len(values):.3f} "
+          f"中位数={values[len(values) // 2]:g} P95={p95:g} 最大={values[-1]:g}")
+
+def main():
+    parser = argparse.ArgumentParser(description="实盘无限守护事件日志查询")
+    parser.add_argument('--dir', default=DEFAULT_EVENT_DIR, help="事件日志目录（默认: 框架根目录/logs/events）")
+    parser.add_argument('--type', dest='type_pattern', help="事件类型，支持通配符，如 process.restart、probe.*")
+    parser.add_argument('--since', type=parse_time_arg, help="开始时间（含），如 2026-09-01、\"2026-09-03 09:20\"、30d")
+    parser.add_argument('--until', type=parse_time_arg, help="结束时间（含）")
+    parser.add_argument('--where', type=parse_where, action='append', default=[],
+                        help="字段过滤，可重复，如 \"duration>20\"、\"success=false\"、\"process~XtMiniQmt\"")
+    parser.add_argument('--limit', type=int, default=0, help="最多输出条数（0为不限）")
+    parser.add_argument('--json', action='store_true', help="输出原始JSON行")
+    parser.add_argument('--count', action='store_true', help="只输出各事件类型的数量")
+    parser.add_argument('--stats', metavar='FIELD', help="输出数值字段的统计（数量/平均/P95等）")
+    parser.add_argument('--reindex', action='store_true', help="忽略已有索引，重新生成")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    records = query(args.dir, args.type_pattern, args.since, args.until, args.where, rebuild=args.reindex)
+
+    if args.count or args.stats:
+        records = list(records)
+        if args.count:
+            counts = {}
+            for record in records:
+                counts[record['type']] = counts.get(record['type'], 0) + 1
+            for event_type, count in sorted(counts.items()):
+                print(f"{event_type:<20} {count}")
+        if args.stats:
+            print_stats(records, args.stats)
+        total = len(records)
+    else:
+        total = 0
+        for record in records:
+            print(json.dumps(record, ensure_ascii=False) if args.json else format_record(record))
+            total += 1
+            if args.limit and total >= args.limit:
+                break
+
+    print(f"共 {total} 条，耗时 {(time.perf_counter() - start) * 1000:.1f} ms", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()